@@ -4,6 +4,7 @@
 @Description: 将地图划分为 grid, 获得每个 grid 每个座标点的信息, 例如 SNR
 @LastEditTime: 2024-05-29 16:37:55
 '''
+import numpy as np
 from loguru import logger
 
 from tshub.map.map_builder import MapBuilder
@@ -24,5 +25,8 @@ map_builder = MapBuilder(
 map_infos = map_builder.get_objects_infos()
 # 获得信息
 map_infos['grid']['SNIR_100'].get_value_at_coordinate(500, 1000) # 获得每一个点的信息
+map_infos['grid']['SNIR_100'].get_values_at_coordinates(
+    np.array([[500, 1000], [520, 1010]]), interpolate=True
+) # 批量获得多个点的信息 (双线性插值)
 map_infos['grid']['SNIR_100'].grid_z # 获得地图的信息
 logger.info(f'SIM: \n{dict_to_str(map_infos)}')
\ No newline at end of file
@@ -0,0 +1,63 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-20 19:55:30
+@Description: 检测 V2I/V2V 批量计算的 SNR 与逐条调用 get_snr 的结果完全相同 (bit-exact)
+@LastEditTime: 2026-10-20 19:55:30
+'''
+import unittest
+import numpy as np
+from loguru import logger
+
+from tshub.v2x.v2i_channel import V2IChannel
+from tshub.v2x.v2v_channel import V2VChannel
+
+class TestV2XChannelMatrix(unittest.TestCase):
+    def setUp(self) -> None:
+        logger.disable('tshub')
+        rng = np.random.default_rng(2026)
+        self.previous_positions = rng.uniform(-1000, 1000, (30, 2))
+        self.current_positions = self.previous_positions + rng.uniform(-10, 10, (30, 2))
+        self.BS_positions = rng.uniform(-1000, 1000, (3, 2))
+
+    def tearDown(self) -> None:
+        logger.enable('tshub')
+
+    def test_v2i_snr_matrix(self) -> None:
+        """N 个车辆 × M 个基站, 随机数按照行优先的顺序生成
+        """
+        for is_ms_transmit, is_ms_received in [(True, False), (False, True)]:
+            np.random.seed(0)
+            channel = V2IChannel(BS_position=self.BS_positions[0].tolist())
+            state = np.random.get_state()
+            snr_matrix = channel.get_snr_matrix(
+                self.previous_positions, self.current_positions, self.BS_positions,
+                is_ms_transmit=is_ms_transmit, is_ms_received=is_ms_received
+            )
+
+            np.random.set_state(state)
+            snr = np.zeros_like(snr_matrix)
+            for i, (previous_position, current_position) in enumerate(zip(self.previous_positions.tolist(), self.current_positions.tolist())):
+                for j, BS_position in enumerate(self.BS_positions.tolist()):
+                    channel.BS_position = BS_position
+                    snr[i, j] = channel.get_snr(previous_position, current_position, is_ms_transmit, is_ms_received)
+            self.assertTrue(np.array_equal(snr, snr_matrix))
+
+    def test_v2v_snr_matrix(self) -> None:
+        np.random.seed(0)
+        channel = V2VChannel()
+        state = np.random.get_state()
+        snr_matrix = channel.get_snr_matrix(self.previous_positions, self.current_positions)
+
+        np.random.set_state(state)
+        previous_positions, current_positions = self.previous_positions.tolist(), self.current_positions.tolist()
+        snr = np.array([
+            [
+                channel.get_snr(previous_positions[i], current_positions[i], previous_positions[j], current_positions[j])
+                for j in range(len(previous_positions))
+            ]
+            for i in range(len(previous_positions))
+        ])
+        self.assertTrue(np.array_equal(snr, snr_matrix))
+
+if __name__ == '__main__':
+    unittest.main()
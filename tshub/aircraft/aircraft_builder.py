@@ -2,18 +2,22 @@
 @Author: WANG Maonan
 @Date: 2023-08-23 20:13:10
 @Description: This module provides the AircraftBuilder class for creating and controlling aircraft.
-@LastEditTime: 2023-09-25 14:17:33
+@LastEditTime: 2026-10-19 18:40:12
 '''
 import traci
-from typing import Dict, Tuple
+import numpy as np
+from typing import Dict, Tuple, Any, List
 
 from .aircraft import AircraftInfo
+from .aircraft_fleet import AircraftFleet
+from .aircraft_coverage import CoverageInfo, compute_coverage
 from ..tshub_env.base_builder import BaseBuilder
 
 class AircraftBuilder(BaseBuilder):
     def __init__(self, 
                  sumo: traci.connection.Connection, 
-                 aircraft_inits: Dict[str, Dict[str, any]]={}) -> None:
+                 aircraft_inits: Dict[str, Dict[str, any]]={},
+                 fleet_kwargs: Dict[str, Any]=None) -> None:
         """
         初始化 AircraftBuilder 类的实例。
 
@@ -35,8 +39,14 @@ class AircraftBuilder(BaseBuilder):
                         "custom_update_cover_radius":None
                     }
                 }
+            fleet_kwargs (Dict[str, Any], optional): 不为 None 时使用 AircraftFleet, 所有 aircraft 保存在数组中一次更新,
+                例如 {"sync_distance": 5, "sync_interval": 10, "headless": False}. 默认为 None.
         """
         self.aircraft_dict = {} # 存储每一个 aircraft 的类
+        self.fleet = None # 使用数组保存所有 aircraft
+        if fleet_kwargs is not None:
+            self.fleet = AircraftFleet(sumo=sumo, aircraft_inits=aircraft_inits, **fleet_kwargs)
+            return
         for _aircraft_id, _aircraft_parameter in aircraft_inits.items():
             self.create_objects(id=_aircraft_id, sumo=sumo, **_aircraft_parameter)
 
@@ -82,6 +92,8 @@ class AircraftBuilder(BaseBuilder):
         Returns:
             Dict[str, dict]: 包含所有 aircraft 信息的字典。
         """
+        if self.fleet is not None:
+            return self.fleet.get_objects_infos()
         all_aircraft_data = {
             aircraft_id: aircraft.get_features()
             for aircraft_id, aircraft in self.aircraft_dict.items()
@@ -103,8 +115,47 @@ class AircraftBuilder(BaseBuilder):
         Returns:
             None
         """
+        if self.fleet is not None:
+            self.fleet.control_objects(actions)
+            return
         for _aircraft_id, _action in actions.items():
             self.aircraft_dict[_aircraft_id].control_aircraft(_action)
     
+    def get_aircraft_arrays(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """所有 aircraft 的 id, (A, 3) 的位置和 (A,) 的地面覆盖半径
+        """
+        if self.fleet is not None:
+            return list(self.fleet.ids), self.fleet.position.copy(), self.fleet.cover_radius.copy()
+        aircraft_ids = list(self.aircraft_dict.keys())
+        positions = np.array(
+            [self.aircraft_dict[_id].position for _id in aircraft_ids], dtype=np.float64
+        ).reshape(-1, 3)
+        cover_radius = np.array(
+            [self.aircraft_dict[_id].cover_radius for _id in aircraft_ids], dtype=np.float64
+        )
+        return aircraft_ids, positions, cover_radius
+
+    def get_coverage(self, target_ids:List[str], target_positions:np.ndarray) -> CoverageInfo:
+        """批量计算所有 aircraft 对地面目标 (vehicle, person) 的覆盖
+
+        Args:
+            target_ids (List[str]): 地面目标的 id
+            target_positions (np.ndarray): (T, 2) 或 (T, 3) 地面目标的坐标
+
+        Returns:
+            CoverageInfo: 稀疏的 aircraft × target 覆盖矩阵, 每条链路的斜距和仰角, 以及每个 target 的服务 aircraft
+        """
+        aircraft_ids, positions, cover_radius = self.get_aircraft_arrays()
+        return compute_coverage(aircraft_ids, positions, cover_radius, target_ids, target_positions)
+
+    def get_objects_coverage(self, objects_infos:Dict[str, Dict[str, Any]]) -> CoverageInfo:
+        """直接使用 vehicle 或 person 的 infos 计算覆盖, 例如 obs['vehicle']
+        """
+        target_ids = list(objects_infos.keys())
+        target_positions = np.array(
+            [objects_infos[_id]['position'][:2] for _id in target_ids], dtype=np.float64
+        ).reshape(-1, 2)
+        return self.get_coverage(target_ids, target_positions)
+
     def update_objects_state(self):
         raise NotImplementedError
\ No newline at end of file
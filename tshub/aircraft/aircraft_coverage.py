@@ -0,0 +1,101 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 19:05:40
+@Description: 计算 aircraft 对地面目标 (vehicle, person) 的覆盖情况
++ 对所有地面目标建立一次 KD-tree, 每个 aircraft 使用自己的 cover_radius 做一次半径查询
++ 结果为稀疏的 aircraft × target 覆盖矩阵, 以及每条链路的斜距 (slant range) 和仰角 (elevation)
++ 每个地面目标选择斜距最小的 aircraft 作为服务的 aircraft
+@LastEditTime: 2026-10-19 19:05:40
+'''
+import numpy as np
+from dataclasses import dataclass
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+from typing import List
+
+
+@dataclass
+class CoverageInfo:
+    aircraft_ids: List[str]
+    target_ids: List[str]
+    coverage: csr_matrix # (A, T) bool, aircraft 是否覆盖 target
+    link_aircraft: np.ndarray # (L,) 每条链路的 aircraft index
+    link_target: np.ndarray # (L,) 每条链路的 target index
+    slant_range: np.ndarray # (L,) aircraft 到 target 的三维距离 [m]
+    elevation: np.ndarray # (L,) 从 target 看 aircraft 的仰角 [deg]
+    best_aircraft: np.ndarray # (T,) 斜距最小的 aircraft index, 没有覆盖为 -1
+
+    def get_best_aircraft_ids(self) -> List[str]:
+        """每个 target 的服务 aircraft 的 id, 没有覆盖为 None
+        """
+        return [
+            self.aircraft_ids[_index] if _index >= 0 else None
+            for _index in self.best_aircraft.tolist()
+        ]
+
+
+def compute_coverage(
+        aircraft_ids:List[str], aircraft_positions:np.ndarray, cover_radius:np.ndarray,
+        target_ids:List[str], target_positions:np.ndarray
+    ) -> CoverageInfo:
+    """计算 aircraft 对地面目标的覆盖, target 与 aircraft 的水平距离不超过 cover_radius 即为覆盖
+
+    Args:
+        aircraft_ids (List[str]): aircraft 的 id
+        aircraft_positions (np.ndarray): (A, 3) aircraft 的坐标
+        cover_radius (np.ndarray): (A,) aircraft 的地面覆盖半径
+        target_ids (List[str]): 地面目标的 id
+        target_positions (np.ndarray): (T, 2) 或 (T, 3) 地面目标的坐标, 没有高度时高度为 0
+
+    Returns:
+        CoverageInfo: 覆盖矩阵, 链路信息和每个 target 的服务 aircraft
+    """
+    aircraft_positions = np.asarray(aircraft_positions, dtype=np.float64).reshape(-1, 3)
+    cover_radius = np.asarray(cover_radius, dtype=np.float64).reshape(-1)
+    target_positions = np.asarray(target_positions, dtype=np.float64)
+    if target_positions.ndim != 2:
+        target_positions = target_positions.reshape(-1, 2)
+    if target_positions.shape[1] == 2:
+        target_positions = np.hstack([target_positions, np.zeros((len(target_positions), 1))])
+    num_aircraft, num_target = len(aircraft_positions), len(target_positions)
+
+    # 每个 aircraft 覆盖的 target (只查询 cover_radius > 0 的 aircraft)
+    link_aircraft = np.zeros(0, dtype=np.int64)
+    link_target = np.zeros(0, dtype=np.int64)
+    active = np.flatnonzero(cover_radius > 0)
+    if num_target > 0 and len(active) > 0:
+        tree = cKDTree(target_positions[:, :2])
+        neighbors = tree.query_ball_point(aircraft_positions[active, :2], cover_radius[active])
+        counts = np.array([len(_neighbor) for _neighbor in neighbors], dtype=np.int64)
+        link_aircraft = np.repeat(active, counts)
+        link_target = np.fromiter(
+            (_target for _neighbor in neighbors for _target in _neighbor),
+            dtype=np.int64, count=int(counts.sum())
+        )
+
+    # 链路的斜距与仰角
+    delta = aircraft_positions[link_aircraft] - target_positions[link_target]
+    horizontal = np.hypot(delta[:, 0], delta[:, 1])
+    slant_range = np.sqrt(horizontal**2 + delta[:, 2]**2)
+    elevation = np.degrees(np.arctan2(delta[:, 2], horizontal))
+
+    # 按照 (target, slant_range) 排序, 每个 target 的第一条链路即为服务的 aircraft
+    order = np.lexsort((link_aircraft, slant_range, link_target))
+    link_aircraft, link_target = link_aircraft[order], link_target[order]
+    slant_range, elevation = slant_range[order], elevation[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = link_target[1:] != link_target[:-1]
+    best_aircraft = np.full(num_target, -1, dtype=np.int64)
+    best_aircraft[link_target[first]] = link_aircraft[first]
+
+    coverage = csr_matrix(
+        (np.ones(len(link_aircraft), dtype=bool), (link_aircraft, link_target)),
+        shape=(num_aircraft, num_target)
+    )
+    return CoverageInfo(
+        aircraft_ids=list(aircraft_ids), target_ids=list(target_ids),
+        coverage=coverage,
+        link_aircraft=link_aircraft, link_target=link_target,
+        slant_range=slant_range, elevation=elevation,
+        best_aircraft=best_aircraft,
+    )
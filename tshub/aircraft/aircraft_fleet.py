@@ -0,0 +1,224 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 18:02:51
+@Description: 使用 numpy 数组保存所有 aircraft 的状态, 一次更新所有 aircraft 的动作 (适用于大量无人机的场景)
++ heading 查找表由 aircraft_type 中的动作类计算, 与 AircraftInfo 的结果一致
++ 只有当 aircraft 移动超过 sync_distance, 或是距离上次更新超过 sync_interval 个 step 时才更新 SUMO 中的 POI/polygon
++ headless=True 时不会在 SUMO 中添加任何可视化
+@LastEditTime: 2026-10-19 18:02:51
+'''
+import math
+import numpy as np
+from loguru import logger
+from typing import Dict, Any, Tuple, List
+
+from .aircraft_action_type import aircraft_action_type
+from .aircraft_type.horizontal_movement import HorizontalMovementAction
+from .aircraft_type.vertical_movement import VerticalMovementAction
+from .aircraft_type.combined_movement import CombinedMovementAction
+from ..utils.get_abs_path import get_abs_path
+
+
+def build_heading_table() -> Tuple[np.ndarray, Dict[aircraft_action_type, int], Dict[aircraft_action_type, int]]:
+    """将四种动作类型的 heading 拼接为一个查找表, 返回查找表, 每种类型的起始 index 和 heading 的数量
+    """
+    headings = {
+        aircraft_action_type.Stationary: [(0, 0, 0)],
+        aircraft_action_type.HorizontalMovement: [
+            HorizontalMovementAction(id=None).calculate_heading(_angle)
+            for _angle in HorizontalMovementAction.ANGLES
+        ],
+        aircraft_action_type.VerticalMovement: [
+            VerticalMovementAction.HEADINGS[_index]
+            for _index in sorted(VerticalMovementAction.HEADINGS)
+        ],
+        aircraft_action_type.CombinedMovement: [
+            CombinedMovementAction(id=None).calculate_heading_3d(*_combination)
+            for _combination in CombinedMovementAction(id=None).combinations
+        ],
+    }
+    table, offsets, counts = [], {}, {}
+    for _action, _headings in headings.items():
+        offsets[_action] = len(table)
+        counts[_action] = len(_headings)
+        table.extend(_headings)
+    return np.array(table, dtype=np.float64), offsets, counts
+
+
+class AircraftFleet:
+    """所有 aircraft 的状态保存在数组中, aircraft_inits 的格式与 AircraftBuilder 相同
+
+    Args:
+        sumo: sumo 的连接, headless 时可以为 None
+        aircraft_inits (Dict[str, Dict[str, Any]]): aircraft 的初始参数
+        sync_distance (float, optional): aircraft 移动 (或覆盖半径变化) 超过该距离才更新 SUMO 可视化. Defaults to 0.0.
+        sync_interval (int, optional): 每隔多少个 step 强制更新一次 SUMO 可视化, None 表示不强制更新. Defaults to None.
+        headless (bool, optional): 是否关闭 SUMO 可视化. Defaults to False.
+        circle_points (int, optional): 覆盖范围的圆上采样点的数量. Defaults to 30.
+    """
+    HEADING_TABLE, HEADING_OFFSETS, HEADING_COUNTS = build_heading_table()
+
+    def __init__(self,
+                 sumo, aircraft_inits:Dict[str, Dict[str, Any]],
+                 sync_distance:float=0.0, sync_interval:int=None,
+                 headless:bool=False, circle_points:int=30
+        ) -> None:
+        self.sumo = sumo
+        self.sync_distance = sync_distance
+        self.sync_interval = sync_interval
+        self.headless = headless
+
+        self.ids = list(aircraft_inits.keys())
+        self.id_to_index = {_id:_index for _index, _id in enumerate(self.ids)}
+        parameters = list(aircraft_inits.values())
+        num_aircraft = len(self.ids)
+
+        self.aircraft_type = [_p['aircraft_type'] for _p in parameters]
+        self.action_type = [_p['action_type'] for _p in parameters]
+        self.heading_offset = np.array(
+            [self.HEADING_OFFSETS[aircraft_action_type(_action)] for _action in self.action_type], dtype=np.int64
+        )
+        self.heading_count = np.array(
+            [self.HEADING_COUNTS[aircraft_action_type(_action)] for _action in self.action_type], dtype=np.int64
+        )
+        self.is_stationary = np.array(
+            [aircraft_action_type(_action) == aircraft_action_type.Stationary for _action in self.action_type]
+        )
+        self.position = np.array([_p['position'] for _p in parameters], dtype=np.float64).reshape(num_aircraft, 3)
+        self.speed = np.array([_p['speed'] for _p in parameters], dtype=np.float64).reshape(num_aircraft)
+        self.heading = np.array([_p['heading'] for _p in parameters], dtype=np.float64).reshape(num_aircraft, 3)
+        self.communication_range = np.array([_p['communication_range'] for _p in parameters], dtype=np.float64)
+        self.color = [tuple(_p.get('color', (255, 0, 0))) for _p in parameters]
+        self.img_file = [_p.get('img_file') for _p in parameters]
+        self.if_sumo_visualization = np.array(
+            [bool(_p.get('if_sumo_visualization', False)) for _p in parameters], dtype=bool
+        ) & (not self.headless)
+        self.custom_update_cover_radius = [_p.get('custom_update_cover_radius') for _p in parameters]
+        self.cover_radius = np.zeros(num_aircraft)
+        self.update_cover_radius()
+
+        # 圆上的采样点 (单位圆), 与 AircraftInfo.get_circle_points 相同
+        angles = np.arange(circle_points + 1) * (2 * math.pi / circle_points)
+        self.unit_circle = np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+        # 上一次更新 SUMO 时的状态
+        self.synced_position = self.position.copy()
+        self.synced_cover_radius = self.cover_radius.copy()
+        self.steps_since_sync = np.zeros(num_aircraft, dtype=np.int64)
+        self.init_sumo_visualization()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def update_cover_radius(self) -> None:
+        """批量更新地面覆盖半径, 自定义的计算方式逐个调用
+        """
+        height = self.position[:, 2]
+        too_high = height > self.communication_range
+        if too_high.any():
+            logger.warning(f'SIM: Aircraft {[self.ids[_i] for _i in np.flatnonzero(too_high)]} 的高度超过了通讯范围.')
+        self.cover_radius = np.where(
+            too_high, 0.0,
+            np.sqrt(np.maximum(self.communication_range**2 - height**2, 0))
+        )
+        for _index, _custom in enumerate(self.custom_update_cover_radius):
+            if _custom is not None:
+                self.cover_radius[_index] = _custom(tuple(self.position[_index]), self.communication_range[_index])
+
+    def get_circle_points(self, index:int) -> List[Tuple[float, float]]:
+        """第 index 个 aircraft 覆盖范围的圆
+        """
+        points = self.position[index, :2] + self.cover_radius[index] * self.unit_circle
+        return [tuple(_point) for _point in points.tolist()]
+
+    def init_sumo_visualization(self) -> None:
+        """在 SUMO 中添加需要可视化的 aircraft
+        """
+        if not self.if_sumo_visualization.any():
+            return
+        if self.sumo is None:
+            raise ValueError('需要设置 SUMO 连接')
+        default_img_file = get_abs_path(__file__)('./aircraft.png')
+        for _index in np.flatnonzero(self.if_sumo_visualization):
+            _id = self.ids[_index]
+            x, y = self.position[_index, :2]
+            self.sumo.poi.add(
+                _id, x, y, (255, 255, 255, 255),
+                imgFile=self.img_file[_index] or default_img_file, width=10, height=10, layer=50
+            )
+            self.sumo.polygon.add(_id, self.get_circle_points(_index), (*self.color[_index], 100), layer=50)
+
+    def control_objects(self, actions:Dict[str, Tuple[float, int]]) -> None:
+        """一次更新所有 aircraft 的动作
+
+        Args:
+            actions (Dict[str, Tuple[float, int]]): 每个 aircraft 的 (speed, heading_index)
+        """
+        if not actions:
+            return
+        index = np.array([self.id_to_index[_id] for _id in actions.keys()], dtype=np.int64)
+        action_array = np.array(list(actions.values()), dtype=np.float64).reshape(-1, 2)
+        speed, heading_index = action_array[:, 0], action_array[:, 1].astype(np.int64)
+        heading_index = np.where(self.is_stationary[index], 0, heading_index) # stationary 只有一个 heading
+        out_of_range = (heading_index < 0) | (heading_index >= self.heading_count[index]) # 不能取到其他动作类型的 heading
+        if out_of_range.any():
+            _i = np.flatnonzero(out_of_range)[0]
+            raise IndexError(
+                f'Aircraft {self.ids[index[_i]]} 的 heading_index {heading_index[_i]} 超出范围 '
+                f'[0, {self.heading_count[index[_i]]}).'
+            )
+        heading = self.HEADING_TABLE[self.heading_offset[index] + heading_index]
+
+        old_position = self.position[index]
+        new_position = old_position + speed[:, None] * heading
+        below_ground = new_position[:, 2] <= 0
+        if below_ground.any():
+            logger.warning(f'SIM: Aircraft {[self.ids[_i] for _i in index[below_ground]]} 的高度不能小于 0, 保持原来的高度.')
+            new_position[below_ground, 2] = old_position[below_ground, 2]
+        new_position[self.is_stationary[index]] = old_position[self.is_stationary[index]]
+
+        self.position[index] = new_position
+        self.speed[index] = speed
+        self.heading[index] = heading
+        self.update_cover_radius()
+        self.update_sumo_visualization()
+
+    def update_sumo_visualization(self) -> None:
+        """只更新移动超过 sync_distance 或是超过 sync_interval 个 step 没有更新的 aircraft
+        """
+        self.steps_since_sync += 1
+        moved = (
+            np.hypot(*(self.position[:, :2] - self.synced_position[:, :2]).T) > self.sync_distance
+        ) | (np.abs(self.cover_radius - self.synced_cover_radius) > self.sync_distance)
+        if self.sync_interval is not None:
+            moved |= self.steps_since_sync >= self.sync_interval
+        for _index in np.flatnonzero(moved & self.if_sumo_visualization):
+            _id = self.ids[_index]
+            x, y = self.position[_index, :2]
+            self.sumo.poi.setPosition(_id, x, y)
+            self.sumo.polygon.setShape(_id, self.get_circle_points(_index))
+            self.sumo.polygon.setLineWidth(_id, 3)
+            self.synced_position[_index] = self.position[_index]
+            self.synced_cover_radius[_index] = self.cover_radius[_index]
+            self.steps_since_sync[_index] = 0
+
+    def get_objects_infos(self) -> Dict[str, Dict[str, Any]]:
+        """与 AircraftInfo.get_features 格式相同的信息
+        """
+        positions, headings = self.position.tolist(), self.heading.tolist()
+        return {
+            _id: {
+                'id': _id,
+                'aircraft_type': self.aircraft_type[_index],
+                'action_type': self.action_type[_index],
+                'position': positions[_index],
+                'speed': float(self.speed[_index]),
+                'heading': tuple(headings[_index]),
+                'communication_range': float(self.communication_range[_index]),
+                'cover_radius': float(self.cover_radius[_index]),
+                'if_sumo_visualization': bool(self.if_sumo_visualization[_index]),
+                'color': self.color[_index],
+                'img_file': self.img_file[_index],
+            }
+            for _index, _id in enumerate(self.ids)
+        }
@@ -2,12 +2,12 @@
 @Author: WANG Maonan
 @Date: 2024-05-29 15:23:55
 @Description: 将 Map 划分为 Grid, 从而获得 Grid 内部的信息
-@LastEditTime: 2024-05-29 16:36:12
+@LastEditTime: 2026-10-20 20:14:47
 '''
+import os
 import numpy as np
-from typing import Tuple, List
+from typing import Tuple
 from dataclasses import dataclass, field
-from scipy.interpolate import griddata as scipy_griddata
 
 @dataclass
 class GridInfo:
@@ -18,18 +18,21 @@ class GridInfo:
     y_min: float = None
     x_max: float = None
     y_max: float = None
-    data: List[Tuple[float, float, float]] = field(default_factory=list)
+    data: np.ndarray = field(default_factory=lambda: np.zeros((0, 3))) # (N, 3), 每一行为 (x, y, value)
     grid_z: np.ndarray = field(default_factory=lambda: np.array([]))
 
     @classmethod
-    def from_radio_map_txt(cls, file_path: str, x_offset: float, y_offset: float):
-        """从 radio map 文件中读取数据
+    def from_radio_map_txt(cls, file_path: str, x_offset: float, y_offset: float, cache_dir: str = None):
+        """从 radio map 文件中读取数据. 数据部分一次性读入后使用 numpy 批量转换, 
+        设置 cache_dir 时在其中保存一份 .npy 的二进制缓存 (key 为 txt 内容的 hash, txt 修改之后缓存自动失效).
 
         Args:
             file_path (str): txt 文件的路径, 这里是 radio map 的数据
+            x_offset (float): x 方向的偏移, 转换为 SUMO 仿真的坐标
+            y_offset (float): y 方向的偏移, 转换为 SUMO 仿真的坐标
+            cache_dir (str, optional): .npy 缓存的文件夹, None 表示不缓存, 不会在输入数据的文件夹中写入文件. Defaults to None.
         """
         instance = cls()
-        data = list()
         with open(file_path, 'r') as file:
             for line in file:
                 if line.startswith('LOWER_LEFT'):
@@ -40,21 +43,41 @@ class GridInfo:
                     instance.resolution = float(line.split()[1])
                 elif line.startswith('BEGIN_DATA'):
                     break
+            
+            cache_path = None
+            if cache_dir is not None:
+                from .map_cache import hash_file # map_cache 中导入了 GridInfo
+                cache_path = os.path.join(cache_dir, f'radio_map_{hash_file(file_path, "radio-map")}.npy')
+            if cache_path is not None and os.path.isfile(cache_path):
+                raw_data = np.load(cache_path)
+            else:
+                raw_data = cls._parse_radio_map_data(file.read())
+                if cache_path is not None:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    tmp_path = f'{cache_path}.tmp-{os.getpid()}.npy'
+                    np.save(tmp_path, raw_data)
+                    os.replace(tmp_path, cache_path) # 多个进程同时写入也不会读到不完整的缓存
 
-            for line in file:
-                if "END_DATA" in line:
-                    break
-                parts = line.split()
-                coord = (float(parts[0])+x_offset, float(parts[1])+y_offset) # 这里加上 offset, 转换为 SUMO 仿真的坐标
-                value = np.nan if parts[2] == "N.C." else float(parts[2])
-                data.append((*coord, value))
-
-            instance.data = data.copy()
+        data = raw_data.copy()
+        data[:, 0] += x_offset # 这里加上 offset, 转换为 SUMO 仿真的坐标
+        data[:, 1] += y_offset
+        instance.data = data
 
         # Create grid
         instance.create_grid()
         
         return instance
+
+    @staticmethod
+    def _parse_radio_map_data(text: str) -> np.ndarray:
+        """将 BEGIN_DATA 和 END_DATA 之间的文本转换为 (N, 3) 的数组, N.C. 转换为 nan
+        """
+        text = text.split('END_DATA', 1)[0]
+        tokens = np.array(text.split()).reshape(-1, 3)
+        raw_data = np.empty(tokens.shape, dtype=np.float64)
+        raw_data[:, :2] = tokens[:, :2].astype(np.float64)
+        raw_data[:, 2] = np.where(tokens[:, 2] == 'N.C.', 'nan', tokens[:, 2]).astype(np.float64)
+        return raw_data
     
     def __repr__(self) -> str:
         return f'SNIR_{self.resolution}'
@@ -62,7 +85,7 @@ class GridInfo:
     def create_grid(self):
         """Organize data into a structured grid.
         """
-        data_array = np.array(self.data)
+        data_array = np.asarray(self.data, dtype=np.float64).reshape(-1, 3)
 
         # Get the min and max coordinates for the grid
         self.x_min, self.y_min = np.min(data_array[:, :2], axis=0)
@@ -76,10 +99,9 @@ class GridInfo:
         self.grid_z = np.full((y_size, x_size), np.nan)
 
         # Populate the grid with values
-        for x, y, value in self.data:
-            x_idx = int((x - self.x_min) / self.resolution)
-            y_idx = int((y - self.y_min) / self.resolution)
-            self.grid_z[y_idx, x_idx] = value
+        x_idx = ((data_array[:, 0] - self.x_min) / self.resolution).astype(np.int64)
+        y_idx = ((data_array[:, 1] - self.y_min) / self.resolution).astype(np.int64)
+        self.grid_z[y_idx, x_idx] = data_array[:, 2]
 
     def get_value_at_coordinate(self, x: float, y: float) -> float:
         """Get the value at the given coordinates.
@@ -93,6 +115,79 @@ class GridInfo:
             return self.grid_z[y_idx, x_idx]
         else:
             return np.nan  # or some other value indicating out-of-bounds
+
+    def get_cell_indices(self, xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """批量计算坐标所在的 grid index, 与 get_value_at_coordinate 的取整方式相同
+
+        Args:
+            xy (np.ndarray): (N, 2) 的坐标
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: x_idx, y_idx 以及是否在 grid 内部的 mask
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        x_idx = np.trunc((xy[:, 0] - self.x_min) / self.resolution).astype(np.int64)
+        y_idx = np.trunc((xy[:, 1] - self.y_min) / self.resolution).astype(np.int64)
+        inside = (x_idx >= 0) & (x_idx < self.grid_z.shape[1]) & (y_idx >= 0) & (y_idx < self.grid_z.shape[0])
+        return x_idx, y_idx, inside
+
+    def get_interpolation_weights(self, xy: np.ndarray, interpolate: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """批量计算每个坐标使用的格点 (grid_z 展开后的 index) 和权重, 坐标不变时可以缓存并重复使用
+
+        Args:
+            xy (np.ndarray): (N, 2) 的坐标
+            interpolate (bool, optional): 是否使用双线性插值, False 时只使用所在的格点. Defaults to False.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: (N, 4) 的格点 index, (N, 4) 的权重, 以及是否在 grid 内部的 mask
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        y_size, x_size = self.grid_z.shape
+        flat_index = np.zeros((len(xy), 4), dtype=np.int64)
+        weights = np.zeros((len(xy), 4), dtype=np.float64)
+        if not interpolate:
+            x_idx, y_idx, inside = self.get_cell_indices(xy)
+            flat_index[inside, 0] = y_idx[inside] * x_size + x_idx[inside]
+            weights[inside, 0] = 1
+            return flat_index, weights, inside
+
+        # 双线性插值, 格点位于 (x_min + i*resolution, y_min + j*resolution)
+        fx = (xy[:, 0] - self.x_min) / self.resolution
+        fy = (xy[:, 1] - self.y_min) / self.resolution
+        inside = (fx >= 0) & (fx <= x_size - 1) & (fy >= 0) & (fy <= y_size - 1)
+        fx, fy = fx[inside], fy[inside]
+        x0 = np.minimum(np.floor(fx).astype(np.int64), max(x_size - 2, 0))
+        y0 = np.minimum(np.floor(fy).astype(np.int64), max(y_size - 2, 0))
+        x1 = np.minimum(x0 + 1, x_size - 1)
+        y1 = np.minimum(y0 + 1, y_size - 1)
+        wx, wy = fx - x0, fy - y0
+        flat_index[inside] = np.stack([y0 * x_size + x0, y0 * x_size + x1, y1 * x_size + x0, y1 * x_size + x1], axis=1)
+        weights[inside] = np.stack([(1 - wx) * (1 - wy), wx * (1 - wy), (1 - wx) * wy, wx * wy], axis=1)
+        return flat_index, weights, inside
+
+    def get_values_from_weights(self, flat_index: np.ndarray, weights: np.ndarray, inside: np.ndarray) -> np.ndarray:
+        """使用 get_interpolation_weights 的结果计算每个坐标的值, 超出 grid 范围的坐标返回 nan
+        """
+        grid_values = self.grid_z.ravel()
+        interpolated = np.zeros(len(flat_index))
+        for _corner in range(4):
+            # 权重为 0 的格点不参与计算; 其余相邻格点中有 nan, 结果也是 nan
+            _w = weights[:, _corner]
+            interpolated += np.where(_w > 0, grid_values[flat_index[:, _corner]] * _w, 0)
+        return np.where(inside, interpolated, np.nan)
+
+    def get_values_at_coordinates(self, xy: np.ndarray, interpolate: bool = False) -> np.ndarray:
+        """批量获得多个坐标的值, 超出 grid 范围的坐标返回 nan
+
+        Args:
+            xy (np.ndarray): (N, 2) 的坐标
+            interpolate (bool, optional): 是否在相邻的四个格点之间进行双线性插值. 
+                False 时与 get_value_at_coordinate 的结果相同. Defaults to False.
+
+        Returns:
+            np.ndarray: (N,) 每个坐标对应的值
+        """
+        return self.get_values_from_weights(*self.get_interpolation_weights(xy, interpolate))
     
     def get_features(self):
         return self
\ No newline at end of file
@@ -2,13 +2,17 @@
 @Author: WANG Maonan
 @Date: 2023-09-22 14:09:07
 @Description: 初始化 Map Info Object
-@LastEditTime: 2024-07-19 17:59:32
+@LastEditTime: 2026-10-20 16:05:41
 '''
 import sumolib
-from typing import Dict
+import numpy as np
+from typing import Dict, List
 
 from .grid import GridInfo
-from .polygon import PolygonInfo
+from .polygon import PolygonInfo, PolygonLayer, PolygonLayerBuilder
+from .spatial_index import PolygonIndex
+from .osm_levels import read_building_levels
+from .map_cache import load_building_levels, save_building_levels
 from ..tshub_env.base_builder import BaseBuilder
 
 class MapBuilder(BaseBuilder):
@@ -16,12 +20,16 @@ class MapBuilder(BaseBuilder):
                  net_file:str, 
                  poly_file:str=None, 
                  osm_file:str=None,
-                 radio_map_files:Dict[str, str]=None
+                 radio_map_files:Dict[str, str]=None,
+                 compact:bool=False,
+                 cache_dir:str=None
         ) -> None:
         self.net_file = net_file # sumo net file
         self.poly_file = poly_file # 多边形的文件
         self.osm_file = osm_file # 原始 osm 文件
         self.radio_map_files = radio_map_files # 传入每一个坐标的信息
+        self.compact = compact # 是否将 lane, node, building 保存为按列的 PolygonLayer, 用于大量建筑物的场景
+        self.cache_dir = cache_dir # 缓存 osm 文件中 building:levels 和 radio map 的文件夹, None 表示不缓存
 
         self.map_info = {
             'lane': dict(), # 车道信息
@@ -29,7 +37,24 @@ class MapBuilder(BaseBuilder):
             'building': dict(), # 建筑物信息
             'grid': dict(), # 将 map 且分为 grid, 统计每个 grid 内部的信息
         } # building, lane, node
+        self.spatial_index: Dict[str, PolygonIndex] = dict() # lane, node, building 的空间索引
+        if self.compact: # 读取时直接写入按列的数组, 不创建 PolygonInfo
+            for object_type in ['lane', 'node', 'building']:
+                self.map_info[object_type] = PolygonLayerBuilder()
         self.create_objects() # 创建地图元素
+        if self.compact:
+            for object_type in ['lane', 'node', 'building']:
+                self.map_info[object_type] = self.map_info[object_type].build()
+        self.create_spatial_index() # 创建空间索引
+
+    def add_polygon(self, object_type:str, **kwargs) -> None:
+        """添加一个 polygon, 参数与 PolygonInfo.create 相同
+        """
+        objects = self.map_info[object_type]
+        if isinstance(objects, PolygonLayerBuilder):
+            objects.add(**kwargs)
+        else:
+            objects[kwargs['id']] = PolygonInfo.create(**kwargs)
 
     def create_objects(self) -> None:
         """初始化地图中所有的元素
@@ -49,7 +74,8 @@ class MapBuilder(BaseBuilder):
                 lane_shape = sumolib.geomhelper.line2boundary(
                     _lane.getShape(), _lane.getWidth()
                 ) # 获得每一个 lane 的 shape
-                self.map_info['lane'][lane_id] = PolygonInfo.create(
+                self.add_polygon(
+                    'lane',
                     id=lane_id,
                     edge_id=edge_id,
                     length=lane_length,
@@ -67,7 +93,8 @@ class MapBuilder(BaseBuilder):
                 node_shape = _node.getShape()
                 node_coord = _node.getCoord()
                 node_type = _node.getType() # 普通路口/包含信号灯
-                self.map_info['node'][node_id] = PolygonInfo.create(
+                self.add_polygon(
+                    'node',
                     id=node_id,
                     edge_id=None,
                     length=0, # node 没有长度
@@ -81,7 +108,8 @@ class MapBuilder(BaseBuilder):
         # 遍历 poly 文件获得当前环境中所有的多边形
         if self.poly_file is not None:
             for poly in sumolib.xml.parse(self.poly_file, "poly"):
-                self.map_info['building'][poly.id] = PolygonInfo.create(
+                self.add_polygon(
+                    'building',
                     id=poly.id,
                     edge_id=None,
                     length=0,
@@ -94,26 +122,83 @@ class MapBuilder(BaseBuilder):
         
         # 遍历 osm 文件更新 poly 的信息
         if self.osm_file is not None:
-            for building in sumolib.xml.parse(self.osm_file, "way"):
-                if building.id in self.map_info['building']:
-                    if building.tag is not None:
-                        tag_dict = {tag.k:tag.v for tag in building.tag}
-                    else:
-                        tag_dict = {}
-                        
-                    if "building:levels" in tag_dict:
-                        self.map_info['building'][building.id].building_levels = tag_dict["building:levels"]
+            building_levels = self.get_building_levels()
+            buildings = self.map_info['building']
+            if isinstance(buildings, PolygonLayerBuilder):
+                buildings.set_building_levels(building_levels)
+            else:
+                for building_id, building in buildings.items():
+                    if building_id in building_levels:
+                        building.building_levels = building_levels[building_id]
         
         # 处理 radio map 的信息, 获得每个点的信息
         if self.radio_map_files is not None:
             for file_type, file_path in self.radio_map_files.items():
-                self.map_info['grid'][file_type] = GridInfo.from_radio_map_txt(file_path, x_offset, y_offset)
+                self.map_info['grid'][file_type] = GridInfo.from_radio_map_txt(file_path, x_offset, y_offset, cache_dir=self.cache_dir)
+
+    def get_building_levels(self) -> Dict[str, str]:
+        """流式读取 osm 文件中建筑物的层数. 
+        1. 没有设置 cache_dir, 只读取 poly 文件中存在的 way;
+        2. 设置了 cache_dir, 读取所有 way 的层数并缓存, 之后 (即使 poly 文件改变) 直接读取缓存;
+        """
+        if self.cache_dir is None:
+            buildings = self.map_info['building']
+            building_ids = buildings.ids if isinstance(buildings, PolygonLayerBuilder) else buildings.keys()
+            return read_building_levels(self.osm_file, way_ids=set(building_ids))
+        
+        building_levels = load_building_levels(self.cache_dir, self.osm_file)
+        if building_levels is None:
+            building_levels = read_building_levels(self.osm_file)
+            save_building_levels(self.cache_dir, self.osm_file, building_levels)
+        return building_levels
+
+    def create_spatial_index(self) -> None:
+        """为 lane, node 和 building 分别建立空间索引, 用于批量的点/范围查询
+        """
+        for object_type in ['lane', 'node', 'building']:
+            objects = self.map_info[object_type]
+            if isinstance(objects, PolygonLayer):
+                self.spatial_index[object_type] = PolygonIndex.from_polygon_infos(objects)
+            else:
+                self.spatial_index[object_type] = PolygonIndex.from_shapes(
+                    list(objects.keys()),
+                    [_poly.shape for _poly in objects.values()]
+                )
+
+    def query_point(self, xy:np.ndarray, object_type:str='lane') -> List[List[str]]:
+        """批量查询每个点所在的 object, 例如车辆所在的 lane
+
+        Args:
+            xy (np.ndarray): (N, 2) 的坐标
+            object_type (str, optional): lane, node 或 building. Defaults to 'lane'.
+        """
+        return self.spatial_index[object_type].query_point(xy)
+
+    def query_radius(self, xy:np.ndarray, radius:float, object_type:str='building') -> List[List[str]]:
+        """批量查询距离每个点 radius 以内的 object
+
+        Args:
+            xy (np.ndarray): (N, 2) 的坐标
+            radius (float): 查询的半径
+            object_type (str, optional): lane, node 或 building. Defaults to 'building'.
+        """
+        return self.spatial_index[object_type].query_radius(xy, radius)
+
+    def query_bbox(self, bboxes:np.ndarray, object_type:str='building') -> List[List[str]]:
+        """批量查询与每个区域 (x_min, y_min, x_max, y_max) 相交的 object
+
+        Args:
+            bboxes (np.ndarray): (N, 4) 的区域
+            object_type (str, optional): lane, node 或 building. Defaults to 'building'.
+        """
+        return self.spatial_index[object_type].query_bbox(bboxes)
 
     def get_objects_infos(self) -> None:
         """获得 map 的信息
         """
         all_poly_data = {
-            object_type: {poly_id: poly.get_features() for poly_id, poly in objects.items()} 
+            object_type: objects if isinstance(objects, PolygonLayer) # PolygonLayer 按需生成每个 polygon 的 dict
+            else {poly_id: poly.get_features() for poly_id, poly in objects.items()} 
             for object_type, objects in self.map_info.items()
         }
         return all_poly_data
@@ -0,0 +1,210 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 10:12:36
+@Description: 将 MapBuilder 的结果缓存到磁盘, 多次 reset 和多个进程之间可以直接复用
++ 缓存的 key 为输入文件 (net, poly, osm, radio map) 内容的 hash, 文件改变之后自动失效
++ 多边形的 shape 拼接为一个数组 (ragged layout, 配合 offsets, 与 PolygonLayer 相同), grid 保存为 .npy, 读取时使用 np.load(mmap_mode='r')
++ shape 的 dtype 与 MapBuilder 的结果相同 (dict 为 float64, PolygonLayer 为 float32), 读取缓存与重新计算的结果完全一致
+@LastEditTime: 2026-10-20 19:12:26
+'''
+import os
+import pickle
+import shutil
+import hashlib
+import numpy as np
+from loguru import logger
+from typing import Dict, Any, Optional
+
+from .grid import GridInfo
+from .polygon import PolygonLayer, PolygonView
+
+CACHE_VERSION = 3 # 缓存格式的版本, 修改格式之后需要 +1, 使得旧的缓存失效
+POLYGON_TYPES = ('lane', 'node', 'building')
+
+
+def hash_map_files(net_file:str,
+                   poly_file:str=None,
+                   osm_file:str=None,
+                   radio_map_files:Dict[str, str]=None,
+                   compact:bool=False
+    ) -> str:
+    """根据 MapBuilder 输入文件的内容计算 hash, 作为缓存的 key
+
+    Args:
+        net_file (str): sumo net 文件
+        poly_file (str, optional): 多边形文件. Defaults to None.
+        osm_file (str, optional): 原始 osm 文件. Defaults to None.
+        radio_map_files (Dict[str, str], optional): radio map 文件. Defaults to None.
+        compact (bool, optional): 是否为 compact 模式 (float32 的 PolygonLayer), 两种模式的缓存分开保存. Defaults to False.
+
+    Returns:
+        str: sha1 的十六进制字符串
+    """
+    sha = hashlib.sha1(f'tshub-map-cache-v{CACHE_VERSION}-compact{int(compact)}'.encode())
+    named_files = [('net', net_file), ('poly', poly_file), ('osm', osm_file)]
+    if radio_map_files is not None:
+        named_files += [(f'grid:{_name}', _path) for _name, _path in sorted(radio_map_files.items())]
+
+    for file_name, file_path in named_files:
+        sha.update(file_name.encode())
+        if file_path is None:
+            sha.update(b'<none>')
+            continue
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def hash_file(file_path:str, prefix:str='') -> str:
+    """计算单个文件内容的 sha1
+    """
+    sha = hashlib.sha1(f'{prefix}-v{CACHE_VERSION}'.encode())
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_building_levels(cache_dir:str, osm_file:str) -> Optional[Dict[str, str]]:
+    """读取缓存的 osm way_id -> building:levels 表, 缓存的 key 只和 osm 文件有关
+
+    Returns:
+        Optional[Dict[str, str]]: 缓存不存在时返回 None
+    """
+    cache_path = os.path.join(cache_dir, f'osm_levels_{hash_file(osm_file, "osm-levels")}.pkl')
+    if not os.path.isfile(cache_path):
+        return None
+    with open(cache_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_building_levels(cache_dir:str, osm_file:str, building_levels:Dict[str, str]) -> str:
+    """保存 osm 文件中所有 way 的 building:levels 表
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f'osm_levels_{hash_file(osm_file, "osm-levels")}.pkl')
+    tmp_path = f'{cache_path}.tmp-{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(building_levels, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def save_map_infos(cache_dir:str, cache_key:str, map_infos:Dict[str, Dict[str, Any]]) -> str:
+    """将 map_infos 保存到 cache_dir/cache_key 文件夹
+
+    先写入临时文件夹, 再通过 os.replace 原子性地重命名, 多个进程同时写入也不会读到不完整的缓存.
+
+    Args:
+        cache_dir (str): 缓存的根目录
+        cache_key (str): 缓存的 key, 见 hash_map_files
+        map_infos (Dict[str, Dict[str, Any]]): MapBuilder.get_objects_infos 的结果
+
+    Returns:
+        str: 缓存文件夹的路径
+    """
+    target_dir = os.path.join(cache_dir, cache_key)
+    if os.path.isdir(target_dir):
+        return target_dir
+
+    tmp_dir = os.path.join(cache_dir, f'{cache_key}.tmp-{os.getpid()}')
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    meta = {'version': CACHE_VERSION, 'polygon': {}, 'shape_type': {}, 'grid': {}}
+    # 多边形: shape 拼接为 (N, 2) 的数组, offsets 记录每个多边形的起点. 保持原来的 dtype, 非 compact 时不损失精度
+    for object_type in POLYGON_TYPES:
+        objects = map_infos.get(object_type, {})
+        shape_type = tuple
+        if isinstance(objects, (PolygonLayer, PolygonView)): # 直接使用拼接好的 shape
+            coords, offsets = objects.coords, objects.offsets
+            records = (
+                [objects.get_features_at(_index, with_shape=False) for _index in range(len(objects))]
+                if isinstance(objects, PolygonLayer) else objects.records
+            )
+            shape_type = getattr(objects, 'shape_type', tuple)
+        else:
+            records, shapes, offsets = [], [], [0]
+            for poly_id, poly in objects.items():
+                poly_shape = np.asarray(poly['shape'], dtype=np.float64).reshape(-1, 2)
+                shapes.append(poly_shape)
+                offsets.append(offsets[-1] + len(poly_shape))
+                records.append({k:v for k,v in poly.items() if k != 'shape'})
+                shape_type = type(poly['shape'])
+            coords = np.concatenate(shapes, axis=0) if shapes else np.zeros((0, 2), dtype=np.float64)
+        np.save(os.path.join(tmp_dir, f'{object_type}_coords.npy'), np.asarray(coords))
+        np.save(os.path.join(tmp_dir, f'{object_type}_offsets.npy'), np.asarray(offsets, dtype=np.int64))
+        meta['polygon'][object_type] = records
+        meta['shape_type'][object_type] = shape_type.__name__ # 读取时恢复为相同的容器类型
+
+    # grid: grid_z 和原始的 data 单独保存
+    for grid_index, (grid_name, grid) in enumerate(map_infos.get('grid', {}).items()):
+        np.save(os.path.join(tmp_dir, f'grid_{grid_index}_z.npy'), np.asarray(grid.grid_z))
+        np.save(os.path.join(tmp_dir, f'grid_{grid_index}_data.npy'), np.asarray(grid.data, dtype=np.float64).reshape(-1, 3))
+        meta['grid'][grid_name] = {
+            'index': grid_index,
+            'lower_left': grid.lower_left, 'upper_right': grid.upper_right,
+            'resolution': grid.resolution,
+            'x_min': grid.x_min, 'y_min': grid.y_min,
+            'x_max': grid.x_max, 'y_max': grid.y_max,
+        }
+
+    with open(os.path.join(tmp_dir, 'meta.pkl'), 'wb') as f:
+        pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    try:
+        os.replace(tmp_dir, target_dir)
+        logger.info(f'SIM: Save map cache to {target_dir}.')
+    except OSError: # 其他进程已经写入了相同的缓存
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return target_dir
+
+
+def load_map_infos(cache_dir:str, cache_key:str, mmap_mode:Optional[str]='r', compact:bool=False) -> Optional[Dict[str, Dict[str, Any]]]:
+    """从 cache_dir/cache_key 中读取 map_infos, 格式与 MapBuilder.get_objects_infos 相同
+
+    Args:
+        cache_dir (str): 缓存的根目录
+        cache_key (str): 缓存的 key
+        mmap_mode (str, optional): 传给 np.load, 多个进程可以共享同一份内存. Defaults to 'r'.
+        compact (bool, optional): 是否返回 PolygonLayer, 否则返回 PolygonView. 两种情况下 shape 都直接使用 mmap 的数组,
+            每个 polygon 的 dict 只在访问时生成. Defaults to False.
+
+    Returns:
+        Optional[Dict[str, Dict[str, Any]]]: 缓存不存在 (或版本不一致) 时返回 None
+    """
+    target_dir = os.path.join(cache_dir, cache_key)
+    meta_path = os.path.join(target_dir, 'meta.pkl')
+    if not os.path.isfile(meta_path):
+        return None
+
+    with open(meta_path, 'rb') as f:
+        meta = pickle.load(f)
+    if meta.get('version') != CACHE_VERSION:
+        logger.warning(f'SIM: Map cache {target_dir} is outdated, ignore it.')
+        return None
+
+    map_infos = {}
+    for object_type, records in meta['polygon'].items():
+        coords = np.load(os.path.join(target_dir, f'{object_type}_coords.npy'), mmap_mode=mmap_mode)
+        offsets = np.load(os.path.join(target_dir, f'{object_type}_offsets.npy'))
+        if compact:
+            map_infos[object_type] = PolygonLayer.from_features(records, coords=coords, offsets=offsets)
+        else: # 不复制 shape, 多个进程共享 mmap 的数组
+            shape_type = list if meta['shape_type'].get(object_type) == 'list' else tuple
+            map_infos[object_type] = PolygonView(records, coords=coords, offsets=offsets, shape_type=shape_type)
+
+    map_infos['grid'] = {}
+    for grid_name, grid_meta in meta['grid'].items():
+        grid_index = grid_meta['index']
+        map_infos['grid'][grid_name] = GridInfo(
+            lower_left=grid_meta['lower_left'], upper_right=grid_meta['upper_right'],
+            resolution=grid_meta['resolution'],
+            x_min=grid_meta['x_min'], y_min=grid_meta['y_min'],
+            x_max=grid_meta['x_max'], y_max=grid_meta['y_max'],
+            data=np.load(os.path.join(target_dir, f'grid_{grid_index}_data.npy'), mmap_mode=mmap_mode),
+            grid_z=np.load(os.path.join(target_dir, f'grid_{grid_index}_z.npy'), mmap_mode=mmap_mode),
+        )
+
+    logger.info(f'SIM: Load map cache from {target_dir}.')
+    return map_infos
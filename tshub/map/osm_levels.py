@@ -0,0 +1,52 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 15:02:18
+@Description: 流式读取 osm 文件中建筑物的层数 (building:levels)
++ 使用 iterparse 逐个元素读取, 在读取 tag 之前先判断 way 的 id 是否需要, 读取之后立即释放元素
++ https://wiki.openstreetmap.org/wiki/Key:building:levels
+@LastEditTime: 2026-10-19 15:02:18
+'''
+from typing import Dict, Set, Iterator, Tuple
+from xml.etree.ElementTree import iterparse
+
+BUILDING_LEVELS_KEY = 'building:levels'
+
+
+def iter_building_levels(osm_file:str, way_ids:Set[str]=None) -> Iterator[Tuple[str, str]]:
+    """遍历 osm 文件, 返回包含 building:levels 的 way 的 (way_id, levels)
+
+    Args:
+        osm_file (str): 原始 osm 文件
+        way_ids (Set[str], optional): 只返回这些 way 的信息, None 表示返回所有的 way. Defaults to None.
+
+    Yields:
+        Iterator[Tuple[str, str]]: (way_id, building:levels), levels 保持 osm 中的字符串
+    """
+    context = iterparse(osm_file, events=('start', 'end'))
+    _, root = next(context) # osm 的根节点, 每读取完一个元素就从根节点中删除
+
+    current_way, current_levels = None, None # 当前需要读取 tag 的 way
+    for event, elem in context:
+        if event == 'start':
+            if elem.tag == 'way':
+                way_id = elem.get('id')
+                current_way = way_id if (way_ids is None or way_id in way_ids) else None
+                current_levels = None
+            continue
+
+        if elem.tag == 'tag':
+            if current_way is not None and elem.get('k') == BUILDING_LEVELS_KEY:
+                current_levels = elem.get('v')
+        elif elem.tag == 'way':
+            if current_way is not None and current_levels is not None:
+                yield current_way, current_levels
+            current_way, current_levels = None, None
+            root.clear() # 释放已经读取的元素
+        elif elem.tag in ('node', 'relation'):
+            root.clear()
+
+
+def read_building_levels(osm_file:str, way_ids:Set[str]=None) -> Dict[str, str]:
+    """读取 osm 文件中 way_id -> building:levels 的对应关系
+    """
+    return dict(iter_building_levels(osm_file, way_ids))
@@ -3,10 +3,16 @@
 @Date: 2023-09-22 14:16:02
 @Description: 地图中 Polygon 的属性. Edge, Node and Buildings are all Polygon
 + building:levels: https://wiki.openstreetmap.org/wiki/Key:building:levels
-@LastEditTime: 2024-05-06 23:46:21
++ PolygonLayer: 将同一类 Polygon 按列保存 (ragged float32 shape + offsets), 用于大量建筑物的场景
++ PolygonLayerBuilder: 读取地图时直接写入 PolygonLayer 的列
++ PolygonView: 缓存中读取的 Polygon 的只读视图, shape 直接使用 mmap 的数组
+@LastEditTime: 2026-10-20 19:20:03
 '''
+import numpy as np
+from array import array
+from collections.abc import Mapping, ItemsView, ValuesView
 from dataclasses import dataclass, fields
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List, Iterator
 
 @dataclass
 class PolygonInfo:
@@ -51,4 +57,274 @@ class PolygonInfo:
             field_value = getattr(self, field_name)
             if field_name != 'sumo':
                 output_dict[field_name] = field_value
-        return output_dict
\ No newline at end of file
+        return output_dict
+
+
+class PolygonLayer(Mapping):
+    """按列保存的一组 Polygon, 行为与 {polygon_id: PolygonInfo.get_features()} 的 dict 相同, 
+    但是每个 polygon 的 dict 只在访问的时候才生成.
+
+    - 所有 shape 拼接为一个 float32 的数组 coords, 第 i 个 polygon 为 coords[offsets[i]:offsets[i+1]];
+    - id 保存为 numpy 的字符串数组, 通过排序后的 index 进行查找;
+    - edge_id, polygon_type, node_type 这类重复较多的字符串保存为 category + code;
+    - length, building_levels 和 node_coord 保存为 float32, 缺失的值为 nan;
+    """
+    def __init__(self, 
+                 ids: np.ndarray, coords: np.ndarray, offsets: np.ndarray,
+                 length: np.ndarray, building_levels: np.ndarray, node_coord: np.ndarray,
+                 categories: Dict[str, Tuple[List[str], np.ndarray]]
+        ) -> None:
+        self.ids = ids
+        self.coords = coords
+        self.offsets = offsets
+        self.length = length
+        self.building_levels = building_levels
+        self.node_coord = node_coord
+        self.categories = categories # field name -> (类别, 每个 polygon 的类别 index, -1 表示 None)
+        self._sorted_index = np.argsort(self.ids, kind='stable')
+
+    @staticmethod
+    def _to_float(value) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError): # None 或者 osm 中无法解析的层数, 例如 "3;4"
+            return np.nan
+
+    @staticmethod
+    def _encode(values: List[str]) -> Tuple[List[str], np.ndarray]:
+        categories = sorted({_v for _v in values if _v is not None})
+        lookup = {_v:_i for _i, _v in enumerate(categories)}
+        codes = np.array([lookup.get(_v, -1) if _v is not None else -1 for _v in values], dtype=np.int32)
+        return categories, codes
+
+    @classmethod
+    def from_polygons(cls, polygons: Dict[str, "PolygonInfo"]) -> "PolygonLayer":
+        """将 {polygon_id: PolygonInfo} 转换为 PolygonLayer
+        """
+        return cls.from_features([_poly.get_features() for _poly in polygons.values()])
+
+    @classmethod
+    def from_features(cls, 
+                      features: List[Dict[str, Any]], 
+                      coords: np.ndarray = None, offsets: np.ndarray = None
+        ) -> "PolygonLayer":
+        """从 PolygonInfo.get_features 格式的 dict 创建 PolygonLayer
+
+        Args:
+            features (List[Dict[str, Any]]): 每个 polygon 的信息
+            coords (np.ndarray, optional): 已经拼接好的 shape (例如从缓存中 mmap 读取), 此时 features 中不需要 shape. Defaults to None.
+            offsets (np.ndarray, optional): 与 coords 对应的 offsets. Defaults to None.
+        """
+        if coords is None:
+            shapes = [np.asarray(_poly['shape'], dtype=np.float32).reshape(-1, 2) for _poly in features]
+            offsets = np.zeros(len(shapes) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(_shape) for _shape in shapes])
+            coords = np.concatenate(shapes, axis=0) if shapes else np.zeros((0, 2), dtype=np.float32)
+
+        node_coord = np.full((len(features), 2), np.nan, dtype=np.float32)
+        for _index, _poly in enumerate(features):
+            if _poly['node_coord'] is not None:
+                node_coord[_index] = _poly['node_coord'][:2]
+        return cls(
+            ids=np.array([_poly['id'] for _poly in features], dtype=str),
+            coords=coords,
+            offsets=np.asarray(offsets, dtype=np.int64),
+            length=np.array([cls._to_float(_poly['length']) for _poly in features], dtype=np.float32),
+            building_levels=np.array([cls._to_float(_poly['building_levels']) for _poly in features], dtype=np.float32),
+            node_coord=node_coord,
+            categories={
+                _name: cls._encode([_poly[_name] for _poly in features])
+                for _name in ('edge_id', 'polygon_type', 'node_type')
+            }
+        )
+
+    def index_of(self, polygon_id: str) -> int:
+        """polygon id 对应的行, 不存在时返回 -1
+        """
+        position = np.searchsorted(self.ids, polygon_id, sorter=self._sorted_index)
+        if position < len(self.ids) and self.ids[self._sorted_index[position]] == polygon_id:
+            return int(self._sorted_index[position])
+        return -1
+
+    def get_shape(self, index: int) -> np.ndarray:
+        """第 index 个 polygon 的 shape, (K, 2) 的 float32 数组 (不复制)
+        """
+        return self.coords[self.offsets[index]:self.offsets[index+1]]
+
+    def get_features_at(self, index: int, with_shape: bool = True) -> Dict[str, Any]:
+        """生成第 index 个 polygon 的 dict, 与 PolygonInfo.get_features 的 key 相同, with_shape=False 时不包含 shape
+        """
+        def _category(name: str):
+            categories, codes = self.categories[name]
+            return categories[codes[index]] if codes[index] >= 0 else None
+        
+        def _optional(value: float):
+            return None if np.isnan(value) else float(value)
+        
+        node_coord = self.node_coord[index]
+        features = {
+            'id': str(self.ids[index]),
+            'edge_id': _category('edge_id'),
+            'length': float(self.length[index]),
+            'polygon_type': _category('polygon_type'),
+            'shape': tuple(map(tuple, self.get_shape(index).tolist())) if with_shape else None,
+            'building_levels': _optional(self.building_levels[index]),
+            'node_coord': None if np.isnan(node_coord[0]) else tuple(node_coord.tolist()),
+            'node_type': _category('node_type'),
+        }
+        if not with_shape:
+            del features['shape']
+        return features
+
+    def __getitem__(self, polygon_id: str) -> Dict[str, Any]:
+        index = self.index_of(polygon_id)
+        if index < 0:
+            raise KeyError(polygon_id)
+        return self.get_features_at(index)
+
+    def __contains__(self, polygon_id: object) -> bool:
+        return isinstance(polygon_id, str) and self.index_of(polygon_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(_id) for _id in self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def items(self) -> "_PolygonItemsView":
+        return _PolygonItemsView(self)
+
+    def values(self) -> "_PolygonValuesView":
+        return _PolygonValuesView(self)
+
+    @property
+    def nbytes(self) -> int:
+        """所有数组占用的内存 (bytes)
+        """
+        arrays = [self.ids, self.coords, self.offsets, self.length, self.building_levels, self.node_coord, self._sorted_index]
+        arrays += [_codes for _, _codes in self.categories.values()]
+        return sum(_array.nbytes for _array in arrays)
+
+
+class PolygonLayerBuilder:
+    """逐个添加 polygon, 直接写入按列的数组, 最后生成 PolygonLayer, 不需要先创建 PolygonInfo 和 tuple 的 shape
+    """
+    def __init__(self) -> None:
+        self.ids: List[str] = []
+        self.coords = array('f') # 所有 shape 拼接在一起 (x0, y0, x1, y1, ...)
+        self.offsets = array('q', [0])
+        self.length = array('f')
+        self.building_levels = array('f')
+        self.node_coord = array('f')
+        self.categories = {_name: ({}, array('i')) for _name in ('edge_id', 'polygon_type', 'node_type')} # 类别 -> code
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self,
+            id: str, edge_id: str, length: float, polygon_type: str, shape,
+            building_levels, node_coord: Tuple[float], node_type: str
+        ) -> None:
+        """参数与 PolygonInfo.create 相同, shape 可以是 sumo 的字符串 "x,y x,y" 或者点的列表
+        """
+        if isinstance(shape, str):
+            points = np.array(shape.replace(',', ' ').split(), dtype=np.float32)
+        else:
+            points = np.asarray(shape, dtype=np.float32).reshape(-1)
+        self.ids.append(id)
+        self.coords.frombytes(points.tobytes())
+        self.offsets.append(self.offsets[-1] + len(points) // 2)
+        self.length.append(PolygonLayer._to_float(length))
+        self.building_levels.append(PolygonLayer._to_float(building_levels))
+        self.node_coord.extend((np.nan, np.nan) if node_coord is None else node_coord[:2])
+        for _name, _value in (('edge_id', edge_id), ('polygon_type', polygon_type), ('node_type', node_type)):
+            lookup, codes = self.categories[_name]
+            codes.append(-1 if _value is None else lookup.setdefault(_value, len(lookup)))
+
+    def set_building_levels(self, building_levels: Dict[str, Any]) -> None:
+        """根据 {polygon_id: building:levels} 更新层数, 例如 osm 文件中读取的结果
+        """
+        for _index, _id in enumerate(self.ids):
+            if _id in building_levels:
+                self.building_levels[_index] = PolygonLayer._to_float(building_levels[_id])
+
+    def build(self) -> PolygonLayer:
+        categories = {}
+        for _name, (lookup, codes) in self.categories.items():
+            names = sorted(lookup) # 与 PolygonLayer._encode 相同, 类别按照排序后的顺序编码
+            remap = np.empty(len(lookup) + 1, dtype=np.int32)
+            remap[[lookup[_v] for _v in names]] = np.arange(len(names), dtype=np.int32)
+            remap[-1] = -1 # code 为 -1 (None) 时取最后一个
+            categories[_name] = (names, remap[np.frombuffer(codes, dtype=np.int32)])
+        return PolygonLayer(
+            ids=np.array(self.ids, dtype=str),
+            coords=np.frombuffer(self.coords, dtype=np.float32).reshape(-1, 2),
+            offsets=np.frombuffer(self.offsets, dtype=np.int64),
+            length=np.frombuffer(self.length, dtype=np.float32),
+            building_levels=np.frombuffer(self.building_levels, dtype=np.float32),
+            node_coord=np.frombuffer(self.node_coord, dtype=np.float32).reshape(-1, 2),
+            categories=categories
+        )
+
+
+class PolygonView(Mapping):
+    """从缓存中读取的一组 Polygon 的只读视图, 行为与 {polygon_id: PolygonInfo.get_features()} 的 dict 相同.
+
+    shape 保存在拼接好的 coords 中 (可以是 np.load(mmap_mode='r') 的数组, 多个进程共享同一份内存),
+    每个 polygon 的 dict 只在访问的时候才生成, 其余的属性与 PolygonInfo.get_features 完全相同.
+    """
+    def __init__(self, records: List[Dict[str, Any]], coords: np.ndarray, offsets: np.ndarray, shape_type: type = tuple) -> None:
+        self.records = records # 每个 polygon 除了 shape 之外的属性
+        self.coords = coords
+        self.offsets = offsets
+        self.shape_type = shape_type # shape 的容器类型, 与 MapBuilder 的结果相同 (lane 和 node 为 list, building 为 tuple)
+        self.ids = [_record['id'] for _record in records]
+        self._id_to_index = {_id:_index for _index, _id in enumerate(self.ids)}
+
+    def index_of(self, polygon_id: str) -> int:
+        """polygon id 对应的行, 不存在时返回 -1
+        """
+        return self._id_to_index.get(polygon_id, -1)
+
+    def get_shape(self, index: int) -> np.ndarray:
+        """第 index 个 polygon 的 shape, (K, 2) 的数组 (不复制)
+        """
+        return self.coords[self.offsets[index]:self.offsets[index+1]]
+
+    def get_features_at(self, index: int) -> Dict[str, Any]:
+        return {**self.records[index], 'shape': self.shape_type(map(tuple, self.get_shape(index).tolist()))}
+
+    def __getitem__(self, polygon_id: str) -> Dict[str, Any]:
+        index = self.index_of(polygon_id)
+        if index < 0:
+            raise KeyError(polygon_id)
+        return self.get_features_at(index)
+
+    def __contains__(self, polygon_id: object) -> bool:
+        return polygon_id in self._id_to_index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def items(self) -> "_PolygonItemsView":
+        return _PolygonItemsView(self)
+
+    def values(self) -> "_PolygonValuesView":
+        return _PolygonValuesView(self)
+
+
+class _PolygonItemsView(ItemsView):
+    """按行遍历, 不需要每次通过 id 查找
+    """
+    def __iter__(self):
+        for _index in range(len(self._mapping)):
+            yield str(self._mapping.ids[_index]), self._mapping.get_features_at(_index)
+
+
+class _PolygonValuesView(ValuesView):
+    def __iter__(self):
+        for _index in range(len(self._mapping)):
+            yield self._mapping.get_features_at(_index)
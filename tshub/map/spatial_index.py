@@ -0,0 +1,376 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 13:20:41
+@Description: 地图多边形的空间索引 (grid-bucket), 用于批量的点/范围查询
++ 每个多边形按照 bounding box 放入覆盖的 grid cell 中, 使用 CSR 的方式保存 (cell -> polygon index)
++ 查询时先通过 cell 找到候选的多边形, 再使用 numpy 对 (query, polygon) 对进行精确的判断
+@LastEditTime: 2026-10-20 17:52:18
+'''
+import numpy as np
+from typing import List, Tuple, Dict, Any, Iterable
+
+from .polygon import PolygonLayer, PolygonView
+
+
+def concat_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """将多个 arange(start, start+count) 拼接在一起, 不使用 python 循环
+
+    Args:
+        starts (np.ndarray): 每一段的起点
+        counts (np.ndarray): 每一段的长度
+
+    Returns:
+        np.ndarray: 拼接后的 index
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    segment_begin = np.cumsum(counts) - counts # 每一段在结果中的起点
+    return np.repeat(starts - segment_begin, counts) + np.arange(total, dtype=np.int64)
+
+
+def point_segment_distance(points: np.ndarray, seg_start: np.ndarray, seg_end: np.ndarray) -> np.ndarray:
+    """计算点到线段的距离, 三个输入都是 (N, 2), 逐行计算
+    """
+    seg = seg_end - seg_start
+    seg_len2 = np.einsum('ij,ij->i', seg, seg)
+    t = np.einsum('ij,ij->i', points - seg_start, seg) / np.where(seg_len2 > 0, seg_len2, 1)
+    t = np.clip(t, 0, 1)
+    closest = seg_start + t[:, None] * seg
+    return np.hypot(points[:, 0] - closest[:, 0], points[:, 1] - closest[:, 1])
+
+
+def segments_cross(p1: np.ndarray, p2: np.ndarray, q1: np.ndarray, q2: np.ndarray) -> np.ndarray:
+    """判断线段 p1-p2 与线段 q1-q2 是否相交, 四个输入都是 (N, 2), 逐行计算. 
+    端点相接 (例如穿过多边形的顶点) 与共线重叠 (例如沿着多边形的边) 也算作相交, 没有额外的容差
+
+    Args:
+        p1 (np.ndarray): 第一条线段的起点
+        p2 (np.ndarray): 第一条线段的终点
+        q1 (np.ndarray): 第二条线段的起点
+        q2 (np.ndarray): 第二条线段的终点
+
+    Returns:
+        np.ndarray: (N,) bool, True 表示相交
+    """
+    def _cross(o, a, b):
+        return (a[:, 0] - o[:, 0]) * (b[:, 1] - o[:, 1]) - (a[:, 1] - o[:, 1]) * (b[:, 0] - o[:, 0])
+    d1, d2 = _cross(q1, q2, p1), _cross(q1, q2, p2)
+    d3, d4 = _cross(p1, p2, q1), _cross(p1, p2, q2)
+    intersect = (d1 * d2 <= 0) & (d3 * d4 <= 0)
+    # 共线时上面的条件总是成立, 需要判断两条线段在直线上的投影是否重叠 (bounding box 是否重叠)
+    collinear = (d1 == 0) & (d2 == 0)
+    overlap = (np.minimum(p1, p2) <= np.maximum(q1, q2)).all(axis=1) & (np.minimum(q1, q2) <= np.maximum(p1, p2)).all(axis=1)
+    return intersect & (~collinear | overlap)
+
+
+class PolygonIndex:
+    """多边形的 grid-bucket 索引, 支持批量的 query_point, query_radius 和 query_bbox
+
+    Args:
+        ids (List[str]): 多边形的 id
+        coords (np.ndarray): 所有多边形的顶点拼接在一起, (M, 2)
+        offsets (np.ndarray): 第 i 个多边形的顶点为 coords[offsets[i]:offsets[i+1]]
+        cell_size (float, optional): grid 的大小, None 时使用多边形 bounding box 边长的中位数. Defaults to None.
+    """
+    def __init__(self, ids: List[str], coords: np.ndarray, offsets: np.ndarray, cell_size: float = None) -> None:
+        self.ids = np.asarray(ids, dtype=object)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.num_vertices = np.diff(self.offsets)
+
+        # 每个多边形的 bounding box, (N, 4) -> (x_min, y_min, x_max, y_max)
+        num_polygons = len(self.ids)
+        self.bboxes = np.full((num_polygons, 4), np.nan)
+        valid = self.num_vertices > 0
+        if valid.any():
+            starts = self.offsets[:-1][valid]
+            self.bboxes[valid, 0] = np.minimum.reduceat(self.coords[:, 0], starts)
+            self.bboxes[valid, 1] = np.minimum.reduceat(self.coords[:, 1], starts)
+            self.bboxes[valid, 2] = np.maximum.reduceat(self.coords[:, 0], starts)
+            self.bboxes[valid, 3] = np.maximum.reduceat(self.coords[:, 1], starts)
+
+        # 每条边的终点 (最后一个顶点连回第一个顶点)
+        next_vertex = np.arange(1, len(self.coords) + 1, dtype=np.int64)
+        next_vertex[self.offsets[1:][valid] - 1] = self.offsets[:-1][valid]
+        self.edge_end = self.coords[next_vertex] if len(self.coords) else self.coords
+
+        self._build_buckets(valid, cell_size)
+
+    @classmethod
+    def from_shapes(cls, ids: List[str], shapes: Iterable, cell_size: float = None) -> "PolygonIndex":
+        """从每个多边形的 shape (List[Tuple[float, float]]) 创建索引
+        """
+        shapes = [np.asarray(_shape, dtype=np.float64).reshape(-1, 2) for _shape in shapes]
+        offsets = np.zeros(len(shapes) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(_shape) for _shape in shapes])
+        coords = np.concatenate(shapes, axis=0) if shapes else np.zeros((0, 2))
+        return cls(ids, coords, offsets, cell_size)
+
+    @classmethod
+    def from_polygon_infos(cls, polygon_infos: Dict[str, Dict[str, Any]], cell_size: float = None) -> "PolygonIndex":
+        """从 map_infos 中的 lane/node/building 信息创建索引, 例如 map_infos['building']
+        """
+        if isinstance(polygon_infos, (PolygonLayer, PolygonView)): # 直接使用拼接好的 shape
+            return cls(polygon_infos.ids, polygon_infos.coords, polygon_infos.offsets, cell_size)
+        return cls.from_shapes(
+            list(polygon_infos.keys()),
+            [_poly['shape'] for _poly in polygon_infos.values()],
+            cell_size
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ###########
+    # Buckets
+    # ###########
+    def _build_buckets(self, valid: np.ndarray, cell_size: float) -> None:
+        """将每个多边形放入其 bounding box 覆盖的所有 cell 中
+        """
+        if valid.any():
+            bboxes = self.bboxes[valid]
+            self.origin = bboxes[:, :2].min(axis=0)
+            extent = np.maximum(bboxes[:, 2] - bboxes[:, 0], bboxes[:, 3] - bboxes[:, 1])
+            if cell_size is None:
+                cell_size = float(np.median(extent))
+            upper = bboxes[:, 2:].max(axis=0)
+        else:
+            self.origin, upper = np.zeros(2), np.zeros(2)
+        self.cell_size = max(cell_size or 1.0, 1e-6)
+        self.grid_shape = (np.floor((upper - self.origin) / self.cell_size).astype(np.int64) + 1)
+
+        polygon_index = np.flatnonzero(valid)
+        cell_x0, cell_y0, cell_x1, cell_y1 = self._bbox_to_cells(self.bboxes[polygon_index])
+        cell_keys, owners = self._expand_cells(cell_x0, cell_y0, cell_x1, cell_y1)
+        order = np.argsort(cell_keys, kind='stable')
+        cell_keys = cell_keys[order]
+        self.bucket_items = polygon_index[owners[order]] # cell 中的多边形
+        num_cells = int(self.grid_shape[0] * self.grid_shape[1])
+        self.bucket_offsets = np.searchsorted(cell_keys, np.arange(num_cells + 1)) # CSR
+
+    def _bbox_to_cells(self, bboxes: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """bounding box 覆盖的 cell 的范围 (已经裁剪到 grid 内部)
+        """
+        lower = np.floor((bboxes[:, :2] - self.origin) / self.cell_size).astype(np.int64)
+        upper = np.floor((bboxes[:, 2:] - self.origin) / self.cell_size).astype(np.int64)
+        lower = np.clip(lower, 0, self.grid_shape - 1)
+        upper = np.clip(upper, -1, self.grid_shape - 1)
+        return lower[:, 0], lower[:, 1], upper[:, 0], upper[:, 1]
+
+    def _expand_cells(self, cell_x0, cell_y0, cell_x1, cell_y1) -> Tuple[np.ndarray, np.ndarray]:
+        """将每个 cell 范围展开为 (cell key, owner) 的列表
+        """
+        num_x = np.maximum(cell_x1 - cell_x0 + 1, 0)
+        num_y = np.maximum(cell_y1 - cell_y0 + 1, 0)
+        counts = num_x * num_y
+        owners = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+        local = concat_ranges(np.zeros(len(counts), dtype=np.int64), counts)
+        cell_x = cell_x0[owners] + local // np.maximum(num_y[owners], 1)
+        cell_y = cell_y0[owners] + local % np.maximum(num_y[owners], 1)
+        return cell_x * self.grid_shape[1] + cell_y, owners
+
+    def candidate_pairs(self, bboxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """找到与 query bounding box 相交的所有 (query, polygon) 对
+
+        Args:
+            bboxes (np.ndarray): (N, 4) 的 query bounding box
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: query index 与 polygon index, 按照 query 排序且没有重复
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        if len(self) == 0 or len(bboxes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        cell_keys, query_index = self._expand_cells(*self._bbox_to_cells(bboxes))
+        starts = self.bucket_offsets[cell_keys]
+        counts = self.bucket_offsets[cell_keys + 1] - starts
+        pair_query = np.repeat(query_index, counts)
+        pair_polygon = self.bucket_items[concat_ranges(starts, counts)]
+
+        # 多边形可能出现在 query 的多个 cell 中, 需要去重
+        pair_keys = np.unique(pair_query * len(self) + pair_polygon)
+        pair_query, pair_polygon = pair_keys // len(self), pair_keys % len(self)
+
+        # bounding box 相交
+        query_box, poly_box = bboxes[pair_query], self.bboxes[pair_polygon]
+        overlap = (
+            (poly_box[:, 0] <= query_box[:, 2]) & (poly_box[:, 2] >= query_box[:, 0])
+            & (poly_box[:, 1] <= query_box[:, 3]) & (poly_box[:, 3] >= query_box[:, 1])
+        )
+        return pair_query[overlap], pair_polygon[overlap]
+
+    # ###########
+    # Geometry
+    # ###########
+    def _pair_edges(self, pair_polygon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """每个 (query, polygon) 对展开为多边形所有的边, 返回 pair index 和 edge index
+        """
+        counts = self.num_vertices[pair_polygon]
+        edge_pair = np.repeat(np.arange(len(pair_polygon), dtype=np.int64), counts)
+        edge_index = concat_ranges(self.offsets[:-1][pair_polygon], counts)
+        return edge_pair, edge_index
+
+    def contains(self, points: np.ndarray, pair_polygon: np.ndarray) -> np.ndarray:
+        """判断 points[i] 是否在多边形 pair_polygon[i] 内部 (even-odd rule)
+        """
+        edge_pair, edge_index = self._pair_edges(pair_polygon)
+        p = points[edge_pair]
+        a, b = self.coords[edge_index], self.edge_end[edge_index]
+        straddle = (a[:, 1] > p[:, 1]) != (b[:, 1] > p[:, 1])
+        dy = np.where(straddle, b[:, 1] - a[:, 1], 1)
+        x_cross = a[:, 0] + (p[:, 1] - a[:, 1]) * (b[:, 0] - a[:, 0]) / dy
+        crossing = straddle & (p[:, 0] < x_cross)
+        return np.bincount(edge_pair, weights=crossing, minlength=len(pair_polygon)) % 2 == 1
+
+    def distance(self, points: np.ndarray, pair_polygon: np.ndarray) -> np.ndarray:
+        """points[i] 到多边形 pair_polygon[i] 的距离, 在多边形内部时为 0
+        """
+        distances = np.full(len(pair_polygon), np.inf)
+        if len(pair_polygon) == 0:
+            return distances
+        edge_pair, edge_index = self._pair_edges(pair_polygon)
+        edge_distance = point_segment_distance(points[edge_pair], self.coords[edge_index], self.edge_end[edge_index])
+        np.minimum.at(distances, edge_pair, edge_distance)
+        distances[self.contains(points, pair_polygon)] = 0
+        return distances
+
+    def crosses_segments(self, seg_start: np.ndarray, seg_end: np.ndarray, pair_polygon: np.ndarray) -> np.ndarray:
+        """判断线段 seg_start[i]-seg_end[i] 是否穿过多边形 pair_polygon[i] (与任意一条边相交或相接, 或端点在多边形内部)
+        """
+        if len(pair_polygon) == 0:
+            return np.zeros(0, dtype=bool)
+        edge_pair, edge_index = self._pair_edges(pair_polygon)
+        edge_cross = segments_cross(
+            seg_start[edge_pair], seg_end[edge_pair],
+            self.coords[edge_index], self.edge_end[edge_index]
+        )
+        crossed = np.bincount(edge_pair, weights=edge_cross, minlength=len(pair_polygon)) > 0
+        # 没有与边相交时, 两个端点同时在多边形的内部或外部, 只需要判断起点
+        not_crossed = np.flatnonzero(~crossed)
+        crossed[not_crossed] = self.contains(seg_start[not_crossed], pair_polygon[not_crossed])
+        return crossed
+
+    def segment_candidate_pairs(self, seg_start: np.ndarray, seg_end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """找到 bounding box 与线段相交的 (segment, polygon) 对
+
+        长的线段被切分为长度不超过 cell_size 的小段, 每个小段的 bounding box 只覆盖少量的 cell
+        """
+        seg_start = np.asarray(seg_start, dtype=np.float64).reshape(-1, 2)
+        seg_end = np.asarray(seg_end, dtype=np.float64).reshape(-1, 2)
+        if len(self) == 0 or len(seg_start) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        length = np.hypot(*(seg_end - seg_start).T)
+        num_pieces = np.maximum(np.ceil(length / self.cell_size).astype(np.int64), 1)
+        piece_owner = np.repeat(np.arange(len(seg_start), dtype=np.int64), num_pieces)
+        piece_index = concat_ranges(np.zeros(len(seg_start), dtype=np.int64), num_pieces)
+        t0 = (piece_index / num_pieces[piece_owner])[:, None]
+        t1 = ((piece_index + 1) / num_pieces[piece_owner])[:, None]
+        delta = seg_end[piece_owner] - seg_start[piece_owner]
+        piece_start = seg_start[piece_owner] + t0 * delta
+        piece_end = seg_start[piece_owner] + t1 * delta
+        piece_bboxes = np.hstack([np.minimum(piece_start, piece_end), np.maximum(piece_start, piece_end)])
+
+        # 相邻的小段会覆盖相同的 cell, 先对 (segment, cell) 去重
+        cell_keys, piece_query = self._expand_cells(*self._bbox_to_cells(piece_bboxes))
+        num_cells = int(self.grid_shape[0] * self.grid_shape[1])
+        segment_cells = np.unique(piece_owner[piece_query] * num_cells + cell_keys)
+        segment_index, cell_keys = segment_cells // num_cells, segment_cells % num_cells
+
+        starts = self.bucket_offsets[cell_keys]
+        counts = self.bucket_offsets[cell_keys + 1] - starts
+        pair_keys = np.unique(
+            np.repeat(segment_index, counts) * len(self) + self.bucket_items[concat_ranges(starts, counts)]
+        )
+        pair_segment, pair_polygon = pair_keys // len(self), pair_keys % len(self)
+
+        # 线段与多边形的 bounding box 相交
+        seg_box = np.hstack([np.minimum(seg_start, seg_end), np.maximum(seg_start, seg_end)])[pair_segment]
+        poly_box = self.bboxes[pair_polygon]
+        overlap = (
+            (poly_box[:, 0] <= seg_box[:, 2]) & (poly_box[:, 2] >= seg_box[:, 0])
+            & (poly_box[:, 1] <= seg_box[:, 3]) & (poly_box[:, 3] >= seg_box[:, 1])
+        )
+        pair_segment, pair_polygon, poly_box = pair_segment[overlap], pair_polygon[overlap], poly_box[overlap]
+
+        # bounding box 的四个角都在线段所在直线的同一侧时, 线段与多边形不相交
+        direction = (seg_end - seg_start)[pair_segment]
+        origin = seg_start[pair_segment]
+        side = np.stack([
+            direction[:, 0] * (poly_box[:, _y] - origin[:, 1]) - direction[:, 1] * (poly_box[:, _x] - origin[:, 0])
+            for _x, _y in ((0, 1), (0, 3), (2, 1), (2, 3))
+        ], axis=1)
+        straddle = (side.min(axis=1) <= 0) & (side.max(axis=1) >= 0)
+        return pair_segment[straddle], pair_polygon[straddle]
+
+    # ###########
+    # Queries
+    # ###########
+    def _group(self, num_queries: int, pair_query: np.ndarray, pair_polygon: np.ndarray) -> List[List[str]]:
+        """将 (query, polygon) 对整理为每个 query 的 id 列表
+        """
+        split_index = np.searchsorted(pair_query, np.arange(1, num_queries))
+        return [self.ids[_index].tolist() for _index in np.split(pair_polygon, split_index)]
+
+    def query_point(self, xy: np.ndarray) -> List[List[str]]:
+        """批量查询包含每个点的多边形
+
+        Args:
+            xy (np.ndarray): (N, 2) 的坐标
+
+        Returns:
+            List[List[str]]: 每个点所在的多边形 id
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        pair_query, pair_polygon = self.candidate_pairs(np.hstack([xy, xy]))
+        inside = self.contains(xy[pair_query], pair_polygon)
+        return self._group(len(xy), pair_query[inside], pair_polygon[inside])
+
+    def query_radius(self, xy: np.ndarray, radius: float) -> List[List[str]]:
+        """批量查询与每个点距离不超过 radius 的多边形
+
+        Args:
+            xy (np.ndarray): (N, 2) 的坐标
+            radius (float): 查询的半径, 也可以是 (N,) 的数组
+
+        Returns:
+            List[List[str]]: 每个点附近的多边形 id
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(xy),))
+        pair_query, pair_polygon = self.candidate_pairs(
+            np.hstack([xy - radius[:, None], xy + radius[:, None]])
+        )
+        near = self.distance(xy[pair_query], pair_polygon) <= radius[pair_query]
+        return self._group(len(xy), pair_query[near], pair_polygon[near])
+
+    def query_segments(self, seg_start: np.ndarray, seg_end: np.ndarray) -> List[List[str]]:
+        """批量查询每条线段穿过的多边形
+
+        Args:
+            seg_start (np.ndarray): (N, 2) 线段的起点
+            seg_end (np.ndarray): (N, 2) 线段的终点
+
+        Returns:
+            List[List[str]]: 每条线段穿过的多边形 id
+        """
+        seg_start = np.asarray(seg_start, dtype=np.float64).reshape(-1, 2)
+        seg_end = np.asarray(seg_end, dtype=np.float64).reshape(-1, 2)
+        pair_segment, pair_polygon = self.segment_candidate_pairs(seg_start, seg_end)
+        crossed = self.crosses_segments(seg_start[pair_segment], seg_end[pair_segment], pair_polygon)
+        return self._group(len(seg_start), pair_segment[crossed], pair_polygon[crossed])
+
+    def query_bbox(self, bboxes: np.ndarray) -> List[List[str]]:
+        """批量查询 bounding box 与每个 query 区域相交的多边形
+
+        Args:
+            bboxes (np.ndarray): (N, 4) 的区域, 每一行为 (x_min, y_min, x_max, y_max)
+
+        Returns:
+            List[List[str]]: 每个区域内的多边形 id
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        pair_query, pair_polygon = self.candidate_pairs(bboxes)
+        return self._group(len(bboxes), pair_query, pair_polygon)
@@ -1,21 +1,85 @@
 '''
 @Author: WANG Maonan
 @Date: 2023-08-31 14:16:34
-@Description: 生成 trip 文件, 这里有两个步骤:
-1. generate_trip_xml, 按照要求给每个 edge 生成 trip
-2. edit_trip_xml, 对 trip 按照时间顺序排序
-LastEditTime: 2025-04-21 15:33:10
+@Description: 生成 trip 文件, 每个 edge 的 flow 按照时间顺序生成, 合并 (heapq.merge) 后直接写入文件
+LastEditTime: 2026-10-20 10:02:51
 '''
 import os
+import heapq
 import random
-import sumolib
-from typing import Dict, List
-from xml.dom import pulldom
+from typing import Dict, Iterator, List, Tuple
 from loguru import logger
 
 from ...utils.check_folder import check_folder
 from ...utils.normalization_dict import normalize_dict
 
+
+def get_vtype_lines(veh_type:Dict[str, Dict[str, float]], default_color:str='yellow') -> Tuple[List[str], Dict[str, float]]:
+    """每种车辆的 vType, 以及每种车辆出现的概率 (归一化)
+
+    Args:
+        veh_type (Dict[str, Dict[str, float]]): 车辆类型的定义, 见 GenerateTrip
+        default_color (str, optional): 没有设置 color 时车辆的颜色. Defaults to 'yellow'.
+
+    Returns:
+        Tuple[List[str], Dict[str, float]]: 每种车辆的 <vType/> 行, 以及 {vehicle_type: probability}
+    """
+    KNOWN_ATTRIBUTES = {'color', 'length', 'tau', 'speed'}
+    IGNORE_ATTRIBUTES = {'probability'} # 被忽略的特征
+    DEFAULTS = {'color': default_color, 'length': 5, 'tau': 1, 'speed': 17}
+    DOC_URL = "https://sumo.dlr.de/docs/Definition_of_Vehicles%2C_Vehicle_Types%2C_and_Routes.html#available_vtype_attributes"
+    vtype_lines = []
+    vehID_prob = {} # 每辆车的概率, {'veh_1':0.7, 'veh_2':0.3}
+
+    for vehicle_id, vehicle_info in veh_type.items():
+        attributes = [] # 添加车辆的属性
+        for key, value in vehicle_info.items():
+            if key in KNOWN_ATTRIBUTES:
+                # Format known attributes with their defaults if necessary
+                value = float(value) if key in {'length', 'tau', 'speed'} else value
+                attributes.append('{}="{}"'.format(key, value))
+            elif key in IGNORE_ATTRIBUTES:
+                pass
+            else:
+                # Log a warning for unknown attributes
+                logger.warning(f"SIM: '{key}' is not a known attribute. Check the documentation for valid attributes. {DOC_URL}.")
+                attributes.append('{}="{}"'.format(key, value))
+
+        # Fill in defaults for any missing known attributes
+        for attr, default in DEFAULTS.items():
+            if attr not in vehicle_info:
+                default_value = float(default) if attr in {'length', 'tau', 'speed'} else default
+                attributes.append('{}="{}"'.format(attr, default_value))
+
+        vtype_lines.append('    <vType id="{}" {} />\n'.format(vehicle_id, ' '.join(attributes)))
+        vehID_prob[vehicle_id] = vehicle_info.get('probability', 0.1) # 添加每种车辆出现的概率
+    return vtype_lines, normalize_dict(vehID_prob) # 概率归一化
+
+
+def draw_vehicle_counts(flow_list:List[float], vehID_prob:Dict[str, float]) -> List[Dict[str, int]]:
+    """使用全局的 random 为每个时间段的每辆车抽取车辆类型, 返回每个时间段每种车辆的数量
+
+    每辆车调用一次 random.random() (random.choices 的 k 次抽样与 k 次 k=1 的抽样相同), 与之前逐辆车调用
+    random.choices(...)[0] 消耗相同的随机数, 因此 random.seed 之后得到的结果不变.
+
+    Args:
+        flow_list (List[float]): 每个时间段的车辆数
+        vehID_prob (Dict[str, float]): 每种车辆出现的概率
+
+    Returns:
+        List[Dict[str, int]]: 每个时间段的 {vehicle_type: count}
+    """
+    vehicle_types = list(vehID_prob.keys()) # 车辆类型
+    vehicle_weights = list(vehID_prob.values()) # 车辆概率
+    interval_counts = []
+    for flow_interval in flow_list:
+        vehicle_counts = {vehicle_type: 0 for vehicle_type in vehicle_types}
+        for selected_vehicle in random.choices(vehicle_types, weights=vehicle_weights, k=round(flow_interval)):
+            vehicle_counts[selected_vehicle] += 1
+        interval_counts.append(vehicle_counts)
+    return interval_counts
+
+
 class GenerateTrip(object):
     def __init__(self, 
                 intervals:List[float], 
@@ -88,127 +152,57 @@ class GenerateTrip(object):
         return output
 
 
-    def generate_trip_xml(self) -> None:
-        """生成按照时间排序前的 trip 文件
+    def _get_vtype_lines(self) -> Tuple[List[str], Dict[str, float]]:
+        """每种车辆的 vType, 以及每种车辆出现的概率 (归一化)
         """
-        blank_hours = 0  # 空白时间, 每小时车辆时间的间隔, 这里单位是秒 (暂时不需要空白时间)
-        with open('testflow_tmp.trip.xml', 'w') as file:
-            file.write("<routes> \n")
-
-            # 在 trip.xml 中添加车辆信息
-            KNOWN_ATTRIBUTES = {'color', 'length', 'tau', 'speed'}
-            IGNORE_ATTRIBUTES = {'probability'} # 被忽略的特征
-            DEFAULTS = {'color': 'yellow', 'length': 5, 'tau': 1, 'speed': 17}
-            DOC_URL = "https://sumo.dlr.de/docs/Definition_of_Vehicles%2C_Vehicle_Types%2C_and_Routes.html#available_vtype_attributes"
-            vehID_prob = {} # 每辆车的概率, {'veh_1':0.7, 'veh_2':0.3}
-           
-            for vehicle_id, vehicle_info in self.veh_type.items():
-                attributes = [] # 添加车辆的属性
-                for key, value in vehicle_info.items():
-                    if key in KNOWN_ATTRIBUTES:
-                        # Format known attributes with their defaults if necessary
-                        value = float(value) if key in {'length', 'tau', 'speed'} else value
-                        attributes.append('{}="{}"'.format(key, value))
-                    elif key in IGNORE_ATTRIBUTES:
-                        pass
-                    else:
-                        # Log a warning for unknown attributes
-                        logger.warning(f"SIM: '{key}' is not a known attribute. Check the documentation for valid attributes. {DOC_URL}.")
-                        attributes.append('{}="{}"'.format(key, value))
-
-                # Fill in defaults for any missing known attributes
-                for attr, default in DEFAULTS.items():
-                    if attr not in vehicle_info:
-                        default_value = float(default) if attr in {'length', 'tau', 'speed'} else default
-                        attributes.append('{}="{}"'.format(attr, default_value))
-
-                file.write('    <vType id="{}" {} />\n'.format(vehicle_id, ' '.join(attributes)))
-                vehID_prob[vehicle_id] = vehicle_info.get('probability', 0.1) # 添加每种车辆出现的概率
-            vehID_prob = normalize_dict(vehID_prob) # 概率归一化
-
-            # 在 trip.xml 中添加车辆信息
-            for edge_id, edge_flow_list in self.edge_flow.items():
-                for interval_index, edge_flow_interval in enumerate(edge_flow_list): # edge_flow_interval 为每段时间的车辆
-                    begin_time = 60 * sum(self.intervals[:int(interval_index)]) + int(interval_index) * blank_hours # 秒
-                    end_time = begin_time + 60 * self.intervals[int(interval_index)]
-
-                    # 生成每一种 vehicle type 的车辆数
-                    vehicle_types = list(vehID_prob.keys()) # 车辆类型
-                    vehicle_weights = list(vehID_prob.values()) # 车辆概览
-                    vehicle_counts = {vehicle_type: 0 for vehicle_type in vehicle_types} # c车辆数量
-                    for _ in range(round(edge_flow_interval)): # 车辆数
-                        selected_vehicle = random.choices(vehicle_types, weights=vehicle_weights)[0]
-                        vehicle_counts[selected_vehicle] += 1
-                    
-                    # 不同的 vehicle type 生成不同的车辆
-                    for _vehicle_type, count in vehicle_counts.items():
-                        edge_trip_id = f'{edge_id}__{interval_index}__{_vehicle_type}'
-                        file.write('    <flow id="{}" begin="{}" end="{}" from="{}" number="{}" type="{}"/> \n'.format(
-                            edge_trip_id,
-                            int(begin_time), int(end_time),
-                            edge_id, count,
-                            _vehicle_type
-                        ))
-            file.write("</routes> \n\n")
-
-            logger.info('SIM: =>trip 文件生成成功.')
+        return get_vtype_lines(self.veh_type)
 
-    def edit_trip_xml(self) -> None:
-        """对 trip 文件进行排序, 按照 begin time 来进行排序, 保证之后生成的 route 文件是有序的
+    def _iter_edge_flows(self, edge_id:str, interval_counts:List[Dict[str, int]]) -> Iterator[Tuple[float, str]]:
+        """一个 edge 的所有 flow, 按照 begin time 的顺序产生 (begin_time, xml)
+
+        Args:
+            edge_id (str): 车辆出发的 edge
+            interval_counts (List[Dict[str, int]]): 每个时间段每种车辆的数量, 见 draw_vehicle_counts
         """
-        outfile = open(self.output_file, 'w')
-        # copy header
-        for line in open('testflow_tmp.trip.xml'):
-            if (line.find('<routes') == 0 or
-                    line.find('<additional') == 0):
-                break
-            else:
-                outfile.write(line)
-        self._sort_departs('testflow_tmp.trip.xml', outfile)
-        outfile.close()
-        os.remove('testflow_tmp.trip.xml') # 删除中间的 trip 文件 (按照时间排序前)
-        logger.info('SIM: =>trip 成功进行排序, 修改成功.')
+        blank_hours = 0  # 空白时间, 每小时车辆时间的间隔, 这里单位是秒 (暂时不需要空白时间)
+        begin_time = 0
+        for interval_index, vehicle_counts in enumerate(interval_counts):
+            end_time = begin_time + 60 * self.intervals[interval_index]
+            # 不同的 vehicle type 生成不同的车辆
+            for _vehicle_type, count in vehicle_counts.items():
+                edge_trip_id = f'{edge_id}__{interval_index}__{_vehicle_type}'
+                yield int(begin_time), '    <flow id="{}" begin="{}" end="{}" from="{}" number="{}" type="{}"/>\n'.format(
+                    edge_trip_id,
+                    int(begin_time), int(end_time),
+                    edge_id, count,
+                    _vehicle_type
+                )
+            begin_time = end_time + blank_hours
 
+    def generate_trip_xml(self) -> None:
+        """生成按照 begin time 排序的 trip 文件
 
-    def _sort_departs(self, routefilename:str, outfile:str) -> None:
-        """对 trip 文件中的 flow 按照时间进行排序
+        每个 edge 的 flow 本身就是按照时间排序的, 使用 heapq.merge 合并所有 edge 的 flow 并直接写入 self.output_file,
+        不需要中间文件, 也不需要重新读取排序. begin time 相同时, 保持 edge 在 edge_flow_per_minute 中的顺序.
+        """
+        vtype_lines, vehID_prob = self._get_vtype_lines()
+        # 车辆类型先按照 edge, 时间段的顺序使用全局的 random 抽取 (与之前的结果相同), 之后只合并格式化的 flow
+        edge_flows = [
+            self._iter_edge_flows(edge_id, draw_vehicle_counts(edge_flow_list, vehID_prob))
+            for edge_id, edge_flow_list in self.edge_flow.items()
+        ]
+
+        num_flows = 0
+        with open(self.output_file, 'w') as file:
+            file.write("<routes>\n")
+            file.writelines(vtype_lines)
+            for _, flow_xml in heapq.merge(*edge_flows, key=lambda _flow: _flow[0]):
+                file.write(flow_xml)
+                num_flows += 1
+            file.write("</routes>\n")
+        logger.info(f'SIM: =>trip 文件生成成功, 按照时间顺序写入 {num_flows} 个 flow.')
 
-        Args:
-            routefilename (str): 输入文件的名称
-            outfile (str): 输出文件的名称
+    def edit_trip_xml(self) -> None:
+        """保留接口. generate_trip_xml 生成的 trip 文件已经按照 begin time 排序, 不需要再次排序
         """
-        DEPART_ATTRS = {'vehicle': 'depart', 'trip': 'depart', 'flow': 'begin', 'person': 'depart'}
-        routes_doc = pulldom.parse(routefilename)
-        vehicles = []
-        root = None
-        for event, parsenode in routes_doc:
-            if event == pulldom.START_ELEMENT:
-                if root is None:
-                    root = parsenode.localName
-                    outfile.write("<%s>\n" % root)
-                    continue
-                routes_doc.expandNode(parsenode)
-                departAttr = DEPART_ATTRS.get(parsenode.localName)
-                if departAttr is not None:
-                    startString = parsenode.getAttribute(departAttr)
-                    if ':' in startString:
-                        start = sumolib.miscutils.parseTime(startString)
-                    elif startString == "triggered":
-                        start = -1  # before everything else
-                    else:
-                        start = float(startString)
-                    vehicles.append(
-                        (start, parsenode.toprettyxml(indent="", newl="")))
-                else:
-                    # copy to output
-                    outfile.write(
-                        " " * 4 + parsenode.toprettyxml(indent="", newl="") + "\n")
-
-        logger.info('SIM: Read %s elements.' % len(vehicles))
-        vehicles.sort(key=lambda v: v[0])
-        for depart, vehiclexml in vehicles:
-            outfile.write(" " * 4)
-            outfile.write(vehiclexml)
-            outfile.write("\n")
-        outfile.write("</%s>\n" % root)
-        logger.info('SIM: Wrote %s elements.' % len(vehicles))
\ No newline at end of file
+        logger.info('SIM: =>trip 文件已经按照时间排序.')
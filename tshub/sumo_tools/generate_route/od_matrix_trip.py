@@ -0,0 +1,246 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-20 13:05:22
+@Description: 从稀疏的 OD 矩阵 (zones × zones × intervals) 批量采样 trip
++ OD 矩阵只保存非零的元素 (origin, destination, interval, count), 可以从 npz 或 csv 读取
++ zone 通过 TAZ (tazSource/tazSink 或 edges) 对应到 edge, 每个 zone 的 edge 按照权重采样
++ 每个时间段使用一次 multinomial 分配车辆, 出发时间在时间段内均匀抖动; 时间段之间没有重叠, 因此逐个时间段排序并写出, 内存只与一个时间段有关
+@LastEditTime: 2026-10-20 13:05:22
+'''
+import os
+import csv
+import sumolib
+import numpy as np
+import scipy.sparse as sp
+from loguru import logger
+from typing import Dict, Iterator, List, Tuple, Union
+
+from .generate_trip import get_vtype_lines
+from ...utils.check_folder import check_folder
+
+
+class ODMatrix(object):
+    def __init__(self,
+                 zones:List[str],
+                 intervals:List[float],
+                 origin:np.ndarray,
+                 destination:np.ndarray,
+                 interval:np.ndarray,
+                 count:np.ndarray
+        ) -> None:
+        """稀疏的 OD 矩阵, 第 i 个非零元素表示第 interval[i] 个时间段从 zones[origin[i]] 到 zones[destination[i]] 的车辆数 count[i]
+
+        Args:
+            zones (List[str]): 所有 zone 的 id
+            intervals (List[float]): 每个时间段的长度 (分钟)
+            origin (np.ndarray): (M,) origin zone 的 index
+            destination (np.ndarray): (M,) destination zone 的 index
+            interval (np.ndarray): (M,) 时间段的 index
+            count (np.ndarray): (M,) 时间段内的车辆数 (可以是小数)
+        """
+        self.zones = [str(_zone) for _zone in zones]
+        self.intervals = np.asarray(intervals, dtype=np.float64)
+        self.origin = np.asarray(origin, dtype=np.int64)
+        self.destination = np.asarray(destination, dtype=np.int64)
+        self.interval = np.asarray(interval, dtype=np.int64)
+        self.count = np.asarray(count, dtype=np.float64)
+        assert np.all(self.count >= 0), 'The counts of the OD matrix should be non-negative.'
+
+    @classmethod
+    def load(cls, path:str, intervals:List[float]=None) -> 'ODMatrix':
+        """读取 OD 矩阵
+
+        支持的格式:
+            - .npz, 包含 origin, destination, interval, count, zones (可选 intervals) 数组;
+            - .npz, scipy.sparse.save_npz 保存的 (zones, zones) 矩阵, 只有一个时间段, zone 的 id 为 0, 1, 2, ...;
+            - .csv, 表头为 origin,destination,interval,count, origin 和 destination 为 zone 的 id.
+
+        Args:
+            path (str): OD 矩阵的文件
+            intervals (List[float], optional): 每个时间段的长度 (分钟), 文件中没有保存时需要给出. Defaults to None.
+        """
+        if path.endswith('.csv'):
+            return cls._load_csv(path, intervals)
+
+        with np.load(path, allow_pickle=False) as data:
+            if 'format' in data.files: # scipy.sparse.save_npz (csr, csc, coo 等格式都会保存 format)
+                matrix = sp.load_npz(path).tocoo()
+                zones = list(range(max(matrix.shape)))
+                interval = np.zeros(matrix.nnz, dtype=np.int64)
+                return cls(zones, intervals or [60], matrix.row, matrix.col, interval, matrix.data)
+            if intervals is None:
+                assert 'intervals' in data.files, f'{path} does not contain intervals, please pass them.'
+                intervals = data['intervals']
+            return cls(
+                data['zones'].tolist(), intervals,
+                data['origin'], data['destination'], data['interval'], data['count']
+            )
+
+    @classmethod
+    def _load_csv(cls, path:str, intervals:List[float]) -> 'ODMatrix':
+        """逐行读取 csv, zone 按照第一次出现的顺序编号
+        """
+        assert intervals is not None, 'Please pass the intervals of the csv OD matrix.'
+        zone_index = {}
+        origin, destination, interval, count = [], [], [], []
+        with open(path, newline='') as f:
+            for row in csv.DictReader(f):
+                origin.append(zone_index.setdefault(row['origin'], len(zone_index)))
+                destination.append(zone_index.setdefault(row['destination'], len(zone_index)))
+                interval.append(int(row['interval']))
+                count.append(float(row['count']))
+        return cls(list(zone_index.keys()), intervals, origin, destination, interval, count)
+
+    def save(self, path:str) -> None:
+        """保存为 npz 格式, 可以使用 ODMatrix.load 读取
+        """
+        np.savez_compressed(
+            path, zones=np.asarray(self.zones), intervals=self.intervals,
+            origin=self.origin, destination=self.destination, interval=self.interval, count=self.count
+        )
+
+
+def read_taz(taz_file:str) -> Dict[str, Dict[str, Tuple[List[str], List[float]]]]:
+    """读取 SUMO 的 TAZ 文件, 返回每个 zone 的 source 与 sink edge 以及权重
+
+    <taz id="1" edges="E1 E2"/> 的 source 与 sink 均为 E1 与 E2 (权重相同);
+    <taz id="2"><tazSource id="E3" weight="0.7"/><tazSink id="E4" weight="1"/></taz> 使用设置的权重.
+
+    Returns:
+        Dict[str, Dict[str, Tuple[List[str], List[float]]]]: {zone: {'source': (edges, weights), 'sink': (edges, weights)}}
+    """
+    taz_infos = {}
+    for taz in sumolib.xml.parse(taz_file, 'taz'):
+        edges = taz.edges.split() if taz.hasAttribute('edges') and taz.edges else []
+        children = taz.getChildList()
+        sources = [_child for _child in children if _child.name == 'tazSource']
+        sinks = [_child for _child in children if _child.name == 'tazSink']
+        source = ([_source.id for _source in sources], [float(_source.weight) for _source in sources])
+        sink = ([_sink.id for _sink in sinks], [float(_sink.weight) for _sink in sinks])
+        taz_infos[taz.id] = {
+            'source': source if source[0] else (edges, [1.0] * len(edges)),
+            'sink': sink if sink[0] else (edges, [1.0] * len(edges)),
+        }
+    return taz_infos
+
+
+class ODTripSampler(object):
+    def __init__(self,
+                 taz:Union[str, Dict[str, List[str]]],
+                 veh_type:Dict[str, Dict[str, float]]
+        ) -> None:
+        """根据 OD 矩阵采样 trip
+
+        Args:
+            taz (Union[str, Dict[str, List[str]]]): TAZ 文件, 或者每个 zone 对应的 edge, 例如 {'zone_1': ['E1', 'E2'], ...}
+            veh_type (Dict[str, Dict[str, float]]): 车辆类型, 与 GenerateTrip 相同
+        """
+        if isinstance(taz, str):
+            taz_infos = read_taz(taz)
+        else:
+            taz_infos = {
+                str(_zone): {'source': (list(_edges), [1.0] * len(_edges)), 'sink': (list(_edges), [1.0] * len(_edges))}
+                for _zone, _edges in taz.items()
+            }
+        self.taz_infos = taz_infos
+        self.veh_type = veh_type
+        self.vtype_lines, vehID_prob = get_vtype_lines(veh_type, default_color='red')
+        self.vehicle_types = np.asarray(list(vehID_prob.keys()), dtype=object)
+        self.vehicle_weights = np.asarray(list(vehID_prob.values()), dtype=np.float64)
+
+    def _build_zone_edges(self, zones:List[str], used:np.ndarray, side:str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """每个 zone 的 edge (CSR 格式) 与全局累积权重, 第 z 个 zone 的累积权重位于 (z, z+1]
+
+        Args:
+            zones (List[str]): 所有 zone 的 id
+            used (np.ndarray): OD 矩阵中有车辆的 zone, 这些 zone 必须有 edge
+            side (str): source 或 sink
+        """
+        missing = [_zone for _zone, _used in zip(zones, used) if _used and not self.taz_infos.get(_zone, {}).get(side, ([], []))[0]]
+        assert not missing, f'No {side} edge for zones {missing[:10]}, check the TAZ definition.'
+        edges, weights, counts = [], [], []
+        for zone in zones:
+            _edges, _weights = self.taz_infos.get(zone, {}).get(side, ([], []))
+            edges.extend(_edges)
+            weights.extend(_weights)
+            counts.append(len(_edges))
+        indptr = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        owner = np.repeat(np.arange(len(zones), dtype=np.int64), counts)
+        total = np.bincount(owner, weights=weights, minlength=len(zones))
+        cumulative = np.cumsum(weights)
+        row_start = np.concatenate([[0], cumulative])[indptr[:-1]]
+        return np.asarray(edges, dtype=object), indptr, owner + (cumulative - row_start[owner]) / total[owner]
+
+    @staticmethod
+    def _sample_edges(zone:np.ndarray, edges:np.ndarray, indptr:np.ndarray, cumulative:np.ndarray, rng:np.random.Generator) -> np.ndarray:
+        """每个 zone 按照权重采样一个 edge
+        """
+        position = np.searchsorted(cumulative, zone + rng.random(len(zone)), side='right')
+        return edges[np.clip(position, indptr[zone], indptr[zone + 1] - 1)]
+
+    def iter_trips(self, od_matrix:ODMatrix, seed:int=None) -> Iterator[Dict[str, np.ndarray]]:
+        """逐个时间段采样 trip, 每个时间段内按照出发时间排序
+
+        每个时间段的车辆总数为 count 之和的四舍五入, 通过 multinomial 分配到每个 OD; 出发时间在时间段内均匀分布.
+
+        Args:
+            od_matrix (ODMatrix): OD 矩阵
+            seed (int, optional): 随机数种子. Defaults to None.
+
+        Returns:
+            Iterator[Dict[str, np.ndarray]]: 每个时间段的 trip, 包含 veh_id, depart, from_edge, to_edge, veh_type
+        """
+        rng = np.random.default_rng(seed)
+        has_count = od_matrix.count > 0
+        used_origin = np.bincount(od_matrix.origin[has_count], minlength=len(od_matrix.zones)) > 0
+        used_destination = np.bincount(od_matrix.destination[has_count], minlength=len(od_matrix.zones)) > 0
+        source_edges, source_indptr, source_cumulative = self._build_zone_edges(od_matrix.zones, used_origin, 'source')
+        sink_edges, sink_indptr, sink_cumulative = self._build_zone_edges(od_matrix.zones, used_destination, 'sink')
+        boundaries = np.concatenate([[0], np.cumsum(od_matrix.intervals)]) * 60 # 每个时间段的边界 (秒)
+
+        order = np.argsort(od_matrix.interval, kind='stable') # 按照时间段分组
+        interval_bounds = np.searchsorted(od_matrix.interval[order], np.arange(len(od_matrix.intervals) + 1))
+        num_trips = 0
+        for interval_index in range(len(od_matrix.intervals)):
+            cells = order[interval_bounds[interval_index]:interval_bounds[interval_index + 1]]
+            counts = od_matrix.count[cells]
+            total = int(round(counts.sum()))
+            if total == 0:
+                continue
+            cell_counts = rng.multinomial(total, counts / counts.sum())
+            trip_cell = np.repeat(cells, cell_counts)
+            depart = boundaries[interval_index] + rng.random(total) * (boundaries[interval_index + 1] - boundaries[interval_index])
+            trip_order = np.argsort(depart)
+            trip_cell, depart = trip_cell[trip_order], depart[trip_order]
+
+            yield {
+                'veh_id': np.char.add('od_', np.arange(num_trips, num_trips + total).astype(str)),
+                'depart': depart,
+                'from_edge': self._sample_edges(od_matrix.origin[trip_cell], source_edges, source_indptr, source_cumulative, rng),
+                'to_edge': self._sample_edges(od_matrix.destination[trip_cell], sink_edges, sink_indptr, sink_cumulative, rng),
+                'veh_type': self.vehicle_types[rng.choice(len(self.vehicle_types), size=total, p=self.vehicle_weights)],
+            }
+            num_trips += total
+
+    def write_trip_xml(self, od_matrix:ODMatrix, output_file:str, seed:int=None) -> int:
+        """将 trip 按照出发时间顺序写入 .trip.xml, 之后可以使用 duarouter 生成 route
+
+        Returns:
+            int: trip 的数量
+        """
+        folder_path, _ = os.path.split(output_file)
+        check_folder(folder_path)
+        num_trips = 0
+        with open(output_file, 'w') as file:
+            file.write('<routes>\n')
+            file.writelines(self.vtype_lines)
+            for trips in self.iter_trips(od_matrix, seed):
+                file.writelines(
+                    '    <trip id="{}" type="{}" depart="{:.2f}" from="{}" to="{}" departLane="random"/>\n'.format(*_trip)
+                    for _trip in zip(trips['veh_id'], trips['veh_type'], trips['depart'].tolist(), trips['from_edge'], trips['to_edge'])
+                )
+                num_trips += len(trips['depart'])
+            file.write('</routes>\n')
+        logger.info(f'SIM: => OD trip 文件生成成功, 按照时间顺序写入 {num_trips} 个 trip.')
+        return num_trips
@@ -0,0 +1,259 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-20 11:26:05
+@Description: 使用转向比 (turn ratio) 在 Python 中直接采样车辆的路径, 用于替代 jtrrouter
++ 转向比与 GenerateTurnDef 相同: 默认按照 lane 的 connection 均匀分配, edge_turndef 中设置的 fromEdge 按照设置修改
++ 所有时间段的转向概率只构建一次, 保存为 (K*E, E) 的稀疏 CSR 矩阵, 每一行为某个时间段某个 edge 的下一个 edge 的分布
++ 每一步对所有未结束的车辆一次 searchsorted 采样下一个 edge, 直到没有后续的 edge (sink), 出现环路或者达到最大长度
++ 与 jtrrouter 相同, 车辆到达每个 edge 的时间使用自由流的行驶时间估计, 用于选择转向比的时间段
+@LastEditTime: 2026-10-20 11:26:05
+'''
+import os
+import sumolib
+import numpy as np
+import scipy.sparse as sp
+from typing import Any, Dict, List, Tuple
+from loguru import logger
+
+from .generate_trip import get_vtype_lines
+from ..interpolation.demand_profile import DemandProfile
+from ..sumo_infos.turndef.connections import from_stream
+from ..sumo_infos.turndef.turndefinitions import from_connections
+from ...utils.check_folder import check_folder
+
+
+class TurnRatioRouteSampler(object):
+    def __init__(self,
+                 sumo_net:str,
+                 intervals:List[float],
+                 edge_turndef:Dict[str, List[float]]=None,
+                 max_route_length:int=64,
+                 allow_loops:bool=False
+        ) -> None:
+        """根据转向比采样路径
+
+        Args:
+            sumo_net (str): sumo net 路网的文件路径
+            intervals (List[float]): 每段时间的持续时间 (分钟)
+            edge_turndef (Dict[str, List[float]], optional): 每一个 connection 每一个时间间隔的概率, 与 GenerateTurnDef 相同
+                {
+                    'fromEdge1__toEdge1': [0.5, 0.5, 0.2],
+                    'fromEdge2__toEdge2': [0.2, 0.3, 0.4],
+                    ...
+                }
+                Defaults to None.
+            max_route_length (int, optional): 每条路径最多包含的 edge 数量. Defaults to 64.
+            allow_loops (bool, optional): 是否允许路径重复经过同一个 edge, False 时遇到重复的 edge 路径结束. Defaults to False.
+        """
+        self.intervals = list(intervals)
+        self.max_route_length = max_route_length
+        self.allow_loops = allow_loops
+        self.boundaries = np.cumsum(self.intervals, dtype=np.float64) * 60 # 每个时间段的结束时间 (秒)
+
+        net = sumolib.net.readNet(sumo_net)
+        self.edge_ids = [_edge.getID() for _edge in net.getEdges()] # 不包含 internal edge
+        self.edge_index = {_edge_id:_index for _index, _edge_id in enumerate(self.edge_ids)}
+        self.travel_time = np.asarray([
+            _edge.getLength() / max(_edge.getSpeed(), 0.1) for _edge in net.getEdges()
+        ], dtype=np.float64) # 自由流的行驶时间 (秒)
+
+        # 默认的转向比 (按照 lane 均匀分配, 与 GenerateTurnDef.generate_turn_definition 相同)
+        turn_definitions = from_connections(from_stream(sumo_net))
+        default_ratios = {
+            (_source, _destination): turn_definitions.get_turning_probability(_source, _destination) / 100
+            for _source in turn_definitions.get_sources() if _source in self.edge_index
+            for _destination in turn_definitions.get_destinations(_source) if _destination in self.edge_index
+        }
+        self.transition = self._build_transition(net, default_ratios, edge_turndef or {})
+        logger.info(f'SIM: 构建转向矩阵, {len(self.edge_ids)} 个 edge, {len(self.intervals)} 个时间段, {self.transition.nnz} 个转向.')
+
+    def _build_transition(self, net:sumolib.net.Net, default_ratios:Dict[Tuple[str, str], float], edge_turndef:Dict[str, List[float]]) -> sp.csr_matrix:
+        """构建 (K*E, E) 的转向概率矩阵, 第 k*E+i 行为第 k 个时间段 edge i 的下一个 edge 的分布 (每一行归一化)
+
+        edge_turndef 中出现的 fromEdge, 没有设置的 connection 平分剩余的概率 (与 GenerateTurnDef._expand_turn_definition 相同)
+        """
+        num_intervals, num_edges = len(self.intervals), len(self.edge_ids)
+        turndef_ratios = {} # (fromEdge, toEdge) -> (K,) 每个时间段的概率
+        for from_edge in {_connection.split('__')[0] for _connection in edge_turndef}:
+            connections = {
+                _to_edge.getID(): edge_turndef.get(f'{from_edge}__{_to_edge.getID()}')
+                for _to_edge in net.getEdge(from_edge).getOutgoing()
+            }
+            none_num = list(connections.values()).count(None)
+            total_probability = np.zeros(num_intervals)
+            for _probability in connections.values():
+                if _probability is not None:
+                    total_probability += np.asarray(_probability, dtype=np.float64)
+            for to_edge, _probability in connections.items():
+                if _probability is None:
+                    assert ((1 - total_probability) >= 0).all(), '检查 {} 的概率设置'.format(from_edge)
+                    turndef_ratios[(from_edge, to_edge)] = (1 - total_probability) / none_num
+                else:
+                    turndef_ratios[(from_edge, to_edge)] = np.asarray(_probability, dtype=np.float64)
+        turndef_sources = {_from_edge for _from_edge, _ in turndef_ratios}
+
+        relations = [_relation for _relation in default_ratios if _relation[0] not in turndef_sources]
+        relations += [_relation for _relation in turndef_ratios if _relation[1] in self.edge_index]
+        sources = np.asarray([self.edge_index[_from_edge] for _from_edge, _ in relations], dtype=np.int64)
+        destinations = np.asarray([self.edge_index[_to_edge] for _, _to_edge in relations], dtype=np.int64)
+        ratios = np.stack([
+            turndef_ratios[_relation] if _relation in turndef_ratios else np.full(num_intervals, default_ratios[_relation])
+            for _relation in relations
+        ], axis=1).reshape(num_intervals, len(relations)) # (K, R)
+
+        rows = (np.arange(num_intervals, dtype=np.int64)[:, None] * num_edges + sources[None, :]).ravel()
+        columns = np.broadcast_to(destinations, (num_intervals, len(relations))).ravel()
+        transition = sp.csr_matrix((ratios.ravel(), (rows, columns)), shape=(num_intervals * num_edges, num_edges))
+        transition.eliminate_zeros()
+        transition.sort_indices()
+
+        # 每一行归一化, 并计算全局的累积概率: 第 r 行的累积概率位于 (r, r+1], 所有行一次 searchsorted
+        row_sum = np.asarray(transition.sum(axis=1)).ravel()
+        row_of_entry = np.repeat(np.arange(transition.shape[0], dtype=np.int64), np.diff(transition.indptr))
+        transition.data = transition.data / row_sum[row_of_entry]
+        cumulative = np.cumsum(transition.data)
+        row_start = np.concatenate([[0], cumulative])[transition.indptr[:-1]] # 每一行之前的累积值
+        self.cumulative = row_of_entry + cumulative - row_start[row_of_entry]
+        return transition
+
+    def get_interval_index(self, times:np.ndarray) -> np.ndarray:
+        """每个时刻所在的时间段, 超出最后一个时间段时使用最后一个时间段
+        """
+        return np.minimum(np.searchsorted(self.boundaries, times, side='right'), len(self.intervals) - 1)
+
+    def sample_routes(self, from_edges:List[str], depart_times:np.ndarray=None, seed:int=None) -> np.ndarray:
+        """从 from_edges 出发, 采样每辆车的完整路径
+
+        Args:
+            from_edges (List[str]): 每辆车出发的 edge
+            depart_times (np.ndarray, optional): 每辆车出发的时间 (秒), 用于选择转向比的时间段, None 时均为 0. Defaults to None.
+            seed (int, optional): 随机数种子. Defaults to None.
+
+        Returns:
+            np.ndarray: (N, L) 每辆车经过的 edge 的 index (见 self.edge_ids), 路径结束之后为 -1
+        """
+        rng = np.random.default_rng(seed)
+        num_routes, num_edges = len(from_edges), len(self.edge_ids)
+        routes = np.full((num_routes, self.max_route_length), -1, dtype=np.int64)
+        routes[:, 0] = [self.edge_index[_edge_id] for _edge_id in from_edges]
+        clock = np.zeros(num_routes) if depart_times is None else np.asarray(depart_times, dtype=np.float64).copy()
+        clock += self.travel_time[routes[:, 0]] # 到达下一个 edge 的时间
+        active = np.arange(num_routes, dtype=np.int64) # 未结束的路径
+
+        indptr, indices = self.transition.indptr, self.transition.indices
+        route_length = 1
+        for step in range(1, self.max_route_length):
+            if len(active) == 0:
+                break
+            current = routes[active, step - 1]
+            row = self.get_interval_index(clock[active]) * num_edges + current
+            has_next = indptr[row + 1] > indptr[row]
+            position = np.searchsorted(self.cumulative, row + rng.random(len(active)), side='right')
+            position = np.clip(position, indptr[row], np.maximum(indptr[row + 1] - 1, indptr[row]))
+            next_edge = indices[np.minimum(position, len(indices) - 1)] if len(indices) else current
+
+            keep = has_next
+            if not self.allow_loops:
+                keep &= ~(routes[active, :step] == next_edge[:, None]).any(axis=1)
+            active, next_edge = active[keep], next_edge[keep]
+            routes[active, step] = next_edge
+            clock[active] += self.travel_time[next_edge]
+            route_length = step + 1 if len(active) else route_length
+        return routes[:, :route_length]
+
+    def sample_demand(self,
+                      edge_flow_per_minute:Dict[str, List[float]],
+                      veh_type:Dict[str, Dict[str, float]],
+                      interpolate:bool=False,
+                      method:str='inverse_cdf',
+                      resolution:float=1,
+                      seed:int=None
+        ) -> Dict[str, Any]:
+        """根据每个 edge 的流量采样所有车辆的出发时间, 类型和路径
+
+        Args:
+            edge_flow_per_minute (Dict[str, List[float]]): 每个 edge 每个时间段的车辆 veh/min, 与 generate_route 相同
+            veh_type (Dict[str, Dict[str, float]]): 车辆类型, 使用其中的 probability
+            interpolate (bool, optional): 是否对流量进行插值, 见 DemandProfile. Defaults to False.
+            method (str, optional): 出发时间的采样方法, 见 DemandProfile.sample_departures. Defaults to 'inverse_cdf'.
+            resolution (float, optional): 出发时间的精度 (秒). Defaults to 1.
+            seed (int, optional): 随机数种子. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: 按照出发时间排序的车辆
+                - veh_id, (N,) 车辆的 id, 为 {fromEdge}.{index}
+                - depart, (N,) 出发时间 (秒)
+                - veh_type, (N,) 车辆类型
+                - route_index, (N,) 每辆车的路径在 routes 中的 index
+                - routes, List[Tuple[str, ...]] 去重之后的路径
+        """
+        rng = np.random.default_rng(seed)
+        profile = DemandProfile(edge_flow_per_minute, self.intervals, interpolate)
+        departures = profile.sample_departures(method=method, resolution=resolution, seed=rng.integers(2**63))
+        from_edges = np.repeat(np.asarray(profile.ids, dtype=object), [len(_times) for _times in departures.values()])
+        vehicle_index = np.concatenate([np.arange(len(_times)) for _times in departures.values()]) if departures else np.zeros(0, dtype=np.int64)
+        depart = np.concatenate(list(departures.values())) if departures else np.zeros(0)
+        order = np.argsort(depart, kind='stable')
+        depart, from_edges, vehicle_index = depart[order], from_edges[order], vehicle_index[order]
+
+        _, vehID_prob = get_vtype_lines(veh_type)
+        vehicle_types = np.asarray(list(vehID_prob.keys()), dtype=object)
+        vehicle_weights = np.asarray(list(vehID_prob.values()), dtype=np.float64)
+        route_edges = self.sample_routes(from_edges, depart, seed=rng.integers(2**63))
+        unique_routes, route_index = np.unique(route_edges, axis=0, return_inverse=True)
+        return {
+            'veh_id': np.asarray([f'{_edge}.{_index}' for _edge, _index in zip(from_edges, vehicle_index)], dtype=object),
+            'depart': depart,
+            'veh_type': vehicle_types[rng.choice(len(vehicle_types), size=len(depart), p=vehicle_weights)],
+            'route_index': route_index.reshape(-1),
+            'routes': self.to_edge_ids(unique_routes),
+        }
+
+    def to_edge_ids(self, routes:np.ndarray) -> List[Tuple[str, ...]]:
+        """将 (N, L) 的 edge index 转换为 edge id 的 tuple
+        """
+        return [tuple(self.edge_ids[_index] for _index in _route if _index >= 0) for _route in routes.tolist()]
+
+    def write_route_xml(self, demand:Dict[str, Any], veh_type:Dict[str, Dict[str, float]], output_file:str) -> None:
+        """将 sample_demand 的结果直接写入 .rou.xml 文件, 不需要 trip 文件与 jtrrouter
+
+        Args:
+            demand (Dict[str, Any]): sample_demand 的结果
+            veh_type (Dict[str, Dict[str, float]]): 车辆类型, 用于生成 vType
+            output_file (str): 输出的 .rou.xml 文件
+        """
+        folder_path, _ = os.path.split(output_file)
+        check_folder(folder_path)
+        vtype_lines, _ = get_vtype_lines(veh_type)
+        with open(output_file, 'w') as file:
+            file.write('<routes>\n')
+            file.writelines(vtype_lines)
+            for route_index, route in enumerate(demand['routes']):
+                file.write('    <route id="r_{}" edges="{}"/>\n'.format(route_index, ' '.join(route)))
+            for veh_id, depart, _veh_type, route_index in zip(
+                    demand['veh_id'], demand['depart'].tolist(), demand['veh_type'], demand['route_index'].tolist()
+                ):
+                file.write('    <vehicle id="{}" type="{}" route="r_{}" depart="{:.2f}" departLane="random"/>\n'.format(
+                    veh_id, _veh_type, route_index, depart
+                ))
+            file.write('</routes>\n')
+        logger.info(f'SIM: 生成 route 文件成功, {len(demand["depart"])} 辆车, {len(demand["routes"])} 条路径.')
+
+    @staticmethod
+    def add_to_simulation(conn, demand:Dict[str, Any], route_prefix:str='tr_') -> None:
+        """将 sample_demand 的结果直接添加到正在运行的仿真中 (车辆类型需要已经存在)
+
+        Args:
+            conn: traci 的连接, 例如 TshubEnvironment.sumo
+            demand (Dict[str, Any]): sample_demand 的结果
+            route_prefix (str, optional): 路径 id 的前缀. Defaults to 'tr_'.
+        """
+        for route_index, route in enumerate(demand['routes']):
+            conn.route.add(f'{route_prefix}{route_index}', list(route))
+        for veh_id, depart, _veh_type, route_index in zip(
+                demand['veh_id'], demand['depart'].tolist(), demand['veh_type'], demand['route_index'].tolist()
+            ):
+            conn.vehicle.add(
+                veh_id, f'{route_prefix}{route_index}', typeID=_veh_type,
+                depart=f'{depart:.2f}', departLane='random'
+            )
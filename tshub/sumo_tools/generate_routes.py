@@ -5,7 +5,7 @@
 1. 可以设置 ego 车的渗透率, 这里是一个参数可以设置, 车辆类型可以设置车辆的 type
 2. 设置车辆的初始速度是 9m/s - 32km/s, 这里是一个参数可以设置
 3. 给出的是这个时间段内的来车的速度, vehicle/second
-@LastEditTime: 2024-04-15 16:00:13
+@LastEditTime: 2026-10-20 11:26:05
 '''
 import os
 import sumolib
@@ -19,6 +19,7 @@ from ..utils.check_folder import check_folder
 from .generate_route.generate_trip import GenerateTrip
 from .generate_route.generate_turn_def import GenerateTurnDef
 from .generate_route.generate_person import GeneratePersonTrip
+from .generate_route.turn_ratio_sampler import TurnRatioRouteSampler
 from .interpolation.values_interpolation import InterpolationValues
 from .interpolation.repeat_values import repeat_values
 
@@ -52,7 +53,8 @@ def generate_route(sumo_net:str,
                     interpolate_turndef:bool=False,
                     interpolate_walkflow:bool=False,
                     random_flow:bool=True,
-                    seed:int=777
+                    seed:int=777,
+                    router:str='jtrrouter'
                     ) -> None:
     """根据 turn definition 和 trip 文件, 生成 route 文件
 
@@ -94,6 +96,8 @@ def generate_route(sumo_net:str,
         random_flow (bool, optional): 控制车流出现的时间是否随机. Defaults to True.
         walkfactor (float, optional): pedestrian maximum speed during intermodal routing;. Defaults to 0.7.
         seed (int, optional): 随机数种子, 控制使用 JTRROUTER 生成的 route 是一样的. Defaults to 777.
+        router (str, optional): jtrrouter 或 python. python 时使用 TurnRatioRouteSampler 直接生成 route 文件,
+            不需要 trip 和 turndef 文件 (车辆出现的时间总是随机的). Defaults to 'jtrrouter'.
 
     Raises:
         Exception: Route 文件无法成功生成.
@@ -120,14 +124,19 @@ def generate_route(sumo_net:str,
 
 
     # --- 生成 vehicle 文件 ---
+    assert router in ('jtrrouter', 'python'), f'router can only be jtrrouter or python, now is {router}.'
+    if router == 'python':
+        sampler = TurnRatioRouteSampler(sumo_net=sumo_net, intervals=intervals, edge_turndef=turndefs_info)
+        demand = sampler.sample_demand(edge_flow_per_minute=flow_info, veh_type=veh_type, seed=seed)
+        sampler.write_route_xml(demand, veh_type, output_route)
+        return
 
     # 生成 .trip.xml 文件
     generate_trip = GenerateTrip(
         intervals=intervals, edge_flow_per_minute=flow_info, 
         veh_type=veh_type, output_file=output_trip
     )
-    generate_trip.generate_trip_xml() # 生成 .trip.xml
-    generate_trip.edit_trip_xml() # 修改 .trip.xml, 是的 begin time 按照时间排序
+    generate_trip.generate_trip_xml() # 生成按照 begin time 排序的 .trip.xml
 
     # 生成 .turndefs.xml 文件
     generate_turndef = GenerateTurnDef(
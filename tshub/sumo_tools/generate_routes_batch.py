@@ -0,0 +1,138 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-20 10:41:18
+@Description: 批量并行生成 route 文件, 并按照配置的内容进行缓存
++ 每个配置为 generate_route 的参数 (不包含输出的文件), 在进程池中并行运行 generate_route (jtrrouter/duarouter)
++ 缓存的 key 为 (net 文件的内容, 需求, turndef, seed, tshub 与 SUMO 的版本) 的 hash, 相同的配置直接返回缓存的结果
++ 先在临时文件夹中生成, 再通过 os.replace 原子性地重命名, 多个进程同时生成也不会读到不完整的结果
+@LastEditTime: 2026-10-20 10:41:18
+'''
+import os
+import copy
+import json
+import random
+import shutil
+import hashlib
+import subprocess
+import sumolib
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+from loguru import logger
+
+from .. import __version__
+from ..map.map_cache import hash_file
+from .generate_routes import generate_route
+
+CACHE_VERSION = 1 # 缓存格式的版本, 修改 generate_route 的结果之后需要 +1, 使得旧的缓存失效
+ROUTE_FILE = 'vehicle.rou.xml' # 每个缓存文件夹中车辆的 route 文件
+PERSON_FILE = 'pedestrian.rou.xml' # 每个缓存文件夹中行人的 route 文件 (walk_flow_per_minute 不为 None 时)
+OUTPUT_ARGS = ('output_trip', 'output_turndef', 'output_route', 'person_trip_file', 'output_person_file')
+
+
+@lru_cache(maxsize=None)
+def get_sumo_version() -> str:
+    """jtrrouter 的版本 (例如 Eclipse SUMO jtrrouter 1.28.0), 版本不同时 route 的结果可能不同
+    """
+    try:
+        output = subprocess.run(
+            [sumolib.checkBinary('jtrrouter'), '--version'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=False
+        ).stdout.decode(errors='ignore')
+    except OSError:
+        return '<unknown>'
+    return output.splitlines()[0].strip() if output else '<unknown>'
+
+
+def hash_route_config(config:Dict[str, Any]) -> str:
+    """计算一个 route 配置的 hash, 作为缓存的 key
+
+    Args:
+        config (Dict[str, Any]): generate_route 的参数, 包含 sumo_net, interval, edge_flow_per_minute, edge_turndef, veh_type, seed 等
+
+    Returns:
+        str: sha1 的十六进制字符串
+    """
+    sha = hashlib.sha1(f'tshub-route-cache-v{CACHE_VERSION}'.encode())
+    sha.update(f'tshub:{__version__}|sumo:{get_sumo_version()}'.encode())
+    sha.update(hash_file(config['sumo_net'], 'net').encode()) # net 使用文件的内容, 与路径无关
+    spec = {_key:_value for _key, _value in config.items() if _key != 'sumo_net'}
+    sha.update(json.dumps(spec, sort_keys=True, default=str).encode())
+    return sha.hexdigest()
+
+
+def _generate_route_to_folder(config:Dict[str, Any], cache_dir:str, cache_key:str) -> str:
+    """在子进程中生成一个配置的 route 文件, 完成之后重命名为 cache_dir/cache_key
+    """
+    target_dir = os.path.join(cache_dir, cache_key)
+    tmp_dir = os.path.join(cache_dir, f'{cache_key}.tmp-{os.getpid()}')
+    os.makedirs(tmp_dir, exist_ok=True)
+    random_state = random.getstate()
+    random.seed(config.get('seed', 777)) # GenerateTrip 使用 random 选择车辆类型, 使得相同的配置得到相同的结果
+    try:
+        generate_route(
+            output_trip=os.path.join(tmp_dir, '_testflow.trip.xml'),
+            output_turndef=os.path.join(tmp_dir, '_testflow.turndefs.xml'),
+            output_route=os.path.join(tmp_dir, ROUTE_FILE),
+            person_trip_file=os.path.join(tmp_dir, '_person.trip.xml'),
+            output_person_file=os.path.join(tmp_dir, PERSON_FILE),
+            **copy.deepcopy(config) # generate_route 会修改输入的 dict
+        )
+        with open(os.path.join(tmp_dir, 'config.json'), 'w') as f: # 保存配置, 便于查看缓存的内容
+            json.dump(config, f, indent=2, default=str)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        random.setstate(random_state)
+
+    try:
+        os.replace(tmp_dir, target_dir)
+    except OSError: # 其他进程已经生成了同样的结果
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(target_dir):
+            raise
+    return target_dir
+
+
+def generate_routes_batch(configs:List[Dict[str, Any]], cache_dir:str, num_workers:int=None) -> List[str]:
+    """批量生成 route 文件, 已经缓存的配置不会重新生成
+
+    Args:
+        configs (List[Dict[str, Any]]): 每个元素为 generate_route 的参数 (不包含输出文件的参数), 例如
+            {
+                'sumo_net': 'env/xxx.net.xml', 'interval': [5, 5],
+                'edge_flow_per_minute': {...}, 'edge_turndef': {...}, 'veh_type': {...},
+                'seed': 1,
+            }
+        cache_dir (str): 缓存的根目录, 每个配置保存在 cache_dir/<hash> 文件夹中
+        num_workers (int, optional): 进程的数量, None 时为 CPU 的数量, 0 时在当前进程中依次生成. Defaults to None.
+
+    Returns:
+        List[str]: 每个配置对应的文件夹, 其中包含 ROUTE_FILE (以及 PERSON_FILE)
+    """
+    for config in configs:
+        output_args = [_arg for _arg in OUTPUT_ARGS if _arg in config]
+        assert not output_args, f'The output files are managed by the cache, remove {output_args} from the config.'
+    os.makedirs(cache_dir, exist_ok=True)
+
+    cache_keys = [hash_route_config(_config) for _config in configs]
+    folders = [os.path.join(cache_dir, _key) for _key in cache_keys]
+    pending = {} # cache_key -> config, 相同的配置只生成一次
+    for cache_key, folder, config in zip(cache_keys, folders, configs):
+        if not os.path.isdir(folder):
+            pending.setdefault(cache_key, config)
+    logger.info(f'SIM: {len(configs)} route configs, {len(pending)} to generate, the others are reused from {cache_dir}.')
+
+    if num_workers == 0:
+        for cache_key, config in pending.items():
+            _generate_route_to_folder(config, cache_dir, cache_key)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [
+                executor.submit(_generate_route_to_folder, _config, cache_dir, _key)
+                for _key, _config in pending.items()
+            ]
+            for future in futures:
+                future.result() # 抛出子进程中的错误
+    return folders
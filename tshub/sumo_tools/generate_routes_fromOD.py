@@ -1,23 +1,25 @@
 '''
 Author: Maonan Wang
 Date: 2024-09-16 11:03:35
-LastEditTime: 2024-09-16 14:59:46
+LastEditTime: 2026-10-20 13:05:22
 LastEditors: Maonan Wang
 Description: 根据 OD Matrix 来生成 route file
 FilePath: /TransSimHub/tshub/sumo_tools/generate_routes_fromOD.py
 1. 根据 od_flow 生成 trips 文件
 2. 根据 trips 文件生成 route 文件
+3. generate_route_from_od_matrix, 从稀疏的 OD 矩阵文件 (npz/csv) 与 TAZ 批量采样 trip
 '''
 import os
 import sumolib
 import subprocess
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Union
 from tempfile import TemporaryFile
 from loguru import logger
 
 from ..utils.check_folder import check_folder
 from .generate_route.generate_odTrip import GenerateODTrip
+from .generate_route.od_matrix_trip import ODMatrix, ODTripSampler
 from .generate_route.generate_person import GeneratePersonTrip
 from .interpolation.values_interpolation import InterpolationValues
 from .interpolation.repeat_values import repeat_values
@@ -114,18 +116,26 @@ def generate_route_fromOD(
         intervals=intervals, od_flow_per_minute=flow_info, 
         veh_type=veh_type, output_file=output_trip
     )
-    generate_trip.generate_trip_xml() # 生成 .trip.xml
-    generate_trip.edit_trip_xml() # 修改 .trip.xml, 是的 begin time 按照时间排序
+    generate_trip.generate_trip_xml() # 生成按照 begin time 排序的 .trip.xml
 
+    run_duarouter(sumo_net, output_trip, output_route, seed=seed, random_flow=random_flow)
+
+
+def run_duarouter(sumo_net:str, trip_file:str, output_route:str, seed:int=777, random_flow:bool=True) -> None:
+    """使用 duarouter 根据 trip 文件生成 route 文件
+
+    Raises:
+        Exception: Route 文件无法成功生成.
+    """
     # 检查 .rou.xml 文件是否存在
     folder_path, _ = os.path.split(output_route)
     check_folder(folder_path)
     
-    # 根据 trip 和 turndef 文件生成 route 文件
+    # 根据 trip 文件生成 route 文件
     DUAROUTER = sumolib.checkBinary('duarouter')  # 返回地址
     temp_file = TemporaryFile()
     prog = subprocess.Popen([DUAROUTER, "-n", sumo_net,
-                            "--route-files", output_trip,
+                            "--route-files", trip_file,
                             "--seed", str(seed),  # 随机数种子
                             "--randomize-flows", str(random_flow),  # 车辆出现时间是否随机
                             "--departlane", "random",
@@ -142,3 +152,32 @@ def generate_route_fromOD(
         logger.error('{}'.format(err))
         raise Exception("route 文件生成失败, 检查 trip 文件和 turn definition 文件")
     temp_file.close()
+
+
+def generate_route_from_od_matrix(
+        sumo_net:str,
+        od_matrix:Union[str, ODMatrix],
+        taz:Union[str, Dict[str, List[str]]],
+        veh_type:Dict[str, Dict[str, float]],
+        intervals:List[float]=None,
+        output_trip:str='_od.trip.xml',
+        output_route:str='vehicle.rou.xml',
+        seed:int=777
+    ) -> None:
+    """根据大规模的稀疏 OD 矩阵 (zones × zones × intervals) 生成 route 文件
+
+    Args:
+        sumo_net (str): sumo net 路网的文件路径
+        od_matrix (Union[str, ODMatrix]): OD 矩阵, 或者 OD 矩阵的文件 (npz/csv), 见 ODMatrix.load
+        taz (Union[str, Dict[str, List[str]]]): TAZ 文件, 或者每个 zone 对应的 edge
+        veh_type (Dict[str, Dict[str, float]]): 定义不同的车辆类型, 与 generate_route_fromOD 相同
+        intervals (List[float], optional): 每个时间段的长度 (分钟), OD 矩阵文件中没有保存时需要给出. Defaults to None.
+        output_trip (str, optional): 生成的 .trip.xml 文件的路径. Defaults to '_od.trip.xml'.
+        output_route (str, optional): 生成的 .rou.xml 文件的路径. Defaults to 'vehicle.rou.xml'.
+        seed (int, optional): 随机数种子, 用于 trip 的采样与 duarouter. Defaults to 777.
+    """
+    if isinstance(od_matrix, str):
+        od_matrix = ODMatrix.load(od_matrix, intervals)
+    od_sampler = ODTripSampler(taz=taz, veh_type=veh_type)
+    od_sampler.write_trip_xml(od_matrix, output_trip, seed=seed)
+    run_duarouter(sumo_net, output_trip, output_route, seed=seed, random_flow=False)
@@ -0,0 +1,160 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-20 09:12:37
+@Description: 基于数组的需求 (demand) 曲线, 一次处理所有 edge/OD 的流量
++ 与 InterpolationValues 相同, 每个时间段的值放在时间段的中点 (向下取整到分钟), 之间线性插值 (interpolate=False 时为阶梯函数)
++ 所有曲线保存为 (N, K) 的数组, 可以在任意的时间精度 (例如 1 秒) 上批量采样
++ 每条曲线为分段线性函数, 累积流量为分段二次函数, 可以直接求逆, 因此出发时间的采样 (inverse-CDF 或 Poisson thinning) 不依赖时间精度
+@LastEditTime: 2026-10-20 17:02:15
+'''
+import numpy as np
+from typing import Dict, List, Tuple
+
+
+class DemandProfile(object):
+    def __init__(self, values:Dict[str, List[float]], intervals:List[float], interpolate:bool=True) -> None:
+        """所有 edge (或 OD) 的流量曲线
+
+        例如:
+            - values 为 {'E1': [10, 20, 5], 'E2': [3, 3, 6]}, 每个时间段的流量 (veh/min)
+            - intervals 为 [20, 20, 10], 每个时间段的长度 (分钟)
+
+        interpolate=True 时, 曲线的节点 (秒) 为 [0, 600, 1800, 2700, 3000], 节点的值为 [10, 10, 20, 5, 5], 与 InterpolationValues 相同;
+        中点与 InterpolationValues._transform_list 一样向下取整到分钟, 例如 intervals 为 [15] 时中点为 7 分钟 (420 秒) 而不是 7.5 分钟.
+        interpolate=False 时, 每个时间段内的值不变.
+
+        Args:
+            values (Dict[str, List[float]]): 每个 id 每个时间段的值, 例如 veh/min
+            intervals (List[float]): 每个时间段的长度 (分钟)
+            interpolate (bool, optional): 是否在时间段之间线性插值. Defaults to True.
+        """
+        self.ids = list(values.keys())
+        self.intervals = np.asarray(intervals, dtype=np.float64)
+        period_values = np.asarray([values[_id] for _id in self.ids], dtype=np.float64).reshape(len(self.ids), len(self.intervals))
+        assert np.all(period_values >= 0), 'The values of the demand profile should be non-negative.'
+
+        boundaries = np.concatenate([[0], np.cumsum(self.intervals)]) # 每个时间段的边界 (分钟)
+        midpoints = np.floor((boundaries[:-1] + boundaries[1:]) / 2) * 60 # 与 InterpolationValues 相同, 中点 (秒) 向下取整到分钟
+        boundaries = boundaries * 60 # 秒
+        self.duration = float(boundaries[-1])
+        self.interpolate = interpolate
+
+        # 每一段 [knots[j], knots[j+1]) 的起点值与终点值, (N, S)
+        if interpolate:
+            self.knots = np.concatenate([[0], midpoints, [self.duration]])
+            knot_values = np.concatenate([period_values[:, :1], period_values, period_values[:, -1:]], axis=1)
+            self.segment_start, self.segment_end = knot_values[:, :-1], knot_values[:, 1:]
+        else: # 阶梯函数, 每一段的起点与终点的值相同
+            self.knots = boundaries
+            self.segment_start = self.segment_end = period_values
+        self.segment_length = np.diff(self.knots)
+
+    def _get_segment(self, times:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """每个时刻所在的段, 以及在段内的比例
+        """
+        segment = np.clip(np.searchsorted(self.knots, times, side='right') - 1, 0, len(self.segment_length) - 1)
+        length = self.segment_length[segment]
+        ratio = np.divide(times - self.knots[segment], length, out=np.zeros_like(length), where=length > 0)
+        return segment, ratio
+
+    def get_profiles(self, resolution:float=60) -> Tuple[np.ndarray, np.ndarray]:
+        """在 [0, duration) 上每隔 resolution 秒计算所有曲线的值
+
+        Args:
+            resolution (float, optional): 时间的精度 (秒). Defaults to 60.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (T,) 的时刻 (秒), 以及 (N, T) 每条曲线的值
+
+        示例:
+            >>> profile = DemandProfile(values={'E1': [0.25, 1, 0.4]}, intervals=[20, 20, 10])
+            >>> times, profiles = profile.get_profiles(resolution=60)
+            >>> profiles[0, 20] # 与 InterpolationValues 的结果相同
+            0.625
+        """
+        times = np.arange(0, self.duration, resolution, dtype=np.float64)
+        segment, ratio = self._get_segment(times)
+        profiles = self.segment_start[:, segment] * (1 - ratio) + self.segment_end[:, segment] * ratio
+        return times, profiles
+
+    def get_cumulative(self) -> np.ndarray:
+        """每条曲线在每个节点的累积值 (值的单位为 veh/min 时, 累积值的单位为 veh), (N, S+1)
+        """
+        segment_area = (self.segment_start + self.segment_end) / 2 * self.segment_length / 60
+        return np.concatenate([np.zeros((len(self.ids), 1)), np.cumsum(segment_area, axis=1)], axis=1)
+
+    def get_expected_counts(self) -> Dict[str, float]:
+        """每个 id 在整个时间段内的期望车辆数
+        """
+        return dict(zip(self.ids, self.get_cumulative()[:, -1].tolist()))
+
+    def sample_departures(self,
+                          method:str='inverse_cdf',
+                          resolution:float=1,
+                          random_count:bool=False,
+                          seed:int=None
+                    ) -> Dict[str, np.ndarray]:
+        """按照流量曲线 (veh/min) 采样每个 id 的出发时间
+
+        Args:
+            method (str, optional): inverse_cdf 或 thinning. Defaults to 'inverse_cdf'.
+                - inverse_cdf, 每个 id 的车辆数固定 (或者为 Poisson 分布), 在累积流量上均匀采样后求逆
+                - thinning, 非齐次 Poisson 过程, 以最大的流量生成候选时刻, 按照流量的比例保留
+            resolution (float, optional): 出发时间向下取整的精度 (秒), None 时保留连续的时间. Defaults to 1.
+            random_count (bool, optional): inverse_cdf 时车辆数是否为 Poisson 分布, False 时为期望值四舍五入. Defaults to False.
+            seed (int, optional): 随机数种子. Defaults to None.
+
+        Returns:
+            Dict[str, np.ndarray]: 每个 id 排好序的出发时间 (秒)
+        """
+        assert method in ('inverse_cdf', 'thinning'), f'method can only be inverse_cdf or thinning, now is {method}.'
+        rng = np.random.default_rng(seed)
+        if method == 'inverse_cdf':
+            owners, times = self._sample_inverse_cdf(rng, random_count)
+        else:
+            owners, times = self._sample_thinning(rng)
+
+        if resolution is not None:
+            times = np.floor(times / resolution) * resolution
+        order = np.lexsort((times, owners))
+        owners, times = owners[order], times[order]
+        counts = np.bincount(owners, minlength=len(self.ids))
+        return dict(zip(self.ids, np.split(times, np.cumsum(counts)[:-1])))
+
+    def _sample_inverse_cdf(self, rng:np.random.Generator, random_count:bool) -> Tuple[np.ndarray, np.ndarray]:
+        """所有曲线的累积值首尾相接为一个单调的数组, 所有的采样点一次 searchsorted 找到所在的段
+        """
+        num_ids, num_segments = self.segment_start.shape
+        cumulative = self.get_cumulative()
+        totals = cumulative[:, -1]
+        counts = rng.poisson(totals) if random_count else np.round(totals).astype(np.int64)
+
+        owners = np.repeat(np.arange(num_ids, dtype=np.int64), counts)
+        row_base = np.concatenate([[0], np.cumsum(totals)[:-1]])
+        flat_cumulative = (cumulative[:, :-1] + row_base[:, None]).ravel() # 每一段起点的全局累积值
+        targets = row_base[owners] + rng.random(len(owners)) * totals[owners]
+        flat_segment = np.searchsorted(flat_cumulative, targets, side='right') - 1
+        flat_segment = np.clip(flat_segment, owners * num_segments, owners * num_segments + num_segments - 1)
+        segment = flat_segment % num_segments
+
+        # 在段内求解 a*s + b*s^2/2 = d, a 与 b 为段起点的流量 (veh/s) 与斜率
+        start = self.segment_start.ravel()[flat_segment] / 60
+        slope = (self.segment_end.ravel()[flat_segment] / 60 - start) / self.segment_length[segment]
+        residual = np.maximum(targets - flat_cumulative[flat_segment], 0)
+        denominator = start + np.sqrt(np.maximum(start ** 2 + 2 * slope * residual, 0))
+        offset = np.divide(2 * residual, denominator, out=np.zeros_like(residual), where=denominator > 0)
+        times = self.knots[segment] + np.minimum(offset, self.segment_length[segment])
+        return owners, np.minimum(times, np.nextafter(self.duration, 0))
+
+    def _sample_thinning(self, rng:np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+        """以每条曲线的最大流量生成齐次 Poisson 过程, 按照 rate(t) / max_rate 保留
+        """
+        num_ids = len(self.ids)
+        max_rates = np.maximum(self.segment_start.max(axis=1), self.segment_end.max(axis=1)) / 60 # veh/s
+        counts = rng.poisson(max_rates * self.duration)
+        owners = np.repeat(np.arange(num_ids, dtype=np.int64), counts)
+        times = rng.random(len(owners)) * self.duration
+        segment, ratio = self._get_segment(times)
+        rates = (self.segment_start[owners, segment] * (1 - ratio) + self.segment_end[owners, segment] * ratio) / 60
+        keep = rng.random(len(owners)) * max_rates[owners] < rates
+        return owners[keep], times[keep]
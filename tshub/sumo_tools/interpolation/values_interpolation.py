@@ -2,7 +2,7 @@
 @Author: WANG Maonan
 @Date: 2021-04-07 12:01:20
 @Description: 对于数值进行平滑
-@LastEditTime: 2023-09-01 14:12:04
+@LastEditTime: 2026-10-20 09:12:37
 '''
 import numpy as np
 from scipy.interpolate import interp1d
@@ -87,5 +87,5 @@ class InterpolationValues(object):
             [0.25, 0.25, 0.25, ..., 0.58, 0.52, 0.46]
         """
         time_index = np.arange(int(self.x_pos[-1]))
-        smooth_turndef_list = [self._interpolation(i) for i in time_index]
-        return smooth_turndef_list
\ No newline at end of file
+        smooth_values = self.f(time_index) # 一次计算所有时刻的插值
+        return [round(_value, 2) for _value in smooth_values.tolist()] # 与 _interpolation 相同, 使用 Python 的 round
\ No newline at end of file
@@ -0,0 +1,167 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-20 14:18:40
+@Description: 在仿真运行的时候从内存中的需求 (depart, route, type 数组) 批量添加车辆, 不需要 route 文件, 也不需要重启仿真
++ 需求为按照出发时间排序的 batch 的迭代器 (例如 TurnRatioRouteSampler.sample_demand 或 ODTripSampler.iter_trips 的结果)
++ 只在需要的时候读取下一个 batch, 每个 step 之前添加所有出发时间在这个 step 内的车辆
++ 路径按照 edge tuple 去重, 每条路径只通过 route.add 注册一次
+@LastEditTime: 2026-10-20 17:20:06
+'''
+import numpy as np
+from loguru import logger
+from typing import Any, Callable, Dict, Iterable, Iterator, Union
+
+DemandBatch = Dict[str, Any]
+
+
+class DemandInjector:
+    """每个 step 之前, 通过 vehicle.add 添加出发时间在这个 step 内的车辆
+
+    每个 batch 是一个 dict, 包含:
+        - depart, (N,) 出发时间 (秒)
+        - 路径, 以下三种之一:
+            - routes + route_index, 去重之后的路径 (edge 的 tuple) 以及每辆车的路径的 index (与 TurnRatioRouteSampler.sample_demand 相同)
+            - route, (N,) 每辆车的路径 (edge 的 tuple 或者空格分隔的字符串)
+            - from_edge + to_edge, (N,) 起点和终点, 仿真中使用最快的路径 (与 ODTripSampler.iter_trips 相同)
+        - veh_type, 可选, (N,) 车辆类型, 默认为 DEFAULT_VEHTYPE
+        - veh_id, 可选, (N,) 车辆的 id, 默认为 {vehicle_prefix}{index}
+
+    Args:
+        demand (Union[DemandBatch, Iterable[DemandBatch], Callable[[int], Iterable[DemandBatch]]]): 一个 batch,
+            batch 的迭代器 (按照出发时间排序), 或者输入 episode (reset 的次数) 返回迭代器的函数, 用于每个 episode 使用不同的需求.
+            generator 这类一次性的迭代器在第一个 episode 之后就用完了, 多个 episode 时请使用函数或者 list
+        vehicle_kwargs (Dict[str, Any], optional): 传给 vehicle.add 的其他参数, 例如 departSpeed. Defaults to {'departLane': 'random'}.
+        route_prefix (str, optional): 注册的路径 id 的前缀. Defaults to 'injected_route_'.
+        vehicle_prefix (str, optional): 没有给出 veh_id 时车辆 id 的前缀. Defaults to 'injected_'.
+    """
+    def __init__(self,
+                 demand:Union[DemandBatch, Iterable[DemandBatch], Callable[[int], Iterable[DemandBatch]]],
+                 vehicle_kwargs:Dict[str, Any]=None,
+                 route_prefix:str='injected_route_',
+                 vehicle_prefix:str='injected_'
+        ) -> None:
+        self.demand = demand
+        self.vehicle_kwargs = {'departLane': 'random'} if vehicle_kwargs is None else vehicle_kwargs
+        self.route_prefix = route_prefix
+        self.vehicle_prefix = vehicle_prefix
+        self.conn = None
+        self.num_episodes = 0 # 已经开始的 episode 数量
+
+    def start_episode(self, conn, episode:int=0) -> None:
+        """仿真重新开始之后调用, 之前注册的路径已经不存在, 需要清空
+
+        Args:
+            conn: traci 的连接, 例如 TshubEnvironment.sumo
+            episode (int, optional): 当前的 episode, demand 为函数时作为输入. Defaults to 0.
+        """
+        self.conn = conn
+        self.route_ids: Dict[tuple, str] = {} # edge tuple -> route id
+        self.vehicle_types = set(conn.vehicletype.getIDList())
+        self.num_vehicles = 0 # 已经读取的车辆数, 用于生成车辆的 id
+        self.num_injected = 0
+
+        demand = self.demand(episode) if callable(self.demand) else self.demand
+        self.batches: Iterator[DemandBatch] = iter([demand] if isinstance(demand, dict) else demand)
+        if self.num_episodes > 0 and not callable(self.demand) and self.batches is demand: # 一次性的迭代器已经在之前的 episode 中读取过
+            logger.warning(
+                'SIM: The demand of DemandInjector is a one-shot iterator and was consumed by a previous episode, '
+                'no more vehicles may be injected. Pass a function of the episode (or a list of batches) instead.'
+            )
+        self.num_episodes += 1
+        self.exhausted = False
+        self.pending_depart = np.zeros(0, dtype=np.float64) # 已经读取还没有添加的车辆, 按照出发时间排序
+        self.pending_route = np.zeros(0, dtype=object)
+        self.pending_type = np.zeros(0, dtype=object)
+        self.pending_id = np.zeros(0, dtype=object)
+
+    def add_demand(self, batch:DemandBatch) -> None:
+        """在 episode 中添加新的需求 (例如根据当前的状态调整的需求), 与还没有添加的车辆一起按照出发时间排序
+        """
+        self._push(batch)
+
+    def _register_routes(self, routes) -> np.ndarray:
+        """将路径转换为 route id, 新的路径通过 route.add 注册
+        """
+        route_ids = np.empty(len(routes), dtype=object)
+        for _index, _route in enumerate(routes):
+            edges = tuple(_route.split()) if isinstance(_route, str) else tuple(_route)
+            route_id = self.route_ids.get(edges)
+            if route_id is None:
+                route_id = f'{self.route_prefix}{len(self.route_ids)}'
+                self.conn.route.add(route_id, list(edges))
+                self.route_ids[edges] = route_id
+            route_ids[_index] = route_id
+        return route_ids
+
+    def _push(self, batch:DemandBatch) -> None:
+        """读取一个 batch, 注册其中的路径, 并加入等待添加的车辆
+        """
+        depart = np.asarray(batch['depart'], dtype=np.float64).reshape(-1)
+        num_vehicles = len(depart)
+        if 'routes' in batch:
+            unique_route_ids = self._register_routes(batch['routes'])
+            route = unique_route_ids[np.asarray(batch['route_index'], dtype=np.int64)] if num_vehicles else unique_route_ids[:0]
+        elif 'route' in batch:
+            unique_routes, route_index = {}, np.empty(num_vehicles, dtype=np.int64)
+            for _index, _route in enumerate(batch['route']): # 先在 batch 内去重
+                route_index[_index] = unique_routes.setdefault(_route if isinstance(_route, str) else tuple(_route), len(unique_routes))
+            route = self._register_routes(list(unique_routes.keys()))[route_index] if num_vehicles else np.zeros(0, dtype=object)
+        else: # 两个不相连的 edge 组成的路径在仿真中会被当做 trip, 出发时使用最快的路径
+            od_pairs = list(zip(batch['from_edge'], batch['to_edge']))
+            unique_routes = {_pair: _index for _index, _pair in enumerate(dict.fromkeys(od_pairs))}
+            route = self._register_routes(list(unique_routes.keys()))[[unique_routes[_pair] for _pair in od_pairs]] if num_vehicles else np.zeros(0, dtype=object)
+
+        veh_type = np.empty(num_vehicles, dtype=object)
+        veh_type[:] = batch.get('veh_type', 'DEFAULT_VEHTYPE')
+        if 'veh_id' in batch:
+            veh_id = np.asarray(batch['veh_id'], dtype=object)
+        else:
+            veh_id = np.asarray([f'{self.vehicle_prefix}{_index}' for _index in range(self.num_vehicles, self.num_vehicles + num_vehicles)], dtype=object)
+        self.num_vehicles += num_vehicles
+
+        for _veh_type in set(veh_type.tolist()) - self.vehicle_types: # 仿真中不存在的车辆类型, 复制默认的类型
+            logger.warning(f'SIM: vType {_veh_type} does not exist, copy it from DEFAULT_VEHTYPE.')
+            self.conn.vehicletype.copy('DEFAULT_VEHTYPE', _veh_type)
+            self.vehicle_types.add(_veh_type)
+
+        self.pending_depart = np.concatenate([self.pending_depart, depart])
+        self.pending_route = np.concatenate([self.pending_route, route])
+        self.pending_type = np.concatenate([self.pending_type, veh_type])
+        self.pending_id = np.concatenate([self.pending_id, veh_id])
+        if len(self.pending_depart) > 1 and np.any(np.diff(self.pending_depart) < 0):
+            order = np.argsort(self.pending_depart, kind='stable')
+            self.pending_depart, self.pending_route = self.pending_depart[order], self.pending_route[order]
+            self.pending_type, self.pending_id = self.pending_type[order], self.pending_id[order]
+
+    def inject(self, sim_time:float, step_length:float) -> int:
+        """在 simulationStep 之前调用, 添加出发时间在 (-inf, sim_time + step_length] 的车辆
+
+        Args:
+            sim_time (float): 当前的仿真时间
+            step_length (float): 仿真的步长
+
+        Returns:
+            int: 这一次添加的车辆数
+        """
+        horizon = sim_time + step_length
+        while not self.exhausted and (len(self.pending_depart) == 0 or self.pending_depart[-1] <= horizon):
+            batch = next(self.batches, None) # batch 按照出发时间排序, 只读取到超过 horizon 为止
+            if batch is None:
+                self.exhausted = True
+            else:
+                self._push(batch)
+
+        num_due = int(np.searchsorted(self.pending_depart, horizon, side='right'))
+        for veh_id, route_id, veh_type, depart in zip(
+                self.pending_id[:num_due], self.pending_route[:num_due],
+                self.pending_type[:num_due], self.pending_depart[:num_due].tolist()
+            ):
+            self.conn.vehicle.add(
+                veh_id, route_id, typeID=veh_type,
+                depart='now' if depart <= sim_time else f'{depart:.2f}',
+                **self.vehicle_kwargs
+            )
+        self.pending_depart, self.pending_route = self.pending_depart[num_due:], self.pending_route[num_due:]
+        self.pending_type, self.pending_id = self.pending_type[num_due:], self.pending_id[num_due:]
+        self.num_injected += num_due
+        return num_due
@@ -0,0 +1,182 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 17:05:33
+@Description: 记录仿真中 vehicle, person 和 traffic light 的轨迹, 内存占用有上限
++ 每个 step 的状态按列追加到内存中, 每 flush_steps 个 step 写入一个压缩的 npz 文件 (chunk)
++ 每个 chunk 写入之后 fsync, 保证文件写入磁盘; 开始 episode 时删除同一个 episode 之前留下的 chunk
++ iter_trajectory_chunks 按照 chunk 依次读取, 不会一次性读入所有的数据
+@LastEditTime: 2026-10-19 17:05:33
+'''
+import os
+import glob
+import numpy as np
+from loguru import logger
+from typing import Dict, Any, List, Iterator
+
+from ..utils.check_folder import check_folder
+
+# 每一类 object 记录的列
+RECORD_COLUMNS = {
+    'vehicle': ['time', 'id', 'x', 'y', 'speed', 'acceleration', 'heading', 'lane_id', 'lane_position'],
+    'person': ['time', 'id', 'x', 'y', 'speed', 'heading', 'road_id'],
+    'tls': ['time', 'id', 'phase_index'],
+}
+STRING_COLUMNS = {'id', 'lane_id', 'road_id'}
+
+
+class TrajectoryRecorder:
+    """将每个 step 的状态写入 chunk 文件
+
+    Args:
+        folder (str): 保存轨迹的文件夹
+        flush_steps (int, optional): 每隔多少个 step 写入一个 chunk. Defaults to 1000.
+        compress (bool, optional): 是否使用 np.savez_compressed. Defaults to True.
+    """
+    def __init__(self, folder:str, flush_steps:int=1000, compress:bool=True) -> None:
+        self.folder = folder
+        self.flush_steps = flush_steps
+        self.compress = compress
+        check_folder(self.folder)
+
+        self.episode = None # 当前的 episode
+        self.chunk_index = 0 # 当前 episode 的 chunk 数量
+        self.buffered_steps = 0 # 还没有写入的 step 数量
+        self.written_files: List[str] = [] # 当前 episode 写入的文件
+        self.last_vehicle_speed: Dict[str, float] = {} # 上一个 step 车辆的速度, 用于计算加速度
+        self.last_time = None
+        self._reset_buffer()
+
+    def _reset_buffer(self) -> None:
+        self.buffer = {
+            object_type: {column: [] for column in columns}
+            for object_type, columns in RECORD_COLUMNS.items()
+        }
+        self.buffered_steps = 0
+
+    def start_episode(self, episode:int) -> None:
+        """开始新的 episode, 如果上一个 episode 没有结束则先结束
+
+        episode 的编号在每次运行时都从头开始, 因此先删除文件夹中这个 episode 之前留下的 chunk,
+        否则 iter_trajectory_chunks 会读到上一次运行的数据
+        """
+        if self.episode is not None:
+            self.end_episode()
+        old_files = glob.glob(os.path.join(self.folder, f'episode_{episode}_chunk_*.npz'))
+        for file_path in old_files:
+            os.remove(file_path)
+        if old_files:
+            logger.warning(f'SIM: Remove {len(old_files)} old trajectory chunks of episode {episode} in {self.folder}.')
+        self.episode = episode
+        self.chunk_index = 0
+        self.written_files = []
+        self.last_vehicle_speed = {}
+        self.last_time = None
+
+    def record(self, step_time:float, obs:Dict[str, Any]) -> None:
+        """记录一个 step 的状态
+
+        Args:
+            step_time (float): 仿真时间
+            obs (Dict[str, Any]): TshubEnvironment 的 obs
+        """
+        if self.episode is None:
+            self.start_episode(0)
+
+        delta_time = None if self.last_time is None else step_time - self.last_time
+        vehicle_speed = {}
+        columns = self.buffer['vehicle']
+        for vehicle_id, vehicle in (obs.get('vehicle') or {}).items():
+            speed = vehicle['speed']
+            last_speed = self.last_vehicle_speed.get(vehicle_id)
+            vehicle_speed[vehicle_id] = speed
+            columns['time'].append(step_time)
+            columns['id'].append(vehicle_id)
+            columns['x'].append(vehicle['position'][0])
+            columns['y'].append(vehicle['position'][1])
+            columns['speed'].append(speed)
+            columns['acceleration'].append(
+                np.nan if (last_speed is None or not delta_time) else (speed - last_speed) / delta_time
+            )
+            columns['heading'].append(vehicle['heading'])
+            columns['lane_id'].append(vehicle['lane_id'])
+            columns['lane_position'].append(vehicle['lane_position'])
+        self.last_vehicle_speed = vehicle_speed # 只保留在路网中的车辆
+        self.last_time = step_time
+
+        columns = self.buffer['person']
+        for person_id, person in (obs.get('person') or {}).items():
+            columns['time'].append(step_time)
+            columns['id'].append(person_id)
+            columns['x'].append(person['position'][0])
+            columns['y'].append(person['position'][1])
+            columns['speed'].append(person['speed'])
+            columns['heading'].append(person['angle'])
+            columns['road_id'].append(person['road_id'])
+
+        columns = self.buffer['tls']
+        for tls_id, tls in (obs.get('tls') or {}).items():
+            columns['time'].append(step_time)
+            columns['id'].append(tls_id)
+            columns['phase_index'].append(tls['this_phase_index'])
+
+        self.buffered_steps += 1
+        if self.buffered_steps >= self.flush_steps:
+            self.flush()
+
+    def flush(self) -> None:
+        """将内存中的数据写入一个 chunk 文件
+        """
+        if self.buffered_steps == 0:
+            return
+        arrays = {}
+        for object_type, columns in self.buffer.items():
+            for column, values in columns.items():
+                if column in STRING_COLUMNS:
+                    arrays[f'{object_type}.{column}'] = np.array(values, dtype=str)
+                elif column == 'phase_index':
+                    arrays[f'{object_type}.{column}'] = np.array(values, dtype=np.int32)
+                else:
+                    arrays[f'{object_type}.{column}'] = np.array(values, dtype=np.float64)
+
+        file_path = os.path.join(self.folder, f'episode_{self.episode}_chunk_{self.chunk_index:05d}.npz')
+        with open(file_path, 'wb') as f:
+            if self.compress:
+                np.savez_compressed(f, **arrays)
+            else:
+                np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno()) # 在关闭之前 fsync 写入的文件
+        self.written_files.append(file_path)
+        self.chunk_index += 1
+        self._reset_buffer()
+        logger.debug(f'SIM: Save trajectory chunk {file_path}.')
+
+    def end_episode(self) -> None:
+        """结束当前 episode: 写入剩余的数据
+        """
+        if self.episode is None:
+            return
+        self.flush()
+        logger.info(f'SIM: Trajectory of episode {self.episode} is saved in {len(self.written_files)} chunks.')
+        self.episode = None
+
+
+def iter_trajectory_chunks(folder:str, episode:int, object_type:str='vehicle') -> Iterator[Dict[str, np.ndarray]]:
+    """按顺序逐个读取某个 episode 的 chunk, 每次只有一个 chunk 在内存中
+
+    Args:
+        folder (str): 保存轨迹的文件夹
+        episode (int): episode 的编号
+        object_type (str, optional): vehicle, person 或 tls. Defaults to 'vehicle'.
+
+    Yields:
+        Iterator[Dict[str, np.ndarray]]: 每个 chunk 的数据, {列名: 数组}
+    """
+    assert object_type in RECORD_COLUMNS, f'object_type can only be {list(RECORD_COLUMNS)}, now is {object_type}.'
+    chunk_files = sorted(glob.glob(os.path.join(folder, f'episode_{episode}_chunk_*.npz')))
+    for file_path in chunk_files:
+        with np.load(file_path) as chunk:
+            yield {
+                column: chunk[f'{object_type}.{column}']
+                for column in RECORD_COLUMNS[object_type]
+            }
@@ -10,13 +10,17 @@ from loguru import logger
 from typing import Dict, List, Any, Literal
 
 from .base_sumo_env import BaseSumoEnvironment
+from .trajectory_recorder import TrajectoryRecorder
+from .demand_injector import DemandInjector
 from ..map.map_builder import MapBuilder
+from ..map.map_cache import hash_map_files, save_map_infos, load_map_infos
 from ..aircraft.aircraft_builder import AircraftBuilder
 from ..traffic_light.traffic_light_builder import TrafficLightBuilder
 from ..vehicle.vehicle_builder import VehicleBuilder
 from ..person.person_builder import PersonBuilder
 from ..visualization.visualize_map import render_map
 from ..visualization.filter_objects import filter_object
+from ..visualization.raster_renderer import RasterRenderer
 
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
@@ -52,15 +56,18 @@ class TshubEnvironment(BaseSumoEnvironment):
                  is_traffic_light_builder_initialized:bool = True,
                  is_person_builder_initialized:bool = True,
                  poly_file:str = None, osm_file:str = None, radio_map_files:Dict[str, str]=None,
-                 tls_ids:List[str] = None, aircraft_inits:Dict[str, Any] = None,
-                 vehicle_action_type:str = 'lane', hightlight:bool = False,
+                 map_cache_dir:str = None, compact_map:bool = False,
+                 tls_ids:List[str] = None, aircraft_inits:Dict[str, Any] = None, aircraft_fleet_kwargs:Dict[str, Any] = None,
+                 vehicle_action_type:str = 'lane', hightlight:bool = False, vehicle_neighbor_radius:float = None,
                  tls_action_type:str = 'next_or_not', delta_time:int=5,
                  net_file: str = None, route_file: str = None, 
                  trip_info: str = None, statistic_output: str = None, summary: str = None, queue_output: str = None, 
                  tls_state_add: List = None, use_gui: bool = False, is_libsumo: bool = False, 
                  begin_time=0, num_seconds=20000, max_depart_delay=100000, time_to_teleport=-1, 
                  sumo_seed: str = 'random', tripinfo_output_unfinished:bool=True, collision_action:str=None,
-                 remote_port: int = None, num_clients: int = 1
+                 remote_port: int = None, num_clients: int = 1,
+                 trajectory_folder: str = None, trajectory_flush_steps: int = 1000,
+                 render_meters_per_pixel: float = 0.5, demand_generator: Any = None
         ) -> None:
         
         super().__init__(sumo_cfg, net_file, route_file, 
@@ -81,6 +88,9 @@ class TshubEnvironment(BaseSumoEnvironment):
         self.poly_file = poly_file
         self.osm_file = osm_file
         self.radio_map_files = radio_map_files
+        self.map_cache_dir = map_cache_dir # 地图信息的缓存文件夹, None 表示只在内存中缓存
+        self.compact_map = compact_map # lane, node, building 使用按列保存的 PolygonLayer
+        self.map_infos = None # 地图信息不随 episode 改变, 只需要计算一次
 
         # Traffic Light Builder Input
         self.tls_ids = tls_ids
@@ -94,30 +104,78 @@ class TshubEnvironment(BaseSumoEnvironment):
 
         # Aircraft Builder Input
         self.aircraft_inits = aircraft_inits
+        self.aircraft_fleet_kwargs = aircraft_fleet_kwargs # 不为 None 时使用 AircraftFleet 批量更新
         
         # Vehicle Builder Input
         self.vehicle_action_type = vehicle_action_type
         self.hightlight = hightlight
+        self.vehicle_neighbor_radius = vehicle_neighbor_radius # ego 车辆订阅周围车辆的距离
 
         # For SUMI-GUI render
         self.render_count = 0
 
-    def __init_builder(self) -> None:
-        map_builder = (
-            MapBuilder(net_file=self._net, poly_file=self.poly_file, osm_file=self.osm_file, radio_map_files=self.radio_map_files)
-            if self.is_map_builder_initialized
+        # For rgb_array render, 静态地图的背景只在第一次渲染时栅格化
+        self.render_meters_per_pixel = render_meters_per_pixel
+        self.raster_renderer = None
+
+        # 记录轨迹, 每 trajectory_flush_steps 写入一次文件
+        self.trajectory_recorder = (
+            TrajectoryRecorder(folder=trajectory_folder, flush_steps=trajectory_flush_steps)
+            if trajectory_folder is not None
+            else None
+        )
+
+        # 从内存中的需求添加车辆, 可以是 batch 的迭代器, 输入 episode 返回迭代器的函数, 或者 DemandInjector
+        # generator 只能使用一次, 多个 episode (多次 reset) 时需要传入函数, 每个 episode 返回新的迭代器
+        self.demand_injector = (
+            demand_generator if isinstance(demand_generator, DemandInjector)
+            else DemandInjector(demand=demand_generator) if demand_generator is not None
             else None
         )
-        if map_builder is not None:
-            self.map_infos = map_builder.get_objects_infos() # Statistic Map Info
+
+    def __init_map_infos(self) -> None:
+        """初始化地图信息. 地图在不同的 episode 之间不会改变, 因此:
+        1. 在内存中只计算一次, 之后的 reset 直接复用;
+        2. 如果设置了 map_cache_dir, 则以输入文件的 hash 为 key 保存在磁盘, 其他进程可以直接读取;
+        """
+        if self.map_infos is not None:
+            return
+
+        cache_key = None
+        if self.map_cache_dir is not None:
+            cache_key = hash_map_files(
+                net_file=self._net, poly_file=self.poly_file, 
+                osm_file=self.osm_file, radio_map_files=self.radio_map_files,
+                compact=self.compact_map
+            )
+            self.map_infos = load_map_infos(self.map_cache_dir, cache_key, compact=self.compact_map)
+            if self.map_infos is not None:
+                return
+
+        map_builder = MapBuilder(
+            net_file=self._net, poly_file=self.poly_file, osm_file=self.osm_file, 
+            radio_map_files=self.radio_map_files, compact=self.compact_map,
+            cache_dir=self.map_cache_dir
+        )
+        self.map_infos = map_builder.get_objects_infos() # Statistic Map Info
+        if cache_key is not None:
+            os.makedirs(self.map_cache_dir, exist_ok=True)
+            save_map_infos(self.map_cache_dir, cache_key, self.map_infos)
+
+    def __init_builder(self) -> None:
+        if self.is_map_builder_initialized:
+            self.__init_map_infos()
 
         vehicle_builder = (
-            VehicleBuilder(sumo=self.sumo, action_type=self.vehicle_action_type, hightlight=self.hightlight)
+            VehicleBuilder(
+                sumo=self.sumo, action_type=self.vehicle_action_type, 
+                hightlight=self.hightlight, neighbor_radius=self.vehicle_neighbor_radius
+            )
             if self.is_vehicle_builder_initialized
             else None
         )
         aircraft_builder = (
-            AircraftBuilder(sumo=self.sumo, aircraft_inits=self.aircraft_inits)
+            AircraftBuilder(sumo=self.sumo, aircraft_inits=self.aircraft_inits, fleet_kwargs=self.aircraft_fleet_kwargs)
             if self.is_aircraft_builder_initialized
             else None
         )
@@ -145,9 +203,14 @@ class TshubEnvironment(BaseSumoEnvironment):
         self._close_simulation() # 关闭仿真
         self._start_simulation() # 开启仿真
         self.__init_builder() # 初始化场景内的 builder
+        if self.demand_injector is not None:
+            self.demand_injector.start_episode(self.sumo, self.reset_num)
         obs = self.__computer_observation()
 
         self.obs = obs.copy() # copy obs for render
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.start_episode(self.reset_num)
+            self.trajectory_recorder.record(self.sim_step, obs)
 
         return obs
     
@@ -156,7 +219,9 @@ class TshubEnvironment(BaseSumoEnvironment):
         for _object_type, _object_action in actions.items():
             if self.scene_objects[_object_type] is not None:
                 self.scene_objects[_object_type].control_objects(_object_action)
-        
+
+        if self.demand_injector is not None: # 添加在这个 step 内出发的车辆
+            self.demand_injector.inject(self.sim_step, self.sumo.simulation.getDeltaT())
         self.sumo.simulationStep()
         logger.info(f'SIM: ==> Simulation Step: {self.sim_step} <==') # 日志中打印当前的仿真时间
 
@@ -167,9 +232,18 @@ class TshubEnvironment(BaseSumoEnvironment):
         done = self._computer_done()
 
         self.obs = obs.copy() # copy obs for render
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.record(self.sim_step, obs)
         
         return obs, reward, info, done
 
+    def _close_simulation(self) -> None:
+        """关闭仿真之前, 将当前 episode 的轨迹写入磁盘
+        """
+        if getattr(self, 'trajectory_recorder', None) is not None:
+            self.trajectory_recorder.end_episode()
+        super()._close_simulation()
+
     def __computer_observation(self) -> Dict[str, Any]:
         """自定义 obs 的计算
         """
@@ -201,7 +275,8 @@ class TshubEnvironment(BaseSumoEnvironment):
         """对场景进行渲染
 
         Args:
-            mode (str, optional): 渲染的模式，包含 rgb 和 sumo_gui. Defaults to rgb.
+            mode (str, optional): 渲染的模式，包含 rgb, rgb_array 和 sumo_gui. Defaults to rgb.
+                rgb 返回 matplotlib 的 fig; rgb_array 直接返回 (H, W, 3) 的 uint8 图片, 地图的背景会被缓存.
             focus_id (str, optional): 追踪模式，设置追踪 object 的 ID. Defaults to None. 如果设置为 None，就是全局渲染
             focus_type (str, optional): 追踪 object 的类型，包含 vehicle 和 node. Defaults to None.
             focus_distance (float, optional): 追踪覆盖的范围. Defaults to None.
@@ -209,6 +284,11 @@ class TshubEnvironment(BaseSumoEnvironment):
         """
         if not self.is_map_builder_initialized:
             raise ValueError('需要初始化地图信息')
+
+        if mode == 'rgb_array': # 不需要过滤 object, 渲染时直接裁剪
+            if self.raster_renderer is None:
+                self.raster_renderer = RasterRenderer(self.map_infos, meters_per_pixel=self.render_meters_per_pixel)
+            return self.raster_renderer.render(self.obs, focus_id, focus_type, focus_distance)
         
         # Step 1. Filter Object (找出符合要求的 object 坐标)
         obs, x_range, y_range = filter_object(
@@ -254,4 +334,4 @@ class TshubEnvironment(BaseSumoEnvironment):
             self.render_count += 1
             return None
         else:
-            raise ValueError(f'mode can only be rgb and sumo_gui, now is {mode}.')
\ No newline at end of file
+            raise ValueError(f'mode can only be rgb, rgb_array and sumo_gui, now is {mode}.')
\ No newline at end of file
@@ -9,7 +9,7 @@ from PIL import Image
 
 def merge_gifs_in_grid(gif_paths, output_path, gifs_per_row, spacing=10) -> None:
     """
-    可以将多个 gif 文件合并。
+    可以将多个 gif 文件合并。所有的帧会一次性读入内存, 很长的录像使用 merge_video.merge_videos_in_grid。
     Merge multiple GIF files into a grid with white spacing between them.
 
     :param gif_paths: List of file paths to the GIFs.
@@ -0,0 +1,234 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 23:30:16
+@Description: 流式合并多个相机的输出 (GIF, MP4, 或者图片序列), 用于很长的录像
++ 每个输入逐帧读取 (可以在后台线程中解码), 不会一次性读入所有的帧
++ 使用预先分配的画布拼接每一帧, 逐帧写入 MP4/WebM (imageio-ffmpeg) 或 GIF (Pillow 的 getheader/getdata, 每一帧使用自己的调色板)
++ 与 merge_gifs_in_grid 相同, 输出的长度与第一个输入相同, 较短的输入重复最后一帧
+@LastEditTime: 2026-10-19 23:30:16
+'''
+import os
+import glob
+import queue
+import threading
+import numpy as np
+from PIL import Image, GifImagePlugin
+from loguru import logger
+from typing import Iterator, List, Union, Sequence
+
+import imageio.v2 as imageio_v2
+import imageio.v3 as iio
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+DEFAULT_CODECS = {'.webm': 'libvpx-vp9'} # 其余的视频格式使用 imageio 默认的 libx264
+_END = object() # 后台线程读取结束的标记
+
+
+def iter_frames(source:Union[str, Sequence[str]]) -> Iterator[np.ndarray]:
+    """逐帧读取一个输入, 返回 (H, W, 3) 的 uint8 RGB 图片
+
+    Args:
+        source (Union[str, Sequence[str]]): GIF/视频文件, 图片文件夹 (按文件名排序), glob (例如 ./front/*.png) 或图片路径的列表
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        paths = sorted(
+            _path for _path in glob.glob(os.path.join(source, '*'))
+            if _path.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        frames = (iio.imread(_path) for _path in paths)
+    elif isinstance(source, str) and glob.has_magic(source):
+        frames = (iio.imread(_path) for _path in sorted(glob.glob(source)))
+    elif isinstance(source, str):
+        frames = iio.imiter(source)
+    else:
+        frames = (iio.imread(_path) for _path in source)
+
+    for frame in frames:
+        yield to_rgb(frame)
+
+
+def to_rgb(frame:np.ndarray) -> np.ndarray:
+    """灰度图转换为 RGB, RGBA 使用 alpha 与白色背景混合
+    """
+    frame = np.asarray(frame)
+    if frame.ndim == 2:
+        return np.repeat(frame[:, :, None], 3, axis=2).astype(np.uint8, copy=False)
+    if frame.shape[2] == 4:
+        alpha = frame[:, :, 3:4].astype(np.float32) / 255
+        return (frame[:, :, :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+    return frame[:, :, :3].astype(np.uint8, copy=False)
+
+
+def prefetch(frames:Iterator[np.ndarray], queue_size:int) -> Iterator[np.ndarray]:
+    """在后台线程中读取 frames, 最多缓存 queue_size 帧
+    """
+    frame_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+
+    def _worker():
+        try:
+            for frame in frames:
+                while not stop_event.is_set():
+                    try:
+                        frame_queue.put(frame, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop_event.is_set():
+                    return
+            frame_queue.put(_END)
+        except Exception as e: # 在主线程中抛出读取时的错误
+            frame_queue.put(e)
+
+    worker = threading.Thread(target=_worker, daemon=True)
+    worker.start()
+    try:
+        while True:
+            frame = frame_queue.get()
+            if frame is _END:
+                return
+            if isinstance(frame, Exception):
+                raise frame
+            yield frame
+    finally:
+        stop_event.set() # 主线程提前结束时, 通知后台线程退出
+
+
+def get_source_fps(source:Union[str, Sequence[str]], default:float=10) -> float:
+    """从 GIF/视频的 metadata 中读取 fps, 读取失败时返回 default
+    """
+    if not isinstance(source, str) or os.path.isdir(source) or glob.has_magic(source):
+        return default
+    try:
+        metadata = iio.immeta(source)
+    except Exception:
+        return default
+    if metadata.get('fps'):
+        return float(metadata['fps'])
+    if metadata.get('duration'): # GIF 的 duration 为每一帧的时间 [ms]
+        return 1000 / float(metadata['duration'])
+    return default
+
+
+class GifStreamWriter:
+    """逐帧写入 GIF, 每一帧编码之后直接写入文件 (Image.save(save_all=True) 会在内存中保留所有的帧)
+
+    Args:
+        output_path (str): 输出的 GIF 文件
+        fps (float): 每秒的帧数
+        loop (int, optional): 循环的次数, 0 表示无限循环. Defaults to 0.
+    """
+    def __init__(self, output_path:str, fps:float, loop:int=0) -> None:
+        self.file = open(output_path, 'wb')
+        self.duration = 1000 / fps
+        self.loop = loop
+        self.num_frames = 0
+
+    def append_data(self, frame:np.ndarray) -> None:
+        image = Image.fromarray(frame).convert('P', palette=Image.Palette.ADAPTIVE)
+        if self.num_frames == 0:
+            header, _ = GifImagePlugin.getheader(image, info={'loop': self.loop, 'duration': self.duration})
+            self.file.write(b''.join(header))
+        for data in GifImagePlugin.getdata(image, duration=self.duration, include_color_table=True):
+            self.file.write(data)
+        self.num_frames += 1
+
+    def close(self) -> None:
+        self.file.write(b';') # GIF 的结束符
+        self.file.close()
+
+    def __enter__(self) -> 'GifStreamWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def merge_videos_in_grid(
+        sources:List[Union[str, Sequence[str]]],
+        output_path:str,
+        videos_per_row:int,
+        spacing:int=10,
+        fps:float=None,
+        use_threads:bool=True,
+        queue_size:int=8,
+        **writer_kwargs
+    ) -> int:
+    """流式地将多个输入拼接为网格, 内存的占用与视频的长度无关
+
+    Args:
+        sources (List[Union[str, Sequence[str]]]): 每个相机的输入, 见 iter_frames
+        output_path (str): 输出的文件, 根据后缀使用 MP4/WebM (ffmpeg) 或 GIF
+        videos_per_row (int): 每一行的数量
+        spacing (int, optional): 相邻的画面之间白色间隔的像素. Defaults to 10.
+        fps (float, optional): 输出的 fps, None 时使用第一个输入的 fps. Defaults to None.
+        use_threads (bool, optional): 是否在后台线程中解码每一个输入. Defaults to True.
+        queue_size (int, optional): 每个后台线程最多缓存的帧数. Defaults to 8.
+        writer_kwargs: 传给 writer 的参数, 例如视频的 codec, quality, GIF 的 loop
+
+    Returns:
+        int: 输出的帧数
+    """
+    fps = fps or get_source_fps(sources[0])
+    readers = [iter_frames(_source) for _source in sources]
+    if use_threads:
+        readers = [prefetch(_reader, queue_size) for _reader in readers]
+
+    # 使用第一个输入的第一帧确定每个画面的大小
+    first_frames = [next(_reader, None) for _reader in readers]
+    if first_frames[0] is None:
+        raise ValueError(f'{sources[0]} does not contain any frame.')
+    tile_height, tile_width = first_frames[0].shape[:2]
+    num_rows = (len(sources) + videos_per_row - 1) // videos_per_row
+    full_width = tile_width * videos_per_row + spacing * (videos_per_row - 1)
+    full_height = tile_height * num_rows + spacing * (num_rows - 1)
+
+    is_gif = output_path.lower().endswith('.gif')
+    if not is_gif: # yuv420p 需要偶数的宽和高
+        full_width, full_height = full_width + full_width % 2, full_height + full_height % 2
+    canvas = np.full((full_height, full_width, 3), 255, dtype=np.uint8) # 每一帧重复使用的画布
+    tile_origins = [
+        (_row * (tile_height + spacing), _col * (tile_width + spacing))
+        for _row, _col in (divmod(_index, videos_per_row) for _index in range(len(sources)))
+    ]
+    last_frames = list(first_frames)
+
+    def _composite(frames:List[np.ndarray]) -> np.ndarray:
+        for (y, x), frame in zip(tile_origins, frames):
+            if frame is None: # 输入没有任何帧, 保持白色
+                continue
+            height, width = min(frame.shape[0], tile_height), min(frame.shape[1], tile_width)
+            canvas[y:y+height, x:x+width] = frame[:height, :width]
+        return canvas
+
+    def _iter_canvas() -> Iterator[np.ndarray]:
+        yield _composite(last_frames)
+        while True:
+            frame = next(readers[0], None)
+            if frame is None: # 第一个输入结束
+                return
+            last_frames[0] = frame
+            for _index in range(1, len(readers)):
+                _frame = next(readers[_index], None)
+                if _frame is not None:
+                    last_frames[_index] = _frame
+            yield _composite(last_frames)
+
+    num_frames = 0
+    if is_gif:
+        writer = GifStreamWriter(output_path, fps, **writer_kwargs)
+    else:
+        codec = DEFAULT_CODECS.get(os.path.splitext(output_path)[1].lower())
+        if codec is not None:
+            writer_kwargs.setdefault('codec', codec)
+        writer = imageio_v2.get_writer(output_path, fps=fps, macro_block_size=1, **writer_kwargs)
+    with writer:
+        for _canvas in _iter_canvas():
+            writer.append_data(_canvas)
+            num_frames += 1
+
+    for reader in readers: # 结束后台线程
+        if hasattr(reader, 'close'):
+            reader.close()
+    logger.info(f'SIM: Merge {len(sources)} videos into {output_path}, {num_frames} frames.')
+    return num_frames
@@ -0,0 +1,87 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 15:40:07
+@Description: 带有 id 的二维点的空间索引 (KD-tree), 用于批量的邻居查询
++ 输入可以是 object 的 id (此时结果中不包含自身), 也可以是任意的坐标
+@LastEditTime: 2026-10-19 15:40:07
+'''
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import List, Tuple, Union, Sequence
+
+
+class PointIndex:
+    """二维点的 KD-tree 索引
+
+    Args:
+        ids (Sequence[str]): 每个点的 id
+        positions (np.ndarray): (N, 2) 每个点的坐标
+    """
+    def __init__(self, ids: Sequence[str], positions: np.ndarray) -> None:
+        self.ids = np.asarray(list(ids), dtype=object)
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        self.id_to_index = {_id:_index for _index, _id in enumerate(self.ids)}
+        self.tree = cKDTree(self.positions) if len(self.ids) > 0 else None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _as_points(self, ids_or_points: Union[Sequence[str], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """将 query 转换为坐标, 同时返回 query 自身在索引中的 index (坐标 query 为 -1)
+        """
+        if isinstance(ids_or_points, np.ndarray) and ids_or_points.dtype.kind in 'fiu':
+            points = ids_or_points.astype(np.float64).reshape(-1, 2)
+            return points, np.full(len(points), -1, dtype=np.int64)
+        self_index = np.array([self.id_to_index[_id] for _id in ids_or_points], dtype=np.int64)
+        return self.positions[self_index], self_index
+
+    def neighbors_within(self, ids_or_points: Union[Sequence[str], np.ndarray], r: float) -> List[List[str]]:
+        """批量查询距离不超过 r 的点
+
+        Args:
+            ids_or_points (Union[Sequence[str], np.ndarray]): object 的 id 列表, 或是 (M, 2) 的坐标
+            r (float): 查询的半径 [m]
+
+        Returns:
+            List[List[str]]: 每个 query 附近的 id, 按照距离从近到远排序 (id query 不包含自身)
+        """
+        points, self_index = self._as_points(ids_or_points)
+        if self.tree is None:
+            return [[] for _ in range(len(points))]
+        neighbors = self.tree.query_ball_point(points, r)
+        results = []
+        for _point, _self, _neighbor in zip(points, self_index, neighbors):
+            _neighbor = np.asarray(_neighbor, dtype=np.int64)
+            _neighbor = _neighbor[_neighbor != _self]
+            _distance = np.hypot(*(self.positions[_neighbor] - _point).T)
+            results.append(self.ids[_neighbor[np.argsort(_distance, kind='stable')]].tolist())
+        return results
+
+    def k_nearest(self, ids_or_points: Union[Sequence[str], np.ndarray], k: int) -> Tuple[List[List[str]], np.ndarray]:
+        """批量查询最近的 k 个点
+
+        Args:
+            ids_or_points (Union[Sequence[str], np.ndarray]): object 的 id 列表, 或是 (M, 2) 的坐标
+            k (int): 邻居的数量
+
+        Returns:
+            Tuple[List[List[str]], np.ndarray]: 每个 query 最近的 id (数量不足 k 时会更少), 以及 (M, k) 的距离 (不足时为 inf)
+        """
+        points, self_index = self._as_points(ids_or_points)
+        distances = np.full((len(points), k), np.inf)
+        if self.tree is None or k <= 0:
+            return [[] for _ in range(len(points))], distances
+
+        num_query = min(k + 1, len(self)) # 多查询一个, 用于去掉自身
+        query_distance, query_index = self.tree.query(points, k=num_query)
+        query_distance = query_distance.reshape(len(points), num_query)
+        query_index = query_index.reshape(len(points), num_query)
+
+        keep = (query_index != self_index[:, None]) & (query_index < len(self))
+        # 每一行只保留前 k 个
+        keep &= np.cumsum(keep, axis=1) <= k
+        neighbor_ids = []
+        for _row, (_index, _distance, _keep) in enumerate(zip(query_index, query_distance, keep)):
+            neighbor_ids.append(self.ids[_index[_keep]].tolist())
+            distances[_row, :_keep.sum()] = _distance[_keep]
+        return neighbor_ids, distances
@@ -2,10 +2,14 @@
 @Author: WANG Maonan
 @Date: 2024-08-09 11:26:23
 @Description: Channel Models
-@LastEditTime: 2024-08-10 20:22:07
+@LastEditTime: 2026-10-19 21:40:26
 '''
 from .v2x_channel import V2XChannel
 from .v2i_channel import V2IChannel
 from .v2v_channel import V2VChannel
+from .shadowing_field import ShadowingField
+from .los_classifier import LOSClassifier
+from .packet_simulator import V2XPacketSimulator
+from .radio_map_channel import RadioMapChannel
 
 from .v2x_utils.snr_to_packetloss import calculate_outage_probability
\ No newline at end of file
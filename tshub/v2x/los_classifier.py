@@ -0,0 +1,181 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 20:31:05
+@Description: 根据建筑物的多边形判断 V2X 链路是 LOS 还是 NLOS
++ 链路 (线段) 通过建筑物的空间索引 (PolygonIndex) 找到候选的建筑物, 只对候选的建筑物做精确的相交判断
++ 对于位置不变的节点 (RSU, 基站), 预先计算并缓存附近每个建筑物的角度范围和最近距离,
+  查询时先用角度与距离筛选, 不需要再查询空间索引
+@LastEditTime: 2026-10-20 20:06:14
+'''
+import numpy as np
+from typing import Dict, Any, Sequence
+
+from ..map.spatial_index import PolygonIndex, concat_ranges
+
+
+class LOSClassifier:
+    """判断链路是否被建筑物遮挡
+
+    Args:
+        building_index (PolygonIndex): 建筑物的空间索引, 例如 MapBuilder.spatial_index['building']
+    """
+    def __init__(self, building_index:PolygonIndex) -> None:
+        self.building_index = building_index
+        self.static_nodes: Dict[str, Dict[str, np.ndarray]] = dict() # 静态节点 (RSU) 的缓存
+
+    @classmethod
+    def from_polygon_infos(cls, building_infos:Dict[str, Dict[str, Any]], polygon_types:Sequence[str]=('building',)) -> 'LOSClassifier':
+        """从 map_infos['building'] 创建, 只使用 polygon_types 中的多边形 (例如不包括 residential, leisure 等区域)
+
+        Args:
+            building_infos (Dict[str, Dict[str, Any]]): map_infos['building'], 也可以是 PolygonLayer
+            polygon_types (Sequence[str], optional): 会遮挡信号的多边形类型, None 表示使用所有的多边形. Defaults to ('building',).
+        """
+        building_ids, building_shapes = [], []
+        for building_id, building in building_infos.items():
+            if (polygon_types is None) or (building['polygon_type'] in polygon_types):
+                building_ids.append(building_id)
+                building_shapes.append(building['shape'])
+        return cls(PolygonIndex.from_shapes(building_ids, building_shapes))
+
+    @classmethod
+    def from_map_builder(cls, map_builder, polygon_types:Sequence[str]=('building',)) -> 'LOSClassifier':
+        return cls.from_polygon_infos(map_builder.get_objects_infos()['building'], polygon_types)
+
+    # ###########
+    # 动态的链路
+    # ###########
+    def get_los_mask(self, positions_A:np.ndarray, positions_B:np.ndarray, ignore_buildings:np.ndarray=None) -> np.ndarray:
+        """逐行判断 positions_A[i] 与 positions_B[i] 之间是否是 LOS
+
+        Args:
+            positions_A (np.ndarray): (N, 2) 链路的一端
+            positions_B (np.ndarray): (N, 2) 链路的另一端
+            ignore_buildings (np.ndarray, optional): 不会遮挡链路的建筑物 (在 building_index 中的 index), 
+                例如静态节点所在的建筑物. Defaults to None.
+
+        Returns:
+            np.ndarray: (N,) bool, True 表示 LOS
+        """
+        positions_A = np.asarray(positions_A, dtype=np.float64).reshape(-1, 2)
+        positions_B = np.asarray(positions_B, dtype=np.float64).reshape(-1, 2)
+        pair_link, pair_building = self.building_index.segment_candidate_pairs(positions_A, positions_B)
+        if ignore_buildings is not None and len(ignore_buildings):
+            keep = ~np.isin(pair_building, ignore_buildings)
+            pair_link, pair_building = pair_link[keep], pair_building[keep]
+        blocked = self.building_index.crosses_segments(
+            positions_A[pair_link], positions_B[pair_link], pair_building
+        )
+        return np.bincount(pair_link[blocked], minlength=len(positions_A)) == 0
+
+    def get_los_matrix(self, positions_A:np.ndarray, positions_B:np.ndarray=None) -> np.ndarray:
+        """判断 N 个节点 A 与 M 个节点 B 之间所有链路是否是 LOS, 结果可以直接作为 V2VChannel 的 los_mask
+
+        Args:
+            positions_A (np.ndarray): (N, 2) 节点 A 的位置
+            positions_B (np.ndarray, optional): (M, 2) 节点 B 的位置, None 时与 A 相同. Defaults to None.
+
+        Returns:
+            np.ndarray: (N, M) bool, True 表示 LOS
+        """
+        positions_A = np.asarray(positions_A, dtype=np.float64).reshape(-1, 2)
+        positions_B = positions_A if positions_B is None else np.asarray(positions_B, dtype=np.float64).reshape(-1, 2)
+        num_A, num_B = len(positions_A), len(positions_B)
+        link_A = np.repeat(np.arange(num_A), num_B)
+        link_B = np.tile(np.arange(num_B), num_A)
+        return self.get_los_mask(positions_A[link_A], positions_B[link_B]).reshape(num_A, num_B)
+
+    # ###########
+    # 静态的节点
+    # ###########
+    def add_static_nodes(self, node_ids:Sequence[str], positions:np.ndarray, max_distance:float=1000) -> None:
+        """缓存静态节点附近的建筑物, 以及每个建筑物 (从节点看过去) 的角度范围和最近的距离
+
+        Args:
+            node_ids (Sequence[str]): 静态节点的 id
+            positions (np.ndarray): (M, 2) 静态节点的位置
+            max_distance (float, optional): 只缓存这个距离以内的建筑物, 更长的链路使用空间索引判断. Defaults to 1000.
+        """
+        index = self.building_index
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        for node_id, position in zip(node_ids, positions):
+            query_box = np.hstack([position - max_distance, position + max_distance]).reshape(1, 4)
+            _, buildings = index.candidate_pairs(query_box)
+            points = np.broadcast_to(position, (len(buildings), 2))
+            distance = index.distance(points, buildings)
+            # 节点所在的建筑物 (例如安装在楼顶的 RSU) 不会遮挡该节点的链路
+            own_buildings = buildings[distance == 0]
+            keep = (distance > 0) & (distance <= max_distance)
+            buildings, distance = buildings[keep], distance[keep]
+
+            # 沿着多边形的边累加角度的变化, 得到连续的角度, 再求每个建筑物的角度范围
+            counts = index.num_vertices[buildings]
+            vertex_owner = np.repeat(np.arange(len(buildings), dtype=np.int64), counts)
+            vertex_index = concat_ranges(index.offsets[:-1][buildings], counts)
+            delta = index.coords[vertex_index] - position
+            angle = np.arctan2(delta[:, 1], delta[:, 0])
+            step = np.diff(angle, prepend=angle[:1])
+            step = (step + np.pi) % (2 * np.pi) - np.pi
+            segment_begin = np.cumsum(counts) - counts
+            step[segment_begin[counts > 0]] = 0
+            unwrapped = np.cumsum(step)
+            unwrapped = unwrapped - np.repeat(unwrapped[segment_begin[counts > 0]], counts[counts > 0]) + \
+                np.repeat(angle[segment_begin[counts > 0]], counts[counts > 0])
+            angle_min = np.full(len(buildings), np.inf)
+            angle_max = np.full(len(buildings), -np.inf)
+            np.minimum.at(angle_min, vertex_owner, unwrapped)
+            np.maximum.at(angle_max, vertex_owner, unwrapped)
+
+            self.static_nodes[node_id] = {
+                'position': position,
+                'max_distance': max_distance,
+                'own_buildings': own_buildings,
+                'buildings': buildings,
+                'distance': distance,
+                'angle_min': angle_min,
+                'angle_span': np.minimum(angle_max - angle_min, 2 * np.pi),
+            }
+
+    def get_static_los_matrix(self, positions:np.ndarray, node_ids:Sequence[str]) -> np.ndarray:
+        """判断 N 个移动节点与已经缓存的 M 个静态节点之间是否是 LOS
+
+        Args:
+            positions (np.ndarray): (N, 2) 移动节点 (车辆) 的位置
+            node_ids (Sequence[str]): M 个静态节点的 id, 需要先调用 add_static_nodes
+
+        Returns:
+            np.ndarray: (N, M) bool, True 表示 LOS
+        """
+        index = self.building_index
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        los = np.ones((len(positions), len(node_ids)), dtype=bool)
+        for node_index, node_id in enumerate(node_ids):
+            node = self.static_nodes[node_id]
+            delta = positions - node['position']
+            link_length = np.hypot(delta[:, 0], delta[:, 1])
+            link_angle = np.arctan2(delta[:, 1], delta[:, 0])
+
+            far = link_length > node['max_distance'] # 超过缓存的范围, 使用空间索引判断, 同样不考虑节点所在的建筑物
+            if far.any():
+                los[far, node_index] = self.get_los_mask(
+                    np.broadcast_to(node['position'], (far.sum(), 2)), positions[far],
+                    ignore_buildings=node['own_buildings']
+                )
+
+            # 角度在建筑物的范围内, 且建筑物比链路的另一端更近
+            in_angle = (
+                (link_angle[:, None] - node['angle_min'][None, :]) % (2 * np.pi)
+            ) <= node['angle_span'][None, :]
+            pair_link, pair_building = np.nonzero(
+                in_angle & (node['distance'][None, :] <= link_length[:, None]) & ~far[:, None]
+            )
+            blocked = index.crosses_segments(
+                np.broadcast_to(node['position'], (len(pair_link), 2)),
+                positions[pair_link], node['buildings'][pair_building]
+            )
+            los[np.unique(pair_link[blocked]), node_index] = False
+        return los
+
+    def remove_static_nodes(self, node_ids:Sequence[str]) -> None:
+        for node_id in node_ids:
+            self.static_nodes.pop(node_id, None)
@@ -0,0 +1,276 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 21:05:12
+@Description: 离散时间的 V2X 消息层 (packet level)
++ 每个节点有一个发送队列 (FIFO), 消息为 unicast 或 broadcast, 包含大小 (bit) 和 deadline
++ 每个 step 每个节点最多发送 tx_capacity_bits 的消息, 每条链路根据 SNR 的 outage probability 做 Bernoulli 抽样
++ unicast 失败后留在队列中重传, 直到 deadline; broadcast 只发送一次
++ 所有消息保存在数组中, 每个 step 使用 numpy 一次处理所有消息, 同时统计 latency 和 age of information
+@LastEditTime: 2026-10-19 21:05:12
+'''
+import numpy as np
+from loguru import logger
+from typing import Dict, List, Sequence, Union
+
+from .v2x_utils.snr_to_packetloss import calculate_outage_probability
+
+BROADCAST = -1 # 广播消息的目的节点
+
+
+class V2XPacketSimulator:
+    """V2X 消息的发送与接收
+
+    Args:
+        tx_capacity_bits (float, optional): 每个节点每个 step 最多发送的 bit 数, 队首的消息总是可以发送. Defaults to 20e3.
+        bandwidth_hz (float, optional): 计算 outage probability 的带宽. Defaults to 30e3.
+        target_rate_bps (float, optional): 计算 outage probability 的目标速率. Defaults to 20e3.
+    """
+    def __init__(self,
+                 tx_capacity_bits:float=20e3,
+                 bandwidth_hz:float=30e3, target_rate_bps:float=20e3
+        ) -> None:
+        self.tx_capacity_bits = tx_capacity_bits
+        self.bandwidth_hz = bandwidth_hz
+        self.target_rate_bps = target_rate_bps
+
+        self.node_to_slot: Dict[str, int] = {} # 节点 id -> 整数编号
+        self.slot_to_node: List[str] = []
+        self.free_slots: List[int] = [] # 离开网络的节点释放的编号, 新的节点优先使用, 编号的数量不超过同时存在的节点数
+        self.next_message_id = 0
+
+        # 队列中的消息, 按照发送的顺序保存
+        self.queue = {
+            'message_id': np.zeros(0, dtype=np.int64),
+            'source': np.zeros(0, dtype=np.int64),
+            'destination': np.zeros(0, dtype=np.int64), # BROADCAST 表示广播
+            'size': np.zeros(0, dtype=np.float64), # bit
+            'created_time': np.zeros(0, dtype=np.float64),
+            'deadline': np.zeros(0, dtype=np.float64), # 绝对时间
+        }
+
+        # (receiver, source) 收到的最新消息的生成时间, 用于计算 age of information
+        self.aoi_keys = np.zeros(0, dtype=np.int64)
+        self.aoi_created_time = np.zeros(0, dtype=np.float64)
+
+        self.statistics = {
+            'sent_messages': 0, # 加入队列的消息
+            'transmissions': 0, # 发送的次数 (包括重传)
+            'delivered_packets': 0, # 成功接收的 (消息, 接收节点)
+            'expired_messages': 0, # 超过 deadline 被丢弃的消息
+            'latency_sum': 0.0,
+            'latency_max': 0.0,
+        }
+
+    def __len__(self) -> int:
+        """队列中消息的数量
+        """
+        return len(self.queue['message_id'])
+
+    def _get_slots(self, node_ids:Sequence[str]) -> np.ndarray:
+        slots = np.empty(len(node_ids), dtype=np.int64)
+        for _index, _id in enumerate(node_ids):
+            _slot = self.node_to_slot.get(_id)
+            if _slot is None:
+                if self.free_slots:
+                    _slot = self.free_slots.pop()
+                    self.slot_to_node[_slot] = _id
+                else:
+                    _slot = len(self.slot_to_node)
+                    self.slot_to_node.append(_id)
+                self.node_to_slot[_id] = _slot
+            slots[_index] = _slot
+        return slots
+
+    def send(self,
+             source_ids:Sequence[str], now:float,
+             destination_ids:Sequence[str]=None,
+             sizes:Union[float, np.ndarray]=1600, deadlines:Union[float, np.ndarray]=1.0,
+        ) -> np.ndarray:
+        """将一批消息加入发送节点的队列
+
+        Args:
+            source_ids (Sequence[str]): 每条消息的发送节点
+            now (float): 当前的仿真时间
+            destination_ids (Sequence[str], optional): 每条消息的接收节点, None 表示广播, 也可以逐条为 None. Defaults to None.
+            sizes (Union[float, np.ndarray], optional): 消息的大小 (bit). Defaults to 1600.
+            deadlines (Union[float, np.ndarray], optional): 消息的有效时间 (s), 超过 now + deadline 没有送达则丢弃. Defaults to 1.0.
+
+        Returns:
+            np.ndarray: 每条消息的 message id
+        """
+        num_messages = len(source_ids)
+        if destination_ids is None:
+            destination = np.full(num_messages, BROADCAST, dtype=np.int64)
+        else:
+            is_broadcast = np.array([_id is None for _id in destination_ids], dtype=bool)
+            destination = np.full(num_messages, BROADCAST, dtype=np.int64)
+            destination[~is_broadcast] = self._get_slots(
+                [_id for _id in destination_ids if _id is not None]
+            )
+
+        message_id = np.arange(self.next_message_id, self.next_message_id + num_messages, dtype=np.int64)
+        self.next_message_id += num_messages
+        new_messages = {
+            'message_id': message_id,
+            'source': self._get_slots(source_ids),
+            'destination': destination,
+            'size': np.broadcast_to(np.asarray(sizes, dtype=np.float64), (num_messages,)),
+            'created_time': np.full(num_messages, now, dtype=np.float64),
+            'deadline': now + np.broadcast_to(np.asarray(deadlines, dtype=np.float64), (num_messages,)),
+        }
+        for _key, _value in new_messages.items():
+            self.queue[_key] = np.concatenate([self.queue[_key], _value])
+        self.statistics['sent_messages'] += num_messages
+        return message_id
+
+    def _keep_messages(self, keep:np.ndarray) -> None:
+        for _key in self.queue:
+            self.queue[_key] = self.queue[_key][keep]
+
+    def step(self,
+             now:float, node_ids:Sequence[str],
+             snr:np.ndarray=None, success_probability:np.ndarray=None,
+        ) -> Dict[str, np.ndarray]:
+        """处理一个 step 的发送与接收
+
+        Args:
+            now (float): 当前的仿真时间
+            node_ids (Sequence[str]): 当前在网络中的节点, 不在其中的节点不能发送和接收
+            snr (np.ndarray, optional): (N, N) 的 SNR [dB], snr[i, j] 为 node i 发送到 node j. Defaults to None.
+            success_probability (np.ndarray, optional): (N, N) 直接给出发送成功的概率, 此时不使用 snr. Defaults to None.
+
+        Returns:
+            Dict[str, np.ndarray]: 这个 step 成功接收的消息 (message_id, source, receiver, latency), 以及 expired 的 message id
+        """
+        if success_probability is None:
+            success_probability = 1 - calculate_outage_probability(
+                np.asarray(snr, dtype=np.float64), self.bandwidth_hz, self.target_rate_bps
+            )
+        success_probability = np.asarray(success_probability, dtype=np.float64)
+
+        # 1. 丢弃超过 deadline 的消息
+        expired = self.queue['deadline'] < now
+        expired_message_id = self.queue['message_id'][expired]
+        self._keep_messages(~expired)
+        self.statistics['expired_messages'] += len(expired_message_id)
+
+        # 节点编号 -> 当前 step 中的行号 (不在网络中为 -1)
+        node_slots = self._get_slots(node_ids)
+        slot_to_row = np.full(len(self.slot_to_node), -1, dtype=np.int64)
+        slot_to_row[node_slots] = np.arange(len(node_slots))
+        source_row = slot_to_row[self.queue['source']]
+
+        # 2. 每个节点按照 FIFO 发送, 累计的大小不超过 tx_capacity_bits (队首的消息总是可以发送)
+        order = np.lexsort((self.queue['message_id'], self.queue['source']))
+        source_sorted, size_sorted = self.queue['source'][order], self.queue['size'][order]
+        group_start = np.ones(len(order), dtype=bool)
+        group_start[1:] = source_sorted[1:] != source_sorted[:-1]
+        cumulative_size = np.cumsum(size_sorted)
+        start_index = np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))
+        group_size = cumulative_size - (cumulative_size - size_sorted)[start_index] # 同一个节点内累计的大小
+        can_send = np.zeros(len(order), dtype=bool)
+        can_send[order] = group_start | (group_size <= self.tx_capacity_bits)
+        transmit = can_send & (source_row >= 0)
+        self.statistics['transmissions'] += int(transmit.sum())
+
+        # 3. unicast, 接收节点不在网络中时发送失败
+        unicast = np.flatnonzero(transmit & (self.queue['destination'] != BROADCAST))
+        unicast_receiver_row = slot_to_row[self.queue['destination'][unicast]]
+        unicast_probability = np.where(
+            unicast_receiver_row >= 0,
+            success_probability[source_row[unicast], np.maximum(unicast_receiver_row, 0)],
+            0.0
+        )
+        unicast_delivered = unicast[np.random.random(len(unicast)) < unicast_probability]
+
+        # 4. broadcast, 每个接收节点独立抽样
+        broadcast = np.flatnonzero(transmit & (self.queue['destination'] == BROADCAST))
+        num_nodes = len(node_slots)
+        pair_message = np.repeat(broadcast, num_nodes)
+        pair_receiver_row = np.tile(np.arange(num_nodes, dtype=np.int64), len(broadcast))
+        not_self = pair_receiver_row != source_row[pair_message]
+        pair_message, pair_receiver_row = pair_message[not_self], pair_receiver_row[not_self]
+        pair_probability = success_probability[source_row[pair_message], pair_receiver_row]
+        received = np.random.random(len(pair_message)) < pair_probability
+
+        delivered_message = np.concatenate([unicast_delivered, pair_message[received]])
+        delivered_receiver = np.concatenate([
+            self.queue['destination'][unicast_delivered], node_slots[pair_receiver_row[received]]
+        ])
+        delivered_source = self.queue['source'][delivered_message]
+        self._update_age_of_information(
+            delivered_receiver, delivered_source, self.queue['created_time'][delivered_message]
+        )
+        slot_to_node = np.asarray(self.slot_to_node, dtype=object)
+        delivered = {
+            'message_id': self.queue['message_id'][delivered_message],
+            'source': slot_to_node[delivered_source],
+            'receiver': slot_to_node[delivered_receiver],
+            'latency': now - self.queue['created_time'][delivered_message],
+            'expired_message_id': expired_message_id,
+        }
+        self.statistics['delivered_packets'] += len(delivered_message)
+        if len(delivered_message):
+            self.statistics['latency_sum'] += float(delivered['latency'].sum())
+            self.statistics['latency_max'] = max(self.statistics['latency_max'], float(delivered['latency'].max()))
+
+        # 5. 删除送达的 unicast 与已经发送的 broadcast, 其余的消息留在队列中
+        done = np.zeros(len(self), dtype=bool)
+        done[unicast_delivered] = True
+        done[broadcast] = True
+        self._keep_messages(~done)
+        logger.debug(f'SIM: V2X step {now}, {len(delivered_message)} packets delivered, {len(self)} messages in queue.')
+        return delivered
+
+    def _update_age_of_information(self, receiver:np.ndarray, source:np.ndarray, created_time:np.ndarray) -> None:
+        """记录每个 (receiver, source) 收到的最新消息的生成时间
+        """
+        if len(receiver) == 0:
+            return
+        keys = np.concatenate([self.aoi_keys, (receiver << 32) | source])
+        values = np.concatenate([self.aoi_created_time, created_time])
+        order = np.lexsort((values, keys))
+        keys, values = keys[order], values[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1] # 每个 key 只保留最大的生成时间
+        self.aoi_keys, self.aoi_created_time = keys[last], values[last]
+
+    def get_age_of_information(self, now:float, receiver_ids:Sequence[str], source_ids:Sequence[str]) -> np.ndarray:
+        """(R, S) 的 age of information, 即当前时间减去 receiver 从 source 收到的最新消息的生成时间, 没有收到过为 inf
+        """
+        receiver = np.array([self.node_to_slot.get(_id, -1) for _id in receiver_ids], dtype=np.int64)
+        source = np.array([self.node_to_slot.get(_id, -1) for _id in source_ids], dtype=np.int64)
+        age = np.full((len(receiver), len(source)), np.inf)
+        if len(self.aoi_keys) == 0:
+            return age
+        keys = (receiver[:, None] << 32) | source[None, :]
+        position = np.minimum(np.searchsorted(self.aoi_keys, keys), len(self.aoi_keys) - 1)
+        found = (self.aoi_keys[position] == keys) & (receiver[:, None] >= 0) & (source[None, :] >= 0)
+        age[found] = now - self.aoi_created_time[position[found]]
+        return age
+
+    def remove_nodes(self, node_ids:Sequence[str]) -> None:
+        """节点离开网络, 删除其发送和接收的 (unicast) 消息以及相关的 age of information, 并释放节点的编号
+        """
+        slots = np.unique(np.array([self.node_to_slot[_id] for _id in node_ids if _id in self.node_to_slot], dtype=np.int64))
+        if len(slots) == 0:
+            return
+        # 编号会被新的节点使用, 发给这些节点的 unicast 消息也需要删除, 否则会发给新的节点
+        self._keep_messages(~(np.isin(self.queue['source'], slots) | np.isin(self.queue['destination'], slots)))
+        keep = ~(np.isin(self.aoi_keys >> 32, slots) | np.isin(self.aoi_keys & 0xFFFFFFFF, slots))
+        self.aoi_keys, self.aoi_created_time = self.aoi_keys[keep], self.aoi_created_time[keep]
+        for _slot in slots.tolist():
+            del self.node_to_slot[self.slot_to_node[_slot]]
+            self.slot_to_node[_slot] = None
+            self.free_slots.append(_slot)
+
+    def get_statistics(self) -> Dict[str, float]:
+        """累计的统计信息, 包括平均的 latency
+        """
+        statistics = dict(self.statistics)
+        statistics['queued_messages'] = len(self)
+        statistics['latency_mean'] = (
+            statistics['latency_sum'] / statistics['delivered_packets']
+            if statistics['delivered_packets'] else float('nan')
+        )
+        return statistics
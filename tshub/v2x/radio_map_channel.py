@@ -0,0 +1,177 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 21:40:26
+@Description: 使用 radio map (GridInfo) 的 V2I Channel Model
++ 每一个 radio map 对应一个基站, 接收端位置的 SNIR (或 path loss) 直接从 radio map 中批量插值得到
++ 超出 radio map 范围的位置使用 V2IChannel 的公式计算
++ 给出节点 id 时, 缓存每个节点使用的格点和权重, 位置不变的节点 (例如停止的车辆) 不需要重新计算
+@LastEditTime: 2026-10-19 21:40:26
+'''
+import numpy as np
+from typing import Dict, List, Sequence, Tuple, Union
+
+from ..map.grid import GridInfo
+from .v2i_channel import V2IChannel
+from .v2x_utils.snr_to_packetloss import calculate_outage_probability
+
+
+class RadioMapChannel(V2IChannel):
+    """radio map 中的值为 SNIR [dB] (value_type='snr') 或 path loss [dB] (value_type='path_loss')
+
+    Args:
+        grids (Union[Dict[str, GridInfo], List[GridInfo]]): M 个 radio map, 例如 map_infos['grid']
+        BS_positions (List[Tuple[float, float]]): 每个 radio map 对应的基站的位置, 用于超出范围时的公式计算
+        value_type (str, optional): radio map 中保存的值, snr 或 path_loss. Defaults to 'snr'.
+        interpolate (bool, optional): 是否使用双线性插值. Defaults to True.
+    """
+    def __init__(self,
+                 grids:Union[Dict[str, GridInfo], List[GridInfo]],
+                 BS_positions:List[Tuple[float, float]],
+                 value_type:str='snr', interpolate:bool=True,
+                 **kwargs
+        ) -> None:
+        assert value_type in ('snr', 'path_loss'), f'value_type can only be snr or path_loss, now is {value_type}.'
+        self.grids = list(grids.values()) if isinstance(grids, dict) else list(grids)
+        self.BS_positions = np.asarray(BS_positions, dtype=np.float64).reshape(-1, 2)
+        assert len(self.grids) == len(self.BS_positions), 'Each radio map needs one BS position.'
+        super().__init__(BS_position=tuple(self.BS_positions[0]), **kwargs)
+        self.value_type = value_type
+        self.interpolate = interpolate
+
+        # 节点的缓存: id -> 行号, 以及每一行的位置, 格点 index 和权重 (每个 grid 一份)
+        self.cache_rows: Dict[str, int] = dict()
+        self.free_rows: List[int] = []
+        self.cache_position = np.full((0, 2), np.nan)
+        self.cache_index = np.zeros((len(self.grids), 0, 4), dtype=np.int64)
+        self.cache_weights = np.zeros((len(self.grids), 0, 4), dtype=np.float64)
+        self.cache_inside = np.zeros((len(self.grids), 0), dtype=bool)
+
+    def _get_cache_rows(self, node_ids:Sequence[str]) -> np.ndarray:
+        """每个节点在缓存中的行号, 新的节点分配新的行 (位置为 nan, 因此一定会重新计算)
+        """
+        rows = np.empty(len(node_ids), dtype=np.int64)
+        for _index, _id in enumerate(node_ids):
+            _row = self.cache_rows.get(_id)
+            if _row is None:
+                _row = self.free_rows.pop() if self.free_rows else len(self.cache_rows)
+                self.cache_rows[_id] = _row
+            rows[_index] = _row
+
+        capacity = len(self.cache_position)
+        if len(self.cache_rows) > capacity:
+            extra = max(len(self.cache_rows), 2*capacity) - capacity
+            self.cache_position = np.vstack([self.cache_position, np.full((extra, 2), np.nan)])
+            self.cache_index = np.concatenate(
+                [self.cache_index, np.zeros((len(self.grids), extra, 4), dtype=np.int64)], axis=1
+            )
+            self.cache_weights = np.concatenate(
+                [self.cache_weights, np.zeros((len(self.grids), extra, 4))], axis=1
+            )
+            self.cache_inside = np.concatenate(
+                [self.cache_inside, np.zeros((len(self.grids), extra), dtype=bool)], axis=1
+            )
+        return rows
+
+    def get_map_values(self, positions:np.ndarray, node_ids:Sequence[str]=None) -> np.ndarray:
+        """批量查询 N 个位置在 M 个 radio map 中的值
+
+        Args:
+            positions (np.ndarray): (N, 2) 接收端的位置
+            node_ids (Sequence[str], optional): 每个位置对应的节点 id, 给出时缓存格点与权重. Defaults to None.
+
+        Returns:
+            np.ndarray: (N, M) radio map 中的值, 超出范围为 nan
+        """
+        positions = self.as_positions(positions)
+        values = np.full((len(positions), len(self.grids)), np.nan)
+        if node_ids is None:
+            for grid_index, grid in enumerate(self.grids):
+                values[:, grid_index] = grid.get_values_at_coordinates(positions, self.interpolate)
+            return values
+
+        rows = self._get_cache_rows(node_ids)
+        moved = np.any(self.cache_position[rows] != positions, axis=1) # nan 的位置总是不相等
+        moved_rows = rows[moved]
+        self.cache_position[moved_rows] = positions[moved]
+        for grid_index, grid in enumerate(self.grids):
+            if len(moved_rows):
+                (
+                    self.cache_index[grid_index, moved_rows],
+                    self.cache_weights[grid_index, moved_rows],
+                    self.cache_inside[grid_index, moved_rows],
+                ) = grid.get_interpolation_weights(positions[moved], self.interpolate)
+            values[:, grid_index] = grid.get_values_from_weights(
+                self.cache_index[grid_index, rows],
+                self.cache_weights[grid_index, rows],
+                self.cache_inside[grid_index, rows],
+            )
+        return values
+
+    def remove_nodes(self, node_ids:Sequence[str]) -> None:
+        """删除离开路网的节点的缓存
+        """
+        for _id in node_ids:
+            _row = self.cache_rows.pop(_id, None)
+            if _row is not None:
+                self.cache_position[_row] = np.nan
+                self.free_rows.append(_row)
+
+    def get_link_matrices(
+            self,
+            previous_positions:np.ndarray, current_positions:np.ndarray,
+            node_ids:Sequence[str]=None,
+            is_ms_transmit:bool = True,
+            is_ms_received:bool = True,
+            bandwidth_hz:float = 30e3, target_rate_bps:float = 20e3,
+            shadowing:np.ndarray = None,
+        ) -> Dict[str, np.ndarray]:
+        """批量计算 N 个车辆与 M 个基站 (radio map) 之间的链路
+
+        先使用 V2IChannel 的公式计算所有的链路, 再使用 radio map 中的值替换范围内的链路:
+        value_type='snr' 时替换 snr; value_type='path_loss' 时替换 path loss, 并重新计算 received power 和 snr.
+        其余参数与 V2IChannel.get_link_matrices 相同.
+
+        Args:
+            previous_positions (np.ndarray): (N, 2) 车辆上一个时刻的位置
+            current_positions (np.ndarray): (N, 2) 车辆当前的位置
+            node_ids (Sequence[str], optional): 车辆的 id, 用于缓存格点与权重. Defaults to None.
+
+        Returns:
+            Dict[str, np.ndarray]: 与 V2IChannel.get_link_matrices 相同, 另外 in_radio_map 表示链路是否使用了 radio map
+        """
+        link_matrices = super().get_link_matrices(
+            previous_positions, current_positions, self.BS_positions,
+            is_ms_transmit=is_ms_transmit, is_ms_received=is_ms_received,
+            bandwidth_hz=bandwidth_hz, target_rate_bps=target_rate_bps,
+            shadowing=shadowing,
+        )
+        map_values = self.get_map_values(current_positions, node_ids)
+        in_radio_map = ~np.isnan(map_values)
+
+        if self.value_type == 'snr':
+            link_matrices['snr'] = np.where(in_radio_map, map_values, link_matrices['snr'])
+        else:
+            delta_path_loss = np.where(in_radio_map, map_values - link_matrices['path_loss'], 0)
+            link_matrices['path_loss'] = np.where(in_radio_map, map_values, link_matrices['path_loss'])
+            link_matrices['channels_with_fastfading'] = link_matrices['channels_with_fastfading'] + delta_path_loss
+            link_matrices['received_power'] = link_matrices['received_power'] - delta_path_loss
+            link_matrices['snr'] = self._get_snr_from_received_power(link_matrices['received_power'], is_ms_transmit)
+        link_matrices['outage_probability'] = calculate_outage_probability(
+            link_matrices['snr'], bandwidth_hz, target_rate_bps
+        )
+        link_matrices['in_radio_map'] = in_radio_map
+        return link_matrices
+
+    def get_snr_matrix(
+            self,
+            previous_positions:np.ndarray, current_positions:np.ndarray,
+            node_ids:Sequence[str]=None,
+            is_ms_transmit:bool = True,
+            is_ms_received:bool = True,
+        ) -> np.ndarray:
+        """批量计算 (N, M) 的 SNR, 参数与 get_link_matrices 相同
+        """
+        return self.get_link_matrices(
+            previous_positions, current_positions, node_ids,
+            is_ms_transmit=is_ms_transmit, is_ms_received=is_ms_received
+        )['snr']
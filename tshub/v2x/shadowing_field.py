@@ -0,0 +1,174 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 20:02:37
+@Description: 每条链路的 shadowing 状态, 随着节点的移动按照 Gudmundson 的自相关模型更新
++ 节点 (车辆, 基站) 的 id 对应数组中的 slot, 链路的状态保存在 (slot_A, slot_B) 的二维数组中
++ 每个节点记录累计的移动距离, 链路两端移动的距离之和 Δx 决定相关系数 ρ = exp(-Δx / d_corr)
++ S_t = ρ * S_{t-1} + sqrt(1 - ρ^2) * σ * Z, 新的链路 S_0 = σ * Z
+@LastEditTime: 2026-10-19 20:02:37
+'''
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+
+class _NodeSlots:
+    """节点 id 与数组 slot 的对应关系, 节点删除之后 slot 会被重复使用
+    """
+    def __init__(self, capacity:int) -> None:
+        self.capacity = capacity
+        self.id_to_slot: Dict[str, int] = {}
+        self.free_slots: List[int] = []
+        self.position = np.zeros((capacity, 2), dtype=np.float64) # 上一次的位置
+        self.odometer = np.zeros(capacity, dtype=np.float64) # 累计移动的距离
+
+    def _grow(self, capacity:int) -> None:
+        self.position = np.vstack([self.position, np.zeros((capacity - self.capacity, 2))])
+        self.odometer = np.concatenate([self.odometer, np.zeros(capacity - self.capacity)])
+        self.capacity = capacity
+
+    def get_slots(self, ids:Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """返回每个 id 的 slot, 以及是否是新的节点
+        """
+        slots = np.empty(len(ids), dtype=np.int64)
+        is_new = np.zeros(len(ids), dtype=bool)
+        for _index, _id in enumerate(ids):
+            _slot = self.id_to_slot.get(_id)
+            if _slot is None:
+                if self.free_slots:
+                    _slot = self.free_slots.pop()
+                else:
+                    _slot = len(self.id_to_slot)
+                    if _slot >= self.capacity:
+                        self._grow(2*self.capacity)
+                self.id_to_slot[_id] = _slot
+                is_new[_index] = True
+            slots[_index] = _slot
+        return slots, is_new
+
+    def move(self, slots:np.ndarray, is_new:np.ndarray, positions:np.ndarray) -> None:
+        """更新节点的位置与累计移动距离 (同一个节点出现多次时只更新一次)
+        """
+        slots, first = np.unique(slots, return_index=True)
+        positions, is_new = positions[first], is_new[first]
+        moved = np.hypot(*(positions - self.position[slots]).T)
+        self.odometer[slots] += np.where(is_new, 0.0, moved)
+        self.position[slots] = positions
+
+    def remove(self, ids:Sequence[str]) -> np.ndarray:
+        slots = [self.id_to_slot.pop(_id) for _id in ids if _id in self.id_to_slot]
+        self.free_slots.extend(slots)
+        slots = np.asarray(slots, dtype=np.int64)
+        self.odometer[slots] = 0
+        return slots
+
+
+class ShadowingField:
+    """保存所有链路的 shadowing 状态, 一次更新 N×M 条链路
+
+    Args:
+        shadow_std (float, optional): shadowing 的标准差 [dB]. Defaults to 8.
+        decorrelation_distance (float, optional): 相关距离 [m]. Defaults to 50.
+        symmetric (bool, optional): A 和 B 是否是同一类节点 (V2V), 此时 (i, j) 与 (j, i) 共享同一个状态. Defaults to False.
+        initial_capacity (int, optional): 初始的节点数量, 不足时自动扩展. Defaults to 64.
+    """
+    def __init__(self,
+                 shadow_std:float=8, decorrelation_distance:float=50,
+                 symmetric:bool=False, initial_capacity:int=64
+        ) -> None:
+        self.shadow_std = shadow_std
+        self.decorrelation_distance = decorrelation_distance
+        self.symmetric = symmetric
+
+        self.nodes_A = _NodeSlots(initial_capacity)
+        self.nodes_B = self.nodes_A if symmetric else _NodeSlots(initial_capacity)
+        self.shadowing = np.zeros((initial_capacity, initial_capacity), dtype=np.float64) # 链路的 shadowing
+        self.link_odometer = np.zeros((initial_capacity, initial_capacity), dtype=np.float64) # 上次更新时两端的累计距离
+        self.initialized = np.zeros((initial_capacity, initial_capacity), dtype=bool) # 链路是否已经有状态
+
+    @classmethod
+    def from_channel(cls, channel, symmetric:bool=False, **kwargs) -> 'ShadowingField':
+        """使用 V2XChannel 的 shadow_std 和 decorrelation_distance
+        """
+        return cls(
+            shadow_std=channel.shadow_std,
+            decorrelation_distance=channel.decorrelation_distance,
+            symmetric=symmetric, **kwargs
+        )
+
+    def _resize(self) -> None:
+        """节点的数量超过数组的大小时, 扩展链路的数组
+        """
+        rows, cols = self.nodes_A.capacity, self.nodes_B.capacity
+        old_rows, old_cols = self.shadowing.shape
+        if (rows, cols) == (old_rows, old_cols):
+            return
+        for _name in ('shadowing', 'link_odometer', 'initialized'):
+            _old = getattr(self, _name)
+            _new = np.zeros((rows, cols), dtype=_old.dtype)
+            _new[:old_rows, :old_cols] = _old
+            setattr(self, _name, _new)
+
+    def update(
+            self,
+            ids_A:Sequence[str], positions_A:np.ndarray,
+            ids_B:Sequence[str]=None, positions_B:np.ndarray=None,
+        ) -> np.ndarray:
+        """更新节点的位置, 并返回 (N, M) 链路当前的 shadowing
+
+        Args:
+            ids_A (Sequence[str]): N 个节点 A 的 id
+            positions_A (np.ndarray): (N, 2) 节点 A 的位置
+            ids_B (Sequence[str], optional): M 个节点 B 的 id, None 时与 A 相同. Defaults to None.
+            positions_B (np.ndarray, optional): (M, 2) 节点 B 的位置. Defaults to None.
+
+        Returns:
+            np.ndarray: (N, M) 的 shadowing [dB]
+        """
+        positions_A = np.asarray(positions_A, dtype=np.float64).reshape(-1, 2)
+        if ids_B is None:
+            ids_B, positions_B = ids_A, positions_A
+        positions_B = np.asarray(positions_B, dtype=np.float64).reshape(-1, 2)
+
+        slots_A, is_new_A = self.nodes_A.get_slots(ids_A)
+        slots_B, is_new_B = self.nodes_B.get_slots(ids_B)
+        self._resize()
+        self.nodes_A.move(slots_A, is_new_A, positions_A)
+        self.nodes_B.move(slots_B, is_new_B, positions_B)
+
+        rows = np.broadcast_to(slots_A[:, None], (len(slots_A), len(slots_B)))
+        cols = np.broadcast_to(slots_B[None, :], (len(slots_A), len(slots_B)))
+        if self.symmetric:
+            rows, cols = np.minimum(rows, cols), np.maximum(rows, cols)
+
+        # 每条链路只更新一次 (symmetric 时 (i, j) 和 (j, i) 为同一条链路)
+        link_keys, inverse = np.unique(
+            (rows*self.shadowing.shape[1] + cols).ravel(), return_inverse=True
+        )
+        link_rows, link_cols = np.divmod(link_keys, self.shadowing.shape[1])
+
+        odometer = self.nodes_A.odometer[link_rows] + self.nodes_B.odometer[link_cols]
+        delta_distance = np.maximum(odometer - self.link_odometer[link_rows, link_cols], 0) # 新的链路没有上一次的记录
+        shadowing_rho = np.exp(-1*(delta_distance / self.decorrelation_distance))
+        innovation = np.random.normal(0, self.shadow_std, size=len(link_keys))
+        shadowing = np.where(
+            self.initialized[link_rows, link_cols],
+            shadowing_rho*self.shadowing[link_rows, link_cols] + np.sqrt(1 - shadowing_rho**2)*innovation,
+            innovation
+        )
+
+        self.shadowing[link_rows, link_cols] = shadowing
+        self.link_odometer[link_rows, link_cols] = odometer
+        self.initialized[link_rows, link_cols] = True
+        return shadowing[inverse].reshape(len(slots_A), len(slots_B))
+
+    def remove(self, ids_A:Sequence[str]=(), ids_B:Sequence[str]=()) -> None:
+        """删除离开路网的节点, 与之相关的链路状态会被清除
+        """
+        slots_A = self.nodes_A.remove(ids_A)
+        self.initialized[slots_A, :] = False
+        if self.symmetric:
+            self.initialized[:, slots_A] = False
+        slots_B = self.nodes_B.remove(ids_B)
+        self.initialized[:, slots_B] = False
+        if self.symmetric:
+            self.initialized[slots_B, :] = False
@@ -2,12 +2,12 @@
 @Author: WANG Maonan
 @Date: 2024-08-09 11:30:10
 @Description: V2I Channel Model
-@LastEditTime: 2024-08-09 23:02:30
+@LastEditTime: 2026-10-20 19:48:52
 '''
 import math
 import numpy as np
 from loguru import logger
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 from .v2x_channel import V2XChannel
 
 class V2IChannel(V2XChannel):
@@ -56,14 +56,8 @@ class V2IChannel(V2XChannel):
             is_ms_transmit:bool = True, # 是否是 ms 作为发送, V2X
             is_ms_received:bool = True # 是否是 ms 作为接收, X2V
         )->float:
-        if is_ms_transmit and is_ms_received:
-            logger.info('SIM: Calculate **V2V** SNR')
-        elif is_ms_transmit and not is_ms_received:
-            logger.info('SIM: Calculate **V2I** SNR')
-        elif not is_ms_transmit and is_ms_received:
-            logger.info('SIM: Calculate **I2V** SNR')
-        else:
-            raise ValueError("Invalid combination of transmission and reception for SNR calculation.")
+        link_direction = self.check_link_direction(is_ms_transmit, is_ms_received)
+        logger.debug(f'SIM: Calculate **{link_direction}** SNR')
 
         received_power = self.get_received_power(
             previous_position_obj, 
@@ -105,4 +99,82 @@ class V2IChannel(V2XChannel):
         shadowing = shadowing_rho*self.v2i_shadowing + \
             np.sqrt(1 - shadowing_rho**2)*np.random.normal(0, self.shadow_std)
         
-        return shadowing
\ No newline at end of file
+        return shadowing
+
+    def get_path_loss_matrix(self, current_positions:np.ndarray, BS_positions:np.ndarray=None) -> Tuple[np.ndarray, np.ndarray]:
+        """批量计算 N 个车辆到 M 个基站的自由空间路径损耗, 与 _get_path_loss 相同
+
+        Args:
+            current_positions (np.ndarray): (N, 2) 车辆的位置
+            BS_positions (np.ndarray, optional): (M, 2) 基站的位置, None 时使用 self.BS_position. Defaults to None.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (N, M) 的 path loss 和 (N, M) 的三维距离
+        """
+        current_positions = self.as_positions(current_positions)
+        BS_positions = self.as_positions(self.BS_position if BS_positions is None else BS_positions)
+        distance = self.elementwise(
+            math.hypot,
+            current_positions[:, None, 0] - BS_positions[None, :, 0],
+            current_positions[:, None, 1] - BS_positions[None, :, 1],
+            self.h_bs - self.h_ms # 基站高度 - 车辆高度
+        ) # 与 _get_path_loss 相同, 使用三个参数的 math.hypot
+        path_loss = 20*np.log10(distance) + 20*np.log10(self.fc*1e9) - 147.5582278139513 - self.antrenna_gain_bs - self.antrenna_gain_ms
+        return path_loss, distance
+
+    def get_link_matrices(
+            self,
+            previous_positions:np.ndarray, current_positions:np.ndarray,
+            BS_positions:np.ndarray=None,
+            is_ms_transmit:bool = True,
+            is_ms_received:bool = True,
+            bandwidth_hz:float = 30e3, target_rate_bps:float = 20e3,
+            shadowing:np.ndarray = None,
+        ) -> Dict[str, np.ndarray]:
+        """批量计算 N 个车辆与 M 个基站之间的链路, 所有链路共享 self.v2i_shadowing
+
+        Args:
+            previous_positions (np.ndarray): (N, 2) 车辆上一个时刻的位置
+            current_positions (np.ndarray): (N, 2) 车辆当前的位置
+            BS_positions (np.ndarray, optional): (M, 2) 基站的位置, None 时使用 self.BS_position. Defaults to None.
+            is_ms_transmit (bool, optional): 是否是 ms 作为发送. Defaults to True.
+            is_ms_received (bool, optional): 是否是 ms 作为接收. Defaults to True.
+            bandwidth_hz (float, optional): 计算 outage probability 的带宽. Defaults to 30e3.
+            target_rate_bps (float, optional): 计算 outage probability 的目标速率. Defaults to 20e3.
+            shadowing (np.ndarray, optional): (N, M) 每条链路的 shadowing, 例如 ShadowingField.update 的结果. None 时使用 self.v2i_shadowing 计算. Defaults to None.
+
+        Returns:
+            Dict[str, np.ndarray]: (N, M) 的 distance, path_loss, shadowing, channels_with_fastfading, received_power, snr 和 outage_probability
+        """
+        BS_positions = self.as_positions(self.BS_position if BS_positions is None else BS_positions)
+        path_loss, distance = self.get_path_loss_matrix(current_positions, BS_positions)
+
+        # delta_distance 是两个时刻之间的距离, \Delta d = | d(P_RSU, P_Veh) - d(P_RSU, P_P_Veh)|
+        delta_distance = np.abs(
+            self.calculate_distance_matrix(self.as_positions(previous_positions), BS_positions) - \
+            self.calculate_distance_matrix(self.as_positions(current_positions), BS_positions)
+        )
+        shadowing_rho = np.exp(-1*(delta_distance / self.decorrelation_distance))
+
+        link_matrices = self._get_link_matrices(
+            path_loss, shadowing_rho, self.v2i_shadowing,
+            is_ms_transmit, is_ms_received,
+            bandwidth_hz, target_rate_bps,
+            shadowing=shadowing
+        )
+        link_matrices['distance'] = distance
+        return link_matrices
+
+    def get_snr_matrix(
+            self,
+            previous_positions:np.ndarray, current_positions:np.ndarray,
+            BS_positions:np.ndarray=None,
+            is_ms_transmit:bool = True,
+            is_ms_received:bool = True,
+        ) -> np.ndarray:
+        """批量计算 (N, M) 的 SNR, 参数与 get_link_matrices 相同
+        """
+        return self.get_link_matrices(
+            previous_positions, current_positions, BS_positions,
+            is_ms_transmit=is_ms_transmit, is_ms_received=is_ms_received
+        )['snr']
@@ -2,12 +2,12 @@
 @Author: WANG Maonan
 @Date: 2024-08-09 11:40:50
 @Description: V2V Channel Model
-@LastEditTime: 2024-08-14 20:07:00
+@LastEditTime: 2026-10-20 19:48:52
 '''
 import math
 import numpy as np
 from loguru import logger
-from typing import List, Tuple
+from typing import List, Tuple, Dict
 
 from .v2x_channel import V2XChannel
 
@@ -78,14 +78,8 @@ class V2VChannel(V2XChannel):
             is_ms_transmit:bool = True, # 是否是 ms 作为发送, V2X
             is_ms_received:bool = True # 是否是 ms 作为接收, X2V
         )->float:
-        if is_ms_transmit and is_ms_received:
-            logger.info('SIM: Calculate **V2V** SNR')
-        elif is_ms_transmit and not is_ms_received:
-            logger.info('SIM: Calculate **V2I** SNR')
-        elif not is_ms_transmit and is_ms_received:
-            logger.info('SIM: Calculate **I2V** SNR')
-        else:
-            raise ValueError("Invalid combination of transmission and reception for SNR calculation.")
+        link_direction = self.check_link_direction(is_ms_transmit, is_ms_received)
+        logger.debug(f'SIM: Calculate **{link_direction}** SNR')
 
         received_power = self.get_received_power(
             previous_position_obj_A, current_position_obj_A,
@@ -161,4 +155,100 @@ class V2VChannel(V2XChannel):
         shadowing = shadowing_rho*self.v2v_shadowing + \
             np.sqrt(1 - shadowing_rho**2)*np.random.normal(0, self.shadow_std)
         
-        return shadowing
\ No newline at end of file
+        return shadowing
+
+    def get_path_loss_matrix(
+            self, positions_A:np.ndarray, positions_B:np.ndarray, los_mask:np.ndarray=None
+        ) -> Tuple[np.ndarray, np.ndarray]:
+        """批量计算 N 个车辆 A 和 M 个车辆 B 之间的路径损耗, 与 _get_path_loss 相同
+
+        Args:
+            positions_A (np.ndarray): (N, 2) 车辆 A 的位置
+            positions_B (np.ndarray): (M, 2) 车辆 B 的位置
+            los_mask (np.ndarray, optional): (N, M) bool, True 表示 LOS. None 时与 _get_path_loss 相同, 距离小于 100m 为 LOS. Defaults to None.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (N, M) 的 path loss 和 (N, M) 的距离
+        """
+        positions_A, positions_B = self.as_positions(positions_A), self.as_positions(positions_B)
+        distance = self.elementwise(
+            math.hypot,
+            positions_A[:, None, 0] - positions_B[None, :, 0],
+            positions_A[:, None, 1] - positions_B[None, :, 1]
+        ) + 0.001 # 计算两个点的距离, 与 _get_path_loss 相同使用 math.hypot
+
+        light_speed = 3e8  # Speed of light in vacuum (m/s)
+        n_los = 3.0  # Path loss exponent for NLOS
+        n_los_factor = 20  # Additional NLOS factor in dB
+
+        log_distance = self.elementwise(math.log10, distance)
+        pl_los = 20*log_distance + 20*math.log10(self.fc*1e9) + 20 * math.log10(4*math.pi/light_speed) - 2*self.antrenna_gain_bs
+        pl_nlos = pl_los + n_los_factor + 10*n_los*log_distance
+        if los_mask is None:
+            los_mask = distance < 100
+        return np.where(np.broadcast_to(los_mask, distance.shape), pl_los, pl_nlos), distance
+
+    def get_link_matrices(
+            self,
+            previous_positions_A:np.ndarray, current_positions_A:np.ndarray,
+            previous_positions_B:np.ndarray=None, current_positions_B:np.ndarray=None,
+            los_mask:np.ndarray=None,
+            is_ms_transmit:bool = True,
+            is_ms_received:bool = True,
+            bandwidth_hz:float = 30e3, target_rate_bps:float = 20e3,
+            shadowing:np.ndarray = None,
+        ) -> Dict[str, np.ndarray]:
+        """批量计算 N 个车辆 A 与 M 个车辆 B 之间的链路, 所有链路共享 self.v2v_shadowing
+
+        Args:
+            previous_positions_A (np.ndarray): (N, 2) 车辆 A 上一个时刻的位置
+            current_positions_A (np.ndarray): (N, 2) 车辆 A 当前的位置
+            previous_positions_B (np.ndarray, optional): (M, 2) 车辆 B 上一个时刻的位置, None 时与 A 相同 (N×N). Defaults to None.
+            current_positions_B (np.ndarray, optional): (M, 2) 车辆 B 当前的位置, None 时与 A 相同. Defaults to None.
+            los_mask (np.ndarray, optional): (N, M) bool, True 表示 LOS, None 时根据距离判断. Defaults to None.
+            is_ms_transmit (bool, optional): 是否是 ms 作为发送. Defaults to True.
+            is_ms_received (bool, optional): 是否是 ms 作为接收. Defaults to True.
+            bandwidth_hz (float, optional): 计算 outage probability 的带宽. Defaults to 30e3.
+            target_rate_bps (float, optional): 计算 outage probability 的目标速率. Defaults to 20e3.
+            shadowing (np.ndarray, optional): (N, M) 每条链路的 shadowing, 例如 ShadowingField.update 的结果. None 时使用 self.v2v_shadowing 计算. Defaults to None.
+
+        Returns:
+            Dict[str, np.ndarray]: (N, M) 的 distance, path_loss, shadowing, channels_with_fastfading, received_power, snr 和 outage_probability
+        """
+        previous_positions_A = self.as_positions(previous_positions_A)
+        current_positions_A = self.as_positions(current_positions_A)
+        previous_positions_B = previous_positions_A if previous_positions_B is None else self.as_positions(previous_positions_B)
+        current_positions_B = current_positions_A if current_positions_B is None else self.as_positions(current_positions_B)
+        path_loss, distance = self.get_path_loss_matrix(current_positions_A, current_positions_B, los_mask)
+
+        # delta_distance 是两个时刻之间的距离, \Delta d = | d(P_VehA, P_VehB) - d(P_VehA, P_P_VehB)|
+        delta_distance = np.abs(
+            self.calculate_distance_matrix(previous_positions_A, previous_positions_B) - \
+            self.calculate_distance_matrix(current_positions_A, current_positions_B)
+        )
+        shadowing_rho = np.exp(-1*(delta_distance / self.decorrelation_distance))
+
+        link_matrices = self._get_link_matrices(
+            path_loss, shadowing_rho, self.v2v_shadowing,
+            is_ms_transmit, is_ms_received,
+            bandwidth_hz, target_rate_bps,
+            shadowing=shadowing
+        )
+        link_matrices['distance'] = distance
+        return link_matrices
+
+    def get_snr_matrix(
+            self,
+            previous_positions_A:np.ndarray, current_positions_A:np.ndarray,
+            previous_positions_B:np.ndarray=None, current_positions_B:np.ndarray=None,
+            los_mask:np.ndarray=None,
+            is_ms_transmit:bool = True,
+            is_ms_received:bool = True,
+        ) -> np.ndarray:
+        """批量计算 (N, M) 的 SNR, 参数与 get_link_matrices 相同
+        """
+        return self.get_link_matrices(
+            previous_positions_A, current_positions_A,
+            previous_positions_B, current_positions_B, los_mask,
+            is_ms_transmit=is_ms_transmit, is_ms_received=is_ms_received
+        )['snr']
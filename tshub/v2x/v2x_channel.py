@@ -2,11 +2,18 @@
 @Author: WANG Maonan
 @Date: 2024-08-09 11:26:39
 @Description: V2X Channel Model (默认有 V2I 和 V2V, 支持自定义模型)
-@LastEditTime: 2024-08-09 21:55:43
++ 子类的 *_matrix 方法使用 numpy 广播一次计算 N×M 条链路, 公式和随机数的顺序与单条链路的计算相同
++ hypot, log10 和 pow 与单条链路使用相同的函数 (见 elementwise), 结果与逐条调用 get_snr 完全相同
+@LastEditTime: 2026-10-20 19:48:52
 '''
+import math
 import numpy as np
+from loguru import logger
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+from typing import Dict
+
+from .v2x_utils.snr_to_packetloss import calculate_outage_probability
 
 @dataclass
 class V2XChannel(ABC):
@@ -56,4 +63,86 @@ class V2XChannel(ABC):
         Returns:
         float: The Euclidean distance between the two points.
         """
-        return np.linalg.norm(np.array(coord1) - np.array(coord2))
\ No newline at end of file
+        return np.linalg.norm(np.array(coord1) - np.array(coord2))
+
+    @staticmethod
+    def check_link_direction(is_ms_transmit:bool, is_ms_received:bool) -> str:
+        """根据发送端和接收端判断链路的类型 (V2V, V2I 或 I2V)
+        """
+        if is_ms_transmit and is_ms_received:
+            return 'V2V'
+        elif is_ms_transmit and not is_ms_received:
+            return 'V2I'
+        elif not is_ms_transmit and is_ms_received:
+            return 'I2V'
+        raise ValueError("Invalid combination of transmission and reception for SNR calculation.")
+
+    @staticmethod
+    def as_positions(positions) -> np.ndarray:
+        """将坐标转换为 (N, D) 的数组
+        """
+        positions = np.asarray(positions, dtype=np.float64)
+        return positions.reshape(1, -1) if positions.ndim == 1 else positions
+
+    @staticmethod
+    def elementwise(func, *arrays) -> np.ndarray:
+        """逐元素调用 math 中的函数 (支持广播), 返回 float64 的数组.
+
+        np.hypot, np.log10 和 np.power 的 (SIMD) 实现与 math 的结果在最后一位上可能不同, 
+        批量计算中这几个函数通过这里调用, 使得结果与单条链路的计算完全相同.
+        """
+        return np.asarray(np.frompyfunc(func, len(arrays), 1)(*arrays), dtype=np.float64)
+
+    @staticmethod
+    def calculate_distance_matrix(positions_A:np.ndarray, positions_B:np.ndarray) -> np.ndarray:
+        """(N, D) 和 (M, D) 的坐标之间的欧式距离, 返回 (N, M), 与 calculate_distance 相同
+        """
+        delta = positions_A[:, None, :] - positions_B[None, :, :]
+        # 与 np.linalg.norm 一样使用 dot 计算平方和, 而不是 np.sum(delta*delta)
+        return np.sqrt((delta[..., None, :] @ delta[..., :, None])[..., 0, 0])
+
+    def _get_snr_from_received_power(self, received_power:np.ndarray, is_ms_transmit:bool) -> np.ndarray:
+        noise_power_dbm = self.sig2_dB_ms if is_ms_transmit else self.sig2_dB_bs
+        received_power_w = self.elementwise(math.pow, 10.0, np.asarray(received_power)/10)/1000 # 与 dbm2w 相同
+        return 10*np.log10(received_power_w/V2XChannel.dbm2w(noise_power_dbm))
+
+    def _get_link_matrices(
+            self,
+            path_loss:np.ndarray, shadowing_rho:np.ndarray, previous_shadowing:float,
+            is_ms_transmit:bool, is_ms_received:bool,
+            bandwidth_hz:float, target_rate_bps:float,
+            shadowing:np.ndarray=None,
+        ) -> Dict[str, np.ndarray]:
+        """由 path loss 和 shadowing 的相关系数计算每条链路的 shadowing, received power, snr 和 outage probability
+
+        随机数按照链路的顺序 (行优先) 生成, 每条链路先生成 shadowing 再生成 noise, 与逐条调用 get_snr 的顺序相同.
+        如果给定 shadowing (例如 ShadowingField 的结果), 则只生成 noise.
+        """
+        link_direction = self.check_link_direction(is_ms_transmit, is_ms_received)
+        logger.debug(f'SIM: Calculate **{link_direction}** SNR for {path_loss.size} links')
+
+        if shadowing is None:
+            random_normal = np.random.normal(0, 1, size=(*path_loss.shape, 2))
+            shadowing = shadowing_rho*previous_shadowing + \
+                np.sqrt(1 - shadowing_rho**2)*(self.shadow_std*random_normal[..., 0])
+            noise = random_normal[..., 1]
+        else:
+            shadowing = np.broadcast_to(shadowing, path_loss.shape)
+            noise = np.random.normal(0, 1, size=path_loss.shape)
+        channels_with_fastfading = (path_loss + shadowing + noise)
+
+        noise_figure = self.noise_figure_ms if is_ms_received else self.noise_figure_bs
+        if is_ms_transmit: # ms->bs/ms, 所以使用 power_ms
+            received_power = self.power_ms - channels_with_fastfading - noise_figure
+        else: # bs -> ms
+            received_power = self.power_bs - channels_with_fastfading - noise_figure
+
+        snr = self._get_snr_from_received_power(received_power, is_ms_transmit)
+        return {
+            'path_loss': path_loss,
+            'shadowing': shadowing,
+            'channels_with_fastfading': channels_with_fastfading,
+            'received_power': received_power,
+            'snr': snr,
+            'outage_probability': calculate_outage_probability(snr, bandwidth_hz, target_rate_bps),
+        }
@@ -0,0 +1,167 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 23:05:48
+@Description: 以 ego 车辆为中心的 BEV (bird's-eye view) 栅格 observation
++ 地图的可行驶区域 (lane + node) 和车道线只栅格化一次, 每个 step 通过坐标变换批量采样得到每辆 ego 的地图通道
++ 周围车辆的矩形轮廓变换到每辆 ego 的坐标系中, 所有 (ego, vehicle) 对一次扫描线填充
++ ego 的车头朝向图像的上方, ego 的中心 (不是车头) 位于图像的中心
+@LastEditTime: 2026-10-20 18:01:07
+'''
+import numpy as np
+from loguru import logger
+from typing import Dict, Any, List, Tuple
+
+from ..visualization.rasterize import world_to_pixel, rectangle_polygons, polygon_pixels, polyline_pixels
+from ..visualization.raster_renderer import get_layer_shapes
+
+BEV_CHANNELS = ('drivable', 'lane_marking', 'occupancy', 'speed', 'ego') # 输出数组第二维的顺序
+
+
+class VehicleBEV:
+    """计算所有 ego 车辆的 BEV observation, 输出 (E, C, H, W) 的数组
+
+    Args:
+        map_infos (Dict[str, Any]): MapBuilder.get_objects_infos() 的结果, 使用其中的 lane 和 node
+        grid_size (Tuple[int, int], optional): 每辆 ego 的栅格大小 (H, W). Defaults to (64, 64).
+        resolution (float, optional): 每个栅格对应的距离 [m]. Defaults to 0.5.
+        map_resolution (float, optional): 地图栅格的精度 [m], None 时与 resolution 相同. Defaults to None.
+        max_map_pixels (int, optional): 地图栅格每个通道最多的像素数, 超过时增大 map_resolution, 限制大地图的内存. Defaults to 1e8.
+        max_speed (float, optional): speed 通道的归一化速度 [m/s]. Defaults to 15.
+        dtype (str, optional): 输出的类型, float16 (取值 0~1) 或 uint8 (取值 0~255). Defaults to 'float16'.
+    """
+    def __init__(self,
+                 map_infos:Dict[str, Any],
+                 grid_size:Tuple[int, int]=(64, 64),
+                 resolution:float=0.5,
+                 map_resolution:float=None,
+                 max_map_pixels:int=int(1e8),
+                 max_speed:float=15,
+                 dtype:str='float16'
+        ) -> None:
+        assert dtype in ('float16', 'uint8'), f'dtype can only be float16 or uint8, now is {dtype}.'
+        self.grid_size = tuple(grid_size)
+        self.resolution = resolution
+        self.map_resolution = map_resolution or resolution
+        self.max_speed = max_speed
+        self.dtype = np.dtype(dtype)
+        self.scale = 1.0 if dtype == 'float16' else 255.0
+
+        # 地图的栅格: drivable (lane 与 node 的区域) 和 lane_marking (lane 的边界), 只计算一次
+        layers = {
+            _object_type: get_layer_shapes(map_infos[_object_type])
+            for _object_type in ['lane', 'node']
+            if _object_type in map_infos
+        }
+        all_coords = np.concatenate([_coords for _coords, _ in layers.values()] + [np.zeros((0, 2))], axis=0)
+        if len(all_coords) == 0: # 没有 lane 和 node, 地图通道全部为 0
+            all_coords = np.zeros((1, 2))
+        x_min, y_min = all_coords.min(axis=0)
+        x_max, y_max = all_coords.max(axis=0)
+        num_pixels = ((x_max - x_min) / self.map_resolution + 1) * ((y_max - y_min) / self.map_resolution + 1)
+        if num_pixels > max_map_pixels: # 地图太大, 降低地图栅格的精度
+            map_resolution = self.map_resolution * np.sqrt(num_pixels / max_map_pixels)
+            logger.warning(
+                f'SIM: The BEV map raster needs {num_pixels:.0f} pixels at {self.map_resolution} m, '
+                f'use map_resolution={map_resolution:.3f} m instead.'
+            )
+            self.map_resolution = float(map_resolution)
+        self.map_origin = (float(x_min), float(y_max))
+        self.map_width = int(np.ceil((x_max - x_min) / self.map_resolution)) + 1
+        self.map_height = int(np.ceil((y_max - y_min) / self.map_resolution)) + 1
+
+        self.map_layers = np.zeros((2, self.map_height * self.map_width), dtype=bool)
+        for coords, offsets in layers.values():
+            pixel_coords = world_to_pixel(coords, self.map_origin, self.map_resolution)
+            _, pixels = polygon_pixels(pixel_coords, offsets, self.map_height, self.map_width)
+            self.map_layers[0, pixels] = True
+        if 'lane' in layers:
+            coords, offsets = layers['lane']
+            pixel_coords = world_to_pixel(coords, self.map_origin, self.map_resolution)
+            _, pixels = polyline_pixels(pixel_coords, offsets, self.map_height, self.map_width, closed=True)
+            self.map_layers[1, pixels] = True
+
+        # 栅格中心在 ego 坐标系中的位置, (u 向右, v 向前)
+        height, width = self.grid_size
+        rows, cols = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+        self.cell_u = ((cols + 0.5 - width / 2) * resolution).ravel()
+        self.cell_v = ((height / 2 - rows - 0.5) * resolution).ravel()
+        self.radius = np.hypot(height, width) * resolution / 2 # 栅格覆盖的半径
+
+    @staticmethod
+    def get_vehicle_arrays(vehicles:Dict[str, Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """将车辆的 dict 转换为数组, 位置转换为车辆的中心
+        """
+        vehicle_infos = list(vehicles.values())
+        heading = np.radians(np.asarray([_info['heading'] for _info in vehicle_infos], dtype=np.float64))
+        length = np.asarray([_info['length'] for _info in vehicle_infos], dtype=np.float64)
+        front = np.asarray([_info['position'][:2] for _info in vehicle_infos], dtype=np.float64).reshape(-1, 2)
+        forward = np.stack([np.sin(heading), np.cos(heading)], axis=1)
+        return {
+            'front': front,
+            'center': front - forward * length[:, None] / 2,
+            'heading': np.degrees(heading),
+            'forward': forward,
+            'length': length,
+            'width': np.asarray([_info['width'] for _info in vehicle_infos], dtype=np.float64),
+            'speed': np.asarray([_info['speed'] for _info in vehicle_infos], dtype=np.float64),
+        }
+
+    def get_observation(self, vehicles:Dict[str, Dict[str, Any]], ego_ids:List[str]=None) -> Tuple[List[str], np.ndarray]:
+        """计算 ego 车辆的 BEV observation
+
+        Args:
+            vehicles (Dict[str, Dict[str, Any]]): VehicleBuilder.get_objects_infos() 的结果
+            ego_ids (List[str], optional): 需要计算的 ego 车辆, None 时为所有 vehicle_type 中包含 ego 的车辆. Defaults to None.
+
+        Returns:
+            Tuple[List[str], np.ndarray]: ego 的 id, 以及 (E, C, H, W) 的 observation, 通道的顺序见 BEV_CHANNELS
+        """
+        if ego_ids is None:
+            ego_ids = [_id for _id, _info in vehicles.items() if 'ego' in _info.get('vehicle_type', '')]
+        height, width = self.grid_size
+        num_cells = height * width
+        observation = np.zeros((len(ego_ids), len(BEV_CHANNELS), num_cells), dtype=self.dtype)
+        if len(ego_ids) == 0:
+            return ego_ids, observation.reshape(0, len(BEV_CHANNELS), height, width)
+
+        vehicle_ids = list(vehicles.keys())
+        arrays = self.get_vehicle_arrays(vehicles)
+        id_to_index = {_id:_index for _index, _id in enumerate(vehicle_ids)}
+        ego_index = np.asarray([id_to_index[_id] for _id in ego_ids], dtype=np.int64)
+        ego_center = arrays['center'][ego_index]
+        ego_forward = arrays['forward'][ego_index]
+        ego_right = np.stack([ego_forward[:, 1], -ego_forward[:, 0]], axis=1)
+
+        # 地图通道: 每个栅格中心的世界坐标, 最近邻采样地图的栅格
+        world_x = ego_center[:, 0:1] + self.cell_u * ego_right[:, 0:1] + self.cell_v * ego_forward[:, 0:1]
+        world_y = ego_center[:, 1:2] + self.cell_u * ego_right[:, 1:2] + self.cell_v * ego_forward[:, 1:2]
+        map_col = np.floor((world_x - self.map_origin[0]) / self.map_resolution).astype(np.int64)
+        map_row = np.floor((self.map_origin[1] - world_y) / self.map_resolution).astype(np.int64)
+        inside = (map_col >= 0) & (map_col < self.map_width) & (map_row >= 0) & (map_row < self.map_height)
+        map_index = np.where(inside, map_row * self.map_width + map_col, 0)
+        observation[:, 0] = (self.map_layers[0, map_index] & inside) * self.scale
+        observation[:, 1] = (self.map_layers[1, map_index] & inside) * self.scale
+
+        # 车辆通道: 只处理可能出现在栅格中的 (ego, vehicle) 对
+        delta = arrays['center'][None, :, :] - ego_center[:, None, :]
+        reach = self.radius + np.hypot(arrays['length'], arrays['width'])[None, :] / 2
+        pair_ego, pair_vehicle = np.nonzero(np.hypot(delta[..., 0], delta[..., 1]) <= reach)
+        coords, offsets = rectangle_polygons(
+            arrays['front'][pair_vehicle], arrays['heading'][pair_vehicle],
+            arrays['length'][pair_vehicle], arrays['width'][pair_vehicle]
+        )
+        corner_pair = np.repeat(np.arange(len(pair_ego), dtype=np.int64), 4)
+        corner_delta = coords - ego_center[pair_ego[corner_pair]]
+        corner_u = np.einsum('ij,ij->i', corner_delta, ego_right[pair_ego[corner_pair]])
+        corner_v = np.einsum('ij,ij->i', corner_delta, ego_forward[pair_ego[corner_pair]])
+        grid_coords = np.stack([corner_u / self.resolution + width / 2, height / 2 - corner_v / self.resolution], axis=1)
+        owners, pixels = polygon_pixels(grid_coords, offsets, height, width)
+
+        is_ego = pair_vehicle[owners] == ego_index[pair_ego[owners]]
+        flat_index = pair_ego[owners] * (len(BEV_CHANNELS) * num_cells) + pixels
+        speed = np.clip(arrays['speed'][pair_vehicle[owners]] / self.max_speed, 0, 1) * self.scale
+        flat_observation = observation.reshape(-1)
+        flat_observation[flat_index[~is_ego] + 2 * num_cells] = self.scale
+        flat_observation[flat_index[~is_ego] + 3 * num_cells] = speed[~is_ego]
+        flat_observation[flat_index[is_ego] + 4 * num_cells] = self.scale
+        return ego_ids, observation.reshape(len(ego_ids), len(BEV_CHANNELS), height, width)
@@ -2,26 +2,31 @@
 @Author: WANG Maonan
 @Date: 2023-08-23 15:25:52
 @Description: 初始化一个场景内所有的车辆
-@LastEditTime: 2024-08-11 19:26:13
+@LastEditTime: 2026-10-19 15:58:30
 '''
+import numpy as np
 from loguru import logger
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple, Union, Sequence
 
 from .vehicle import VehicleInfo
+from .vehicle_neighbors import subscribe_neighbors, compute_neighbor_features
 from ..tshub_env.base_builder import BaseBuilder
 from ..utils.format_dict import dict_to_str
+from ..utils.point_index import PointIndex
 
 class VehicleBuilder(BaseBuilder):
     """
     Provides methods to retrieve information and control all vehicles in the scene.
     """
 
-    def __init__(self, sumo, action_type, hightlight:bool=False) -> None:
+    def __init__(self, sumo, action_type, hightlight:bool=False, neighbor_radius:float=None) -> None:
         self.sumo = sumo  # sumo connection
         self.action_type = action_type # lane, lane_continuous_speed
         self.vehicles: Dict[str, VehicleInfo] = {}
         self.controled_vehicles = [] # 被控制过的车辆
         self.hightlight = hightlight
+        self._spatial_index: PointIndex = None # 车辆位置的空间索引, 每个 step 最多创建一次
+        self.neighbor_radius = neighbor_radius # ego 车辆订阅周围车辆的距离, None 表示不订阅
 
     def create_objects(self, vehicle_id: str) -> None:
         """初始化车辆
@@ -51,6 +56,8 @@ class VehicleBuilder(BaseBuilder):
             sumo=self.sumo
         )
         self.vehicles[vehicle_id] = vehicle_info
+        if (self.neighbor_radius is not None) and ('ego' in vehicle_info.vehicle_type):
+            subscribe_neighbors(self.sumo, vehicle_id, self.neighbor_radius)
 
     def __delete_vehicle(self, vehicle_id: str) -> None:
         """删除指定 id 的车辆
@@ -79,6 +86,7 @@ class VehicleBuilder(BaseBuilder):
         2. 对于离开环境的车辆，将其从 self.vehicles 中删除；
         3. 对于新进入环境的车辆，将其添加在 self.vehicles；
         """
+        self._spatial_index = None # 车辆位置改变, 索引需要重新创建
         subscription_results = self.sumo.vehicle.getAllSubscriptionResults()
         vehicle_ids = self.sumo.vehicle.getIDList()
         
@@ -108,6 +116,57 @@ class VehicleBuilder(BaseBuilder):
         return vehicle_features
 
 
+    @property
+    def spatial_index(self) -> PointIndex:
+        """当前 step 车辆位置的 KD-tree, 第一次查询时创建, 同一个 step 内所有的查询共用
+        """
+        if self._spatial_index is None:
+            vehicle_ids = list(self.vehicles.keys())
+            positions = np.array(
+                [self.vehicles[_id].position[:2] for _id in vehicle_ids], dtype=np.float64
+            ).reshape(-1, 2)
+            self._spatial_index = PointIndex(vehicle_ids, positions)
+        return self._spatial_index
+
+    def neighbors_within(self, ids_or_points:Union[Sequence[str], np.ndarray], r:float) -> List[List[str]]:
+        """批量查询距离每个车辆 (或坐标) r 米以内的车辆
+
+        Args:
+            ids_or_points (Union[Sequence[str], np.ndarray]): 车辆 id 的列表 (结果不包含自身), 或是 (N, 2) 的坐标
+            r (float): 查询的半径 [m]
+        """
+        return self.spatial_index.neighbors_within(ids_or_points, r)
+
+    def k_nearest(self, ids_or_points:Union[Sequence[str], np.ndarray], k:int) -> Tuple[List[List[str]], np.ndarray]:
+        """批量查询距离每个车辆 (或坐标) 最近的 k 辆车, 同时返回 (N, k) 的距离
+        """
+        return self.spatial_index.k_nearest(ids_or_points, k)
+
+    def get_neighbor_features(self, ego_ids:List[str]=None) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """获得 ego 车辆左/中/右车道的前车与后车信息 (需要设置 neighbor_radius)
+
+        Args:
+            ego_ids (List[str], optional): 需要的 ego 车辆, None 表示所有的 ego 车辆. Defaults to None.
+
+        Returns:
+            Tuple[List[str], np.ndarray, np.ndarray]: ego 车辆的 id, (E, 6, 3) 的特征以及 (E, 6) 的 mask,
+                具体的顺序见 vehicle_neighbors.NEIGHBOR_SLOTS 和 NEIGHBOR_FEATURES
+        """
+        assert self.neighbor_radius is not None, '需要设置 neighbor_radius 才可以获得周围车辆的信息.'
+        if ego_ids is None:
+            ego_ids = [_id for _id, _vehicle in self.vehicles.items() if 'ego' in _vehicle.vehicle_type]
+        ego_states = [
+            {
+                'id': _id, 'position': self.vehicles[_id].position, 'heading': self.vehicles[_id].heading,
+                'speed': self.vehicles[_id].speed, 'road_id': self.vehicles[_id].road_id,
+                'lane_index': self.vehicles[_id].lane_index, 'length': self.vehicles[_id].length,
+            }
+            for _id in ego_ids
+        ]
+        context_results = self.sumo.vehicle.getAllContextSubscriptionResults() # 一次获得所有 ego 的邻居
+        features, mask = compute_neighbor_features(ego_states, context_results, self.neighbor_radius)
+        return ego_ids, features, mask
+
     def control_objects(self, actions):
         """
         Control all vehicles in the scene based on the provided actions.
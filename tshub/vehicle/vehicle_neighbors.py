@@ -0,0 +1,120 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 16:21:45
+@Description: ego 车辆周围的邻居信息 (左/中/右车道的前车与后车)
++ 每一辆 ego 车辆使用一个 context subscription (LC maneuver filter), 每个 step 通过一次调用获得所有 ego 的邻居
++ 输出固定形状的数组 (ego × 6 个位置 × [gap, rel_speed, lane_offset])
++ https://sumo.dlr.de/docs/TraCI/Interfacing_TraCI_from_Python.html#context_subscription_filters
+@LastEditTime: 2026-10-19 16:21:45
+'''
+import traci
+import numpy as np
+from typing import Dict, Any, List
+
+NEIGHBOR_SLOTS = (
+    'left_leader', 'leader', 'right_leader',
+    'left_follower', 'follower', 'right_follower',
+) # 输出数组第二维的顺序
+NEIGHBOR_FEATURES = ('gap', 'rel_speed', 'lane_offset') # 输出数组第三维的顺序, lane_offset 为横向距离 [m], 左侧为正
+NEIGHBOR_VARIABLES = [
+    traci.constants.VAR_POSITION, traci.constants.VAR_SPEED,
+    traci.constants.VAR_ROAD_ID, traci.constants.VAR_LANE_INDEX,
+    traci.constants.VAR_LENGTH,
+]
+LANE_WIDTH = 3.2 # 不在同一个 road 上时, 通过横向距离判断车道
+
+
+def subscribe_neighbors(sumo, vehicle_id:str, radius:float) -> None:
+    """为 ego 车辆添加 context subscription, 只保留左/中/右车道上的前车和后车
+
+    Args:
+        sumo: sumo connection
+        vehicle_id (str): ego 车辆的 id
+        radius (float): 前后方向查找的距离 [m]
+    """
+    sumo.vehicle.subscribeContext(
+        vehicle_id, traci.constants.CMD_GET_VEHICLE_VARIABLE, radius, NEIGHBOR_VARIABLES
+    )
+    sumo.vehicle.addSubscriptionFilterLCManeuver(
+        noOpposite=True, downstreamDist=radius, upstreamDist=radius
+    )
+
+
+def compute_neighbor_features(
+        ego_states:List[Dict[str, Any]],
+        context_results:Dict[str, Dict[str, Dict[int, Any]]],
+        radius:float
+    ):
+    """将所有 ego 的 context subscription 结果转换为固定形状的数组
+
+    Args:
+        ego_states (List[Dict[str, Any]]): 每辆 ego 的 id, position, heading, speed, road_id, lane_index, length
+        context_results (Dict[str, Dict[str, Dict[int, Any]]]): getAllContextSubscriptionResults 的结果
+        radius (float): 查找的距离, 没有邻居的位置 gap 填充为 radius
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]:
+            - (E, 6, 3) float32 的特征, 顺序见 NEIGHBOR_SLOTS 和 NEIGHBOR_FEATURES;
+            - (E, 6) bool, 对应位置是否有车辆;
+    """
+    num_ego = len(ego_states)
+    features = np.zeros((num_ego, len(NEIGHBOR_SLOTS), len(NEIGHBOR_FEATURES)), dtype=np.float32)
+    features[:, :, 0] = radius
+    mask = np.zeros((num_ego, len(NEIGHBOR_SLOTS)), dtype=bool)
+
+    # 将所有 (ego, neighbor) 展开为一维的数组
+    pair_ego, pair_position, pair_speed, pair_length, pair_same_road, pair_lane_diff = [], [], [], [], [], []
+    for ego_index, ego in enumerate(ego_states):
+        for neighbor_id, neighbor in context_results.get(ego['id'], {}).items():
+            if neighbor_id == ego['id']:
+                continue
+            pair_ego.append(ego_index)
+            pair_position.append(neighbor[traci.constants.VAR_POSITION][:2])
+            pair_speed.append(neighbor[traci.constants.VAR_SPEED])
+            pair_length.append(neighbor[traci.constants.VAR_LENGTH])
+            pair_same_road.append(neighbor[traci.constants.VAR_ROAD_ID] == ego['road_id'])
+            pair_lane_diff.append(neighbor[traci.constants.VAR_LANE_INDEX] - ego['lane_index'])
+    if not pair_ego:
+        return features, mask
+
+    pair_ego = np.asarray(pair_ego, dtype=np.int64)
+    ego_position = np.array([_ego['position'][:2] for _ego in ego_states], dtype=np.float64)
+    ego_heading = np.deg2rad([_ego['heading'] for _ego in ego_states]) # SUMO 中 0 度为北, 顺时针
+    ego_speed = np.array([_ego['speed'] for _ego in ego_states], dtype=np.float64)
+    ego_length = np.array([_ego['length'] for _ego in ego_states], dtype=np.float64)
+
+    # 在 ego 的坐标系中计算纵向与横向距离 (左侧为正)
+    delta = np.asarray(pair_position, dtype=np.float64) - ego_position[pair_ego]
+    heading = ego_heading[pair_ego]
+    longitudinal = delta[:, 0] * np.sin(heading) + delta[:, 1] * np.cos(heading)
+    lateral = -delta[:, 0] * np.cos(heading) + delta[:, 1] * np.sin(heading)
+
+    # 判断左/中/右, 同一个 road 使用 lane index, 否则使用横向距离
+    lane_side = np.where(
+        np.asarray(pair_same_road),
+        np.sign(np.asarray(pair_lane_diff)),
+        np.where(lateral > LANE_WIDTH/2, 1, np.where(lateral < -LANE_WIDTH/2, -1, 0))
+    ).astype(np.int64)
+    is_leader = longitudinal > 0
+    slot = np.where(is_leader, 1 - lane_side, 4 - lane_side) # 左 (+1) -> 0/3, 中 -> 1/4, 右 (-1) -> 2/5
+
+    # 车辆位置为前保险杠, gap 为前车车尾到后车车头的距离
+    gap = np.where(
+        is_leader,
+        longitudinal - np.asarray(pair_length, dtype=np.float64),
+        -longitudinal - ego_length[pair_ego]
+    )
+    rel_speed = np.asarray(pair_speed, dtype=np.float64) - ego_speed[pair_ego]
+
+    # 每个 (ego, slot) 只保留 gap 最小的车辆
+    order = np.lexsort((gap, slot, pair_ego))
+    cell = pair_ego[order] * len(NEIGHBOR_SLOTS) + slot[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = cell[1:] != cell[:-1]
+    chosen = order[first]
+
+    features[pair_ego[chosen], slot[chosen]] = np.stack(
+        [gap[chosen], rel_speed[chosen], lateral[chosen]], axis=1
+    )
+    mask[pair_ego[chosen], slot[chosen]] = True
+    return features, mask
@@ -2,12 +2,19 @@
 @Author: WANG Maonan
 @Date: 2023-11-12 21:56:57
 @Description: 过滤感兴趣的物体
-@LastEditTime: 2024-04-09 22:58:42
++ lane 和 node 使用 PolygonIndex 建立一次索引 (地图不变时重复使用), 先通过 bounding box 找到候选的物体
++ 候选物体的距离使用 numpy 批量计算, 计算的顺序与 sumolib.geomhelper 相同, 因此结果与逐个计算完全一致
+@LastEditTime: 2026-10-19 22:10:37
 '''
 import sumolib
+import numpy as np
 from loguru import logger
 from typing import List, Tuple, Dict, Any
 
+from ..map.spatial_index import PolygonIndex, concat_ranges
+
+_OBJECT_INDEX_CACHE: Dict[int, Tuple[Any, PolygonIndex]] = dict() # id(objects) -> (objects, index)
+
 def calculate_min_distance_polygon2polygon(
         center_object_shape:List[Tuple[float]], 
         other_object_shape:List[Tuple[float]]
@@ -34,6 +41,87 @@ def calculate_min_distance_polygon2polygon(
     return min_distance
 
 
+def sumo_point_to_segment_distance(points:np.ndarray, line_start:np.ndarray, line_end:np.ndarray) -> np.ndarray:
+    """逐行计算点到线段的距离, 与 sumolib.geomhelper.distancePointToLine 的计算步骤相同 (结果逐位一致)
+
+    Args:
+        points (np.ndarray): (N, 2) 点的坐标
+        line_start (np.ndarray): (N, 2) 线段的起点
+        line_end (np.ndarray): (N, 2) 线段的终点
+
+    Returns:
+        np.ndarray: (N,) 点到线段的距离
+    """
+    line_dx, line_dy = line_end[:, 0] - line_start[:, 0], line_end[:, 1] - line_start[:, 1]
+    d = np.sqrt((line_start[:, 0] - line_end[:, 0])**2 + (line_start[:, 1] - line_end[:, 1])**2)
+    u = (points[:, 0] - line_start[:, 0]) * line_dx + (points[:, 1] - line_start[:, 1]) * line_dy
+    outside = (d == 0) | (u < 0) | (u > d * d)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offset = np.where(outside, np.where(u < 0, 0.0, d), u / d)
+        ratio = offset / d
+    intersection_x = np.where(offset == 0, line_start[:, 0], line_start[:, 0] + ratio * line_dx)
+    intersection_y = np.where(offset == 0, line_start[:, 1], line_start[:, 1] + ratio * line_dy)
+    return np.sqrt((points[:, 0] - intersection_x)**2 + (points[:, 1] - intersection_y)**2)
+
+
+def get_object_index(objects:Dict[str, Dict[str, Any]]) -> PolygonIndex:
+    """返回 lane/node 的 PolygonIndex, 同一个 objects (例如 map_infos['lane']) 只建立一次索引
+    """
+    cached = _OBJECT_INDEX_CACHE.get(id(objects))
+    if (cached is not None) and (cached[0] is objects) and (len(cached[1]) == len(objects)):
+        return cached[1]
+    if len(_OBJECT_INDEX_CACHE) >= 8: # 只保留最近的几个地图
+        _OBJECT_INDEX_CACHE.clear()
+    index = PolygonIndex.from_polygon_infos(objects)
+    _OBJECT_INDEX_CACHE[id(objects)] = (objects, index) # 保留 objects 的引用, 保证 id 不会被重复使用
+    return index
+
+
+def calculate_min_distance_to_objects(
+        center_object_shape:np.ndarray,
+        index:PolygonIndex,
+        focus_distance:float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    """批量计算 center_object_shape 到索引中 object 的最小距离, 结果与 calculate_min_distance_polygon2polygon 相同.
+    只计算 bounding box 距离不超过 focus_distance 的 object, 以及没有 shape 的 object (sumolib 中距离为 -1).
+
+    Args:
+        center_object_shape (np.ndarray): (K, 2) 中心物体的坐标
+        index (PolygonIndex): object 的索引
+        focus_distance (float): 过滤的距离
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 候选 object 的 index (升序) 以及对应的最小距离
+    """
+    # 额外的 margin 保证被 bounding box 排除的 object 的距离一定不小于 focus_distance
+    margin = 1e-6 * (1 + abs(focus_distance) + np.abs(center_object_shape).max())
+    query_box = np.hstack([
+        center_object_shape.min(axis=0) - focus_distance - margin,
+        center_object_shape.max(axis=0) + focus_distance + margin
+    ])
+    _, candidates = index.candidate_pairs(query_box)
+    empty = np.flatnonzero(index.num_vertices == 0)
+    candidates = np.union1d(candidates, empty)
+    min_distance = np.full(len(candidates), np.inf)
+    min_distance[np.isin(candidates, empty)] = sumolib.geomhelper.INVALID_DISTANCE
+
+    # 只有一个点的 object 计算点到点的距离, 其余的 object 计算到每一条线段 (不闭合) 的距离
+    counts = index.num_vertices[candidates]
+    num_segments = np.where(counts == 1, 1, np.maximum(counts - 1, 0))
+    segment_owner = np.repeat(np.arange(len(candidates), dtype=np.int64), num_segments)
+    segment_start = concat_ranges(index.offsets[:-1][candidates], num_segments)
+    segment_end = segment_start + (counts[segment_owner] > 1)
+
+    num_center = len(center_object_shape)
+    pair_center = np.repeat(np.arange(num_center, dtype=np.int64), len(segment_owner))
+    pair_segment = np.tile(np.arange(len(segment_owner), dtype=np.int64), num_center)
+    line_start = index.coords[segment_start[pair_segment]]
+    line_end = index.coords[segment_end[pair_segment]]
+    distance = sumo_point_to_segment_distance(center_object_shape[pair_center], line_start, line_end)
+    np.minimum.at(min_distance, segment_owner[pair_segment], distance)
+    return candidates, min_distance
+
+
 def calculate_center(points: List[Tuple[float]]) -> tuple[float, float]:
     """计算 shape 的中心点
 
@@ -130,13 +218,28 @@ def filter_object(obs, focus_id:str=None, focus_type:str=None, focus_distance:fl
     if center_object_shape is None:
         x_range, y_range = None, None
     else:
-        for object_type in valid_focus_types[1:]:
-            for obj_id, obj_info in obs[object_type].items():
-                obj_shape = [obj_info['position']] if object_type == 'vehicle' else obj_info['shape']
-                min_distance = calculate_min_distance_polygon2polygon(center_object_shape, obj_shape)
-                if min_distance < focus_distance:
-                    new_obs[object_type][obj_id] =  obj_info
-        
+        if len(center_object_shape) > 0: # 中心物体没有 shape 时, 距离为 inf, 所有的物体都被过滤
+            center_points = np.array([point[:2] for point in center_object_shape], dtype=np.float64)
+
+            # lane 和 node 使用 (缓存的) 空间索引
+            for object_type in ['lane', 'node']:
+                objects = obs[object_type]
+                index = get_object_index(objects)
+                candidates, min_distance = calculate_min_distance_to_objects(center_points, index, focus_distance)
+                for obj_id in index.ids[candidates[min_distance < focus_distance]].tolist():
+                    new_obs[object_type][obj_id] = objects[obj_id]
+
+            # vehicle 每一步都在变化, 直接计算到所有车辆的距离
+            vehicles = obs['vehicle']
+            if len(vehicles) > 0:
+                vehicle_ids = list(vehicles.keys())
+                positions = np.array([vehicles[_id]['position'][:2] for _id in vehicle_ids], dtype=np.float64)
+                delta_x = center_points[:, 0][:, None] - positions[:, 0][None, :]
+                delta_y = center_points[:, 1][:, None] - positions[:, 1][None, :]
+                min_distance = np.sqrt(delta_x**2 + delta_y**2).min(axis=0)
+                for vehicle_index in np.flatnonzero(min_distance < focus_distance).tolist():
+                    new_obs['vehicle'][vehicle_ids[vehicle_index]] = vehicles[vehicle_ids[vehicle_index]]
+
         # 计算 center_object_shape 的中心点
         center_point = calculate_center(center_object_shape)
         x_range = [center_point[0]-focus_distance/2, center_point[0]+focus_distance/2]
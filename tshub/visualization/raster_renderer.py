@@ -0,0 +1,206 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 22:35:12
+@Description: 只使用 numpy 的 BEV 渲染, 用于替代 matplotlib 的 render_map
++ 地图中静态的 building, lane, node 和车道线只在初始化的时候栅格化一次, 保存为背景图片
++ 每一帧只复制 (裁剪) 背景, 再绘制车辆, 行人, aircraft 和信号灯的状态, 返回 (H, W, 3) 的 uint8 图片
+@LastEditTime: 2026-10-20 17:58:40
+'''
+import numpy as np
+from typing import Dict, Any, Tuple
+
+from .rasterize import (
+    shapes_to_ragged, world_to_pixel,
+    rectangle_polygons, square_polygons, circle_polygons,
+    polygon_pixels, polyline_pixels
+)
+from .filter_objects import calculate_center
+
+DEFAULT_COLORS = {
+    'background': (255, 255, 255),
+    'building': (200, 190, 180),
+    'lane': (128, 128, 128),
+    'node': (100, 100, 100),
+    'lane_marking': (230, 230, 230),
+    'vehicle': (0, 90, 255),
+    'ego': (0, 200, 0),
+    'focus': (255, 165, 0),
+    'person': (160, 0, 160),
+    'aircraft': (255, 0, 0),
+    'tls_green': (0, 220, 0),
+    'tls_red': (230, 0, 0),
+}
+
+
+def get_layer_shapes(objects) -> Tuple[np.ndarray, np.ndarray]:
+    """lane/node/building 的 coords 与 offsets (PolygonLayer 直接使用拼接好的数组)
+    """
+    if hasattr(objects, 'coords') and hasattr(objects, 'offsets'):
+        return np.asarray(objects.coords, dtype=np.float64), np.asarray(objects.offsets, dtype=np.int64)
+    return shapes_to_ragged([_object['shape'] for _object in objects.values()])
+
+
+class RasterRenderer:
+    """栅格化的 BEV 渲染
+
+    Args:
+        map_infos (Dict[str, Any]): MapBuilder.get_objects_infos() 的结果, 需要包含 lane, 可以包含 node 和 building
+        meters_per_pixel (float, optional): 每个像素对应的距离 [m]. Defaults to 0.5.
+        padding (float, optional): 地图边缘额外的范围 [m]. Defaults to 10.
+        colors (Dict[str, Tuple[int, int, int]], optional): 覆盖 DEFAULT_COLORS 中的颜色. Defaults to None.
+    """
+    def __init__(self,
+                 map_infos:Dict[str, Any],
+                 meters_per_pixel:float=0.5,
+                 padding:float=10,
+                 colors:Dict[str, Tuple[int, int, int]]=None
+        ) -> None:
+        self.meters_per_pixel = meters_per_pixel
+        self.colors = {**DEFAULT_COLORS, **(colors or {})}
+        self.layers = {
+            _object_type: get_layer_shapes(map_infos[_object_type])
+            for _object_type in ['building', 'lane', 'node']
+            if _object_type in map_infos
+        }
+
+        # 路网 (lane 和 node) 的范围, 图像的左上角为 (x_min, y_max). 超出路网的 building 会被裁剪
+        all_coords = np.concatenate([self.layers[_object_type][0] for _object_type in ['lane', 'node'] if _object_type in self.layers], axis=0)
+        x_min, y_min = all_coords.min(axis=0) - padding
+        x_max, y_max = all_coords.max(axis=0) + padding
+        self.origin = (float(x_min), float(y_max))
+        self.width = int(np.ceil((x_max - x_min) / meters_per_pixel))
+        self.height = int(np.ceil((y_max - y_min) / meters_per_pixel))
+
+        # 每个 lane 的终点 (停车线的中心), 用于绘制信号灯的状态. lane 的 shape 为左右两侧的边界
+        lane_coords, lane_offsets = self.layers['lane']
+        lane_ids = list(map_infos['lane'].keys())
+        half = np.diff(lane_offsets) // 2
+        self.lane_ends = {
+            _lane_id: (lane_coords[_start + _half - 1] + lane_coords[_start + _half]) / 2
+            for _lane_id, _start, _half in zip(lane_ids, lane_offsets[:-1].tolist(), half.tolist())
+            if _half > 0
+        }
+        self.background = self.render_background()
+
+    def render_background(self) -> np.ndarray:
+        """栅格化静态的地图元素, 只需要调用一次
+        """
+        image = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        image[:] = self.colors['background']
+        flat_image = image.reshape(-1, 3)
+        for object_type in ['building', 'lane', 'node']:
+            if object_type in self.layers:
+                coords, offsets = self.layers[object_type]
+                pixel_coords = world_to_pixel(coords, self.origin, self.meters_per_pixel)
+                _, pixels = polygon_pixels(pixel_coords, offsets, self.height, self.width)
+                flat_image[pixels] = self.colors[object_type]
+
+        # 车道线为每个 lane 的边界
+        coords, offsets = self.layers['lane']
+        pixel_coords = world_to_pixel(coords, self.origin, self.meters_per_pixel)
+        _, pixels = polyline_pixels(pixel_coords, offsets, self.height, self.width, closed=True)
+        flat_image[pixels] = self.colors['lane_marking']
+        return image
+
+    def get_view(self, obs:Dict[str, Any], focus_id:str=None, focus_type:str=None, focus_distance:float=None) -> Tuple[int, int, int, int]:
+        """返回需要渲染的像素范围 (row_0, col_0, height, width), 追踪的物体不存在时返回 None
+        """
+        if (focus_id is None) or (focus_type is None) or (focus_distance is None):
+            return 0, 0, self.height, self.width
+
+        focus_object = obs.get(focus_type, {}).get(focus_id)
+        if focus_object is None:
+            return None
+        if focus_type == 'vehicle':
+            center = focus_object['position'][:2]
+        else:
+            center = calculate_center(focus_object['shape'])
+        center_pixel = world_to_pixel(center, self.origin, self.meters_per_pixel)[0]
+        size = max(int(round(focus_distance / self.meters_per_pixel)), 1)
+        row_0 = int(np.floor(center_pixel[1])) - size // 2
+        col_0 = int(np.floor(center_pixel[0])) - size // 2
+        return row_0, col_0, size, size
+
+    def _stamp(self, flat_image:np.ndarray, view, coords:np.ndarray, offsets:np.ndarray, colors:np.ndarray, fill:bool=True) -> None:
+        """在裁剪后的图像上绘制多边形, colors 为 (N, 3) 每个多边形的颜色
+        """
+        row_0, col_0, height, width = view
+        pixel_coords = world_to_pixel(coords, self.origin, self.meters_per_pixel) - (col_0, row_0)
+        if fill:
+            owners, pixels = polygon_pixels(pixel_coords, offsets, height, width)
+        else:
+            owners, pixels = polyline_pixels(pixel_coords, offsets, height, width, closed=True)
+        flat_image[pixels] = colors[owners]
+
+    def render(self, obs:Dict[str, Any], focus_id:str=None, focus_type:str=None, focus_distance:float=None) -> np.ndarray:
+        """渲染一帧. focus 的参数与 filter_object 相同, 不设置时渲染整个地图
+
+        Args:
+            obs (Dict[str, Any]): TshubEnvironment 的 obs, 使用其中的 vehicle, person, aircraft 和 tls
+            focus_id (str, optional): 追踪的 object 的 id. Defaults to None.
+            focus_type (str, optional): 追踪的 object 的类型, 例如 vehicle, node, lane. Defaults to None.
+            focus_distance (float, optional): 渲染的范围 [m]. Defaults to None.
+
+        Returns:
+            np.ndarray: (H, W, 3) 的 uint8 图片, 追踪的物体不存在时返回 None
+        """
+        view = self.get_view(obs, focus_id, focus_type, focus_distance)
+        if view is None:
+            return None
+
+        # 复制背景, 超出地图的部分使用背景色
+        row_0, col_0, height, width = view
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = self.colors['background']
+        src_row_0, src_col_0 = max(row_0, 0), max(col_0, 0)
+        src_row_1, src_col_1 = min(row_0 + height, self.height), min(col_0 + width, self.width)
+        if (src_row_1 > src_row_0) and (src_col_1 > src_col_0):
+            image[src_row_0-row_0:src_row_1-row_0, src_col_0-col_0:src_col_1-col_0] = \
+                self.background[src_row_0:src_row_1, src_col_0:src_col_1]
+        flat_image = image.reshape(-1, 3)
+
+        # 信号灯, 在每个 movement 的进口车道的停车线绘制当前的状态
+        tls_positions, tls_colors = [], []
+        for tls_info in (obs.get('tls') or {}).values():
+            for movement_index, movement_id in enumerate(tls_info['movement_ids']):
+                is_green = tls_info['this_phase'][movement_index]
+                for lane_id in tls_info['movement_lane_ids'].get(movement_id, []):
+                    if lane_id in self.lane_ends:
+                        tls_positions.append(self.lane_ends[lane_id])
+                        tls_colors.append(self.colors['tls_green' if is_green else 'tls_red'])
+        if tls_positions:
+            self._stamp(flat_image, view, *square_polygons(tls_positions, 1.5), np.asarray(tls_colors, dtype=np.uint8))
+
+        # 车辆
+        vehicles = obs.get('vehicle') or {}
+        if vehicles:
+            vehicle_infos = list(vehicles.values())
+            coords, offsets = rectangle_polygons(
+                [_info['position'][:2] for _info in vehicle_infos],
+                [_info['heading'] for _info in vehicle_infos],
+                [_info['length'] for _info in vehicle_infos],
+                [_info['width'] for _info in vehicle_infos],
+            )
+            colors = np.asarray([
+                self.colors['focus'] if _id == focus_id else
+                self.colors['ego'] if 'ego' in _info.get('vehicle_type', '') else self.colors['vehicle']
+                for _id, _info in vehicles.items()
+            ], dtype=np.uint8)
+            self._stamp(flat_image, view, coords, offsets, colors)
+
+        # 行人
+        people = obs.get('person') or {}
+        if people:
+            coords, offsets = square_polygons([_info['position'][:2] for _info in people.values()], 0.8)
+            colors = np.broadcast_to(np.asarray(self.colors['person'], dtype=np.uint8), (len(people), 3))
+            self._stamp(flat_image, view, coords, offsets, colors)
+
+        # aircraft, 绘制覆盖的范围以及 aircraft 的位置
+        aircraft = obs.get('aircraft') or {}
+        if aircraft:
+            positions = [_info['position'][:2] for _info in aircraft.values()]
+            colors = np.asarray([_info.get('color', self.colors['aircraft']) for _info in aircraft.values()], dtype=np.uint8)
+            coords, offsets = circle_polygons(positions, [_info['cover_radius'] for _info in aircraft.values()])
+            self._stamp(flat_image, view, coords, offsets, colors, fill=False)
+            self._stamp(flat_image, view, *square_polygons(positions, 3.0), colors)
+        return image
@@ -0,0 +1,179 @@
+'''
+@Author: WANG Maonan
+@Date: 2026-10-19 22:35:12
+@Description: 只使用 numpy 的栅格化工具, 用于 BEV 的渲染与 observation
++ 所有的多边形 (或折线) 拼接为 coords + offsets, 一次处理所有的多边形, 不需要 python 循环
++ 多边形使用扫描线 (scanline) 填充, 像素中心在多边形内部 (even-odd rule) 即被填充
++ 坐标均为像素坐标, 第 0 行为图像的最上方 (y 最大的位置)
+@LastEditTime: 2026-10-19 22:35:12
+'''
+import numpy as np
+from typing import Tuple, Iterable
+
+from ..map.spatial_index import concat_ranges
+
+
+def shapes_to_ragged(shapes:Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """将多个 shape 拼接为 coords 与 offsets, 第 i 个 shape 为 coords[offsets[i]:offsets[i+1]]
+    """
+    shapes = [np.asarray(_shape, dtype=np.float64).reshape(-1, 2) for _shape in shapes]
+    offsets = np.zeros(len(shapes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(_shape) for _shape in shapes])
+    coords = np.concatenate(shapes, axis=0) if shapes else np.zeros((0, 2))
+    return coords, offsets
+
+
+def world_to_pixel(xy:np.ndarray, origin:Tuple[float, float], meters_per_pixel:float) -> np.ndarray:
+    """将 SUMO 的坐标转换为像素坐标
+
+    Args:
+        xy (np.ndarray): (N, 2) SUMO 中的坐标
+        origin (Tuple[float, float]): 图像左上角对应的 SUMO 坐标, 即 (x_min, y_max)
+        meters_per_pixel (float): 每个像素对应的距离 [m]
+
+    Returns:
+        np.ndarray: (N, 2) 像素坐标 (列, 行)
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    return np.stack([
+        (xy[:, 0] - origin[0]) / meters_per_pixel,
+        (origin[1] - xy[:, 1]) / meters_per_pixel
+    ], axis=1)
+
+
+def rectangle_polygons(
+        front_positions:np.ndarray, headings:np.ndarray,
+        lengths:np.ndarray, widths:np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    """车辆的矩形轮廓, SUMO 中车辆的位置为车头的中心, heading 为与正北方向的顺时针夹角 [°]
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (4N, 2) 的 coords 与 (N+1,) 的 offsets
+    """
+    front_positions = np.asarray(front_positions, dtype=np.float64).reshape(-1, 2)
+    num_rectangles = len(front_positions)
+    headings = np.radians(np.broadcast_to(np.asarray(headings, dtype=np.float64), (num_rectangles,)))
+    lengths = np.broadcast_to(np.asarray(lengths, dtype=np.float64), (num_rectangles,))
+    widths = np.broadcast_to(np.asarray(widths, dtype=np.float64), (num_rectangles,))
+
+    forward = np.stack([np.sin(headings), np.cos(headings)], axis=1) # 车头的方向
+    left = np.stack([-forward[:, 1], forward[:, 0]], axis=1)
+    rear = front_positions - forward * lengths[:, None]
+    half_width = left * (widths[:, None] / 2)
+    corners = np.stack([
+        front_positions + half_width, front_positions - half_width,
+        rear - half_width, rear + half_width
+    ], axis=1)
+    return corners.reshape(-1, 2), np.arange(num_rectangles + 1, dtype=np.int64) * 4
+
+
+def square_polygons(centers:np.ndarray, sizes:np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """以 centers 为中心, 边长为 sizes 的正方形 (例如行人与 aircraft 的标记)
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    half = np.broadcast_to(np.asarray(sizes, dtype=np.float64), (len(centers),))[:, None, None] / 2
+    unit = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float64)
+    corners = centers[:, None, :] + unit[None, :, :] * half
+    return corners.reshape(-1, 2), np.arange(len(centers) + 1, dtype=np.int64) * 4
+
+
+def circle_polygons(centers:np.ndarray, radius:np.ndarray, num_points:int=32) -> Tuple[np.ndarray, np.ndarray]:
+    """以 centers 为中心的圆 (使用 num_points 边形近似)
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(centers),))
+    angle = np.linspace(0, 2 * np.pi, num_points, endpoint=False)
+    unit = np.stack([np.cos(angle), np.sin(angle)], axis=1)
+    points = centers[:, None, :] + unit[None, :, :] * radius[:, None, None]
+    return points.reshape(-1, 2), np.arange(len(centers) + 1, dtype=np.int64) * num_points
+
+
+def polygon_pixels(
+        coords:np.ndarray, offsets:np.ndarray,
+        height:int, width:int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    """使用扫描线填充所有的多边形, 返回每个被填充的像素以及对应的多边形
+
+    Args:
+        coords (np.ndarray): (K, 2) 所有多边形的像素坐标
+        offsets (np.ndarray): (N+1,) 第 i 个多边形为 coords[offsets[i]:offsets[i+1]], 最后一个点自动连接到第一个点
+        height (int): 图像的高度
+        width (int): 图像的宽度
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 多边形的 index 与像素的 flat index (row * width + col)
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    valid = counts > 0
+    if not valid.any():
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # 每一条边 (a -> b), 最后一个点连回第一个点
+    edge_owner = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    next_vertex = np.arange(1, len(coords) + 1, dtype=np.int64)
+    next_vertex[offsets[1:][valid] - 1] = offsets[:-1][valid]
+    a, b = coords, coords[next_vertex]
+
+    # 每条边经过的行: 像素中心 row + 0.5 在 [y_min, y_max) 中
+    y_min, y_max = np.minimum(a[:, 1], b[:, 1]), np.maximum(a[:, 1], b[:, 1])
+    row_start = np.clip(np.ceil(y_min - 0.5), 0, height).astype(np.int64)
+    row_end = np.clip(np.ceil(y_max - 0.5), 0, height).astype(np.int64)
+    num_rows = np.maximum(row_end - row_start, 0)
+    crossing_edge = np.repeat(np.arange(len(a), dtype=np.int64), num_rows)
+    crossing_row = concat_ranges(row_start, num_rows)
+    ca, cb = a[crossing_edge], b[crossing_edge]
+    crossing_x = ca[:, 0] + (crossing_row + 0.5 - ca[:, 1]) * (cb[:, 0] - ca[:, 0]) / (cb[:, 1] - ca[:, 1])
+    crossing_owner = edge_owner[crossing_edge]
+
+    # 同一个多边形同一行的交点排序后两两配对, 每一对之间为填充的区间
+    order = np.lexsort((crossing_x, crossing_row, crossing_owner))
+    crossing_x, crossing_row, crossing_owner = crossing_x[order], crossing_row[order], crossing_owner[order]
+    col_start = np.clip(np.ceil(crossing_x[0::2] - 0.5), 0, width).astype(np.int64)
+    col_end = np.clip(np.ceil(crossing_x[1::2] - 0.5), 0, width).astype(np.int64)
+    num_cols = np.maximum(col_end - col_start, 0)
+    pixel_owner = np.repeat(crossing_owner[0::2], num_cols)
+    pixel_index = np.repeat(crossing_row[0::2] * width, num_cols) + concat_ranges(col_start, num_cols)
+    return pixel_owner, pixel_index
+
+
+def polyline_pixels(
+        coords:np.ndarray, offsets:np.ndarray,
+        height:int, width:int, closed:bool=True
+    ) -> Tuple[np.ndarray, np.ndarray]:
+    """绘制宽度为 1 个像素的折线 (例如车道线), 每条线段按照 0.5 个像素的间隔采样
+
+    Args:
+        coords (np.ndarray): (K, 2) 所有折线的像素坐标
+        offsets (np.ndarray): (N+1,) 第 i 条折线为 coords[offsets[i]:offsets[i+1]]
+        height (int): 图像的高度
+        width (int): 图像的宽度
+        closed (bool, optional): 是否将最后一个点连接到第一个点. Defaults to True.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: 折线的 index 与像素的 flat index
+    """
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    valid = counts > 1
+    vertex_owner = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    next_vertex = np.arange(1, len(coords) + 1, dtype=np.int64)
+    is_last = np.zeros(len(coords), dtype=bool)
+    is_last[offsets[1:][counts > 0] - 1] = True
+    if closed:
+        next_vertex[offsets[1:][valid] - 1] = offsets[:-1][valid]
+        keep = valid[vertex_owner]
+    else:
+        keep = valid[vertex_owner] & ~is_last
+    segment_owner = vertex_owner[keep]
+    a, b = coords[keep], coords[next_vertex[keep]]
+
+    num_samples = np.ceil(np.hypot(*(b - a).T) * 2).astype(np.int64) + 1
+    sample_segment = np.repeat(np.arange(len(a), dtype=np.int64), num_samples)
+    t = concat_ranges(np.zeros(len(a), dtype=np.int64), num_samples) / np.maximum(num_samples - 1, 1)[sample_segment]
+    points = a[sample_segment] + t[:, None] * (b - a)[sample_segment]
+    col, row = np.floor(points[:, 0]).astype(np.int64), np.floor(points[:, 1]).astype(np.int64)
+    inside = (col >= 0) & (col < width) & (row >= 0) & (row < height)
+    return segment_owner[sample_segment[inside]], row[inside] * width + col[inside]